@@ -1,56 +1,105 @@
-import threading, time, logging
+import threading, logging, os
+import psutil
+import numpy as np
 from datetime import datetime
-import qtawesome as qta
 
 from .hdf5_handler import HDF5Handler
 from .data_queue_handler import ImgDataQueueHandler
-from interface.status_bar.update_notif import update_notif
-from utils import get_computer_name
+from .acquisition_loop import QueueSubscriber
+from .frame_reduction import FrameReducer, binned_dtype
+from .roi_recording import RoiCropper
+from .change_trigger import ChangeTrigger
+from .background import BackgroundSubtractor
+from utils import get_computer_name, telemetry, tracer, notify
 
 logger = logging.getLogger(__name__)
 
 class AcquireStream:
-    """Handles continuous recording of camera frames to a queue."""
-    
-    def __init__(self, stream_camera, window):
-        self.stream_camera = stream_camera
-        self.camera_control = stream_camera.camera_control
-        self.window = window
+    """
+    Handles continuous recording of camera frames to a queue.
+
+    Qt-free, so it runs the same under the GUI, from the command line or the remote control server.
+    `on_started()` and `on_stopped()` are called whoever starts or stops the recording, possibly from a
+    worker thread (e.g. when the queue fills up or the frame limit is reached).
+    """
+
+    def __init__(self, camera_control, acquisition_loop, on_started=None, on_stopped=None):
+        self.camera_control = camera_control
+        self.acquisition_loop = acquisition_loop
+        self.on_started = on_started
+        self.on_stopped = on_stopped
         self.h5_handler = HDF5Handler()
-        
+        self.default_reduction = None  # Binning/decimation/averaging settings used when start_recording() gets none
+        self.default_rois = None  # {name: (x, y, width, height)} recorded instead of whole frames when start_recording() gets none
+        self.default_trigger = None  # Change trigger settings used when start_recording() gets none
+        self.corrector = None  # FrameCorrector with the current calibration, if there is one
+        self.default_calibrate = False  # Write calibrated frames when start_recording() is not told otherwise
+        self.recording_corrector = None  # The corrector a running recording applies, kept if the calibration changes
+        self.default_background = None  # Background subtraction settings used when start_recording() gets none
+        self.background = None
+        self.reducer = None
+        self.cropper = None
+        self.trigger = None
+
         # Initialize recording state
         self.queue = None
-        self.camera_aq__thread = None
+        self.recorder = None
         self.is_recording = False
-        self.was_streaming = False
-        
-        # Connect stop signal to window
-        self.window.start_recording.triggered.connect(self.stop_recording)
-        
-    def start_recording(self):
-        """Start recording frames from camera."""
+        self.save_thread = None
+        self.stopped = threading.Event()  # Set while no recorder is attached, the queue may still be draining
+        self.stopped.set()
+        self._finish_lock = threading.Lock()
+
+    def start_recording(self, file_path=None, frame_limit=None, acquisition_type='Live Stream', reduction=None, rois=None,
+                        trigger=None, calibrate=None, background=None):
+        """
+        Start recording frames from camera.
+
+        Args:
+            file_path: HDF5 file to write, defaults to the file under _data
+            frame_limit: Stop by itself after this many camera frames, None records until stop_recording()
+            acquisition_type: Stored in the file metadata
+            reduction: FrameReducer settings (binning, bin_mode, decimate, average), defaults to default_reduction
+            rois: {name: (x, y, width, height)} to store only these regions, defaults to default_rois
+            trigger: ChangeTrigger settings to store only frames around changes, defaults to default_trigger
+            calibrate: Write frames corrected with `corrector`, defaults to default_calibrate
+            background: BackgroundSubtractor settings to store background-subtracted frames, defaults to default_background
+        """
         logging.info("Starting Recording")
         if self.is_recording:
             return False
-            
+        self.stopped.clear()
+
         try:
-            # Handle streaming state
-            self.was_streaming = (self.stream_camera.live_stream_qthread is not None and self.stream_camera.live_stream_qthread.isRunning())
-            if self.was_streaming:
-                self.window.stop_stream.trigger()
-            
             # Get ROI dimensions
             roi_width = self.camera_control.call_camera_command("width", "get")
             roi_height = self.camera_control.call_camera_command("height", "get")
-            
-            # Initialize queue with ROI dimensions
-            self.queue = ImgDataQueueHandler(self.window, roi_width, roi_height)
+            self.reducer = FrameReducer.from_settings(reduction if reduction is not None else self.default_reduction)
+            stored_height, stored_width = self.reducer.output_shape(roi_height, roi_width) if self.reducer else (roi_height, roi_width)
+            self.cropper = RoiCropper.from_settings(rois if rois is not None else self.default_rois,
+                                                    scale=self.reducer.binning if self.reducer else 1)
+            if self.cropper is not None:
+                self.cropper.validate(stored_height, stored_width)
+            self.trigger = ChangeTrigger.from_settings(trigger if trigger is not None else self.default_trigger)
+            if self.trigger is not None:
+                # The trigger sees camera-sized frames, before any reduction
+                self.trigger.validate(roi_height, roi_width)
+            self.recording_corrector = None
+            if calibrate if calibrate is not None else self.default_calibrate:
+                if self.corrector is None:
+                    raise ValueError("No calibration to apply")
+                self.corrector.check(roi_height, roi_width)
+                self.recording_corrector = self.corrector
+            self.background = BackgroundSubtractor.from_settings(background if background is not None else self.default_background)
+
+            # Initialize queue with the dimensions and dtype of the frames that are stored
+            self.queue = ImgDataQueueHandler(stored_width, stored_height, self._stored_dtype().itemsize)
             self.queue.reset_stats()
-            
+
             # Initialize recording
             metadata = {
                 'Computer Name': get_computer_name(),
-                'Acquisition Type': 'Live Stream',
+                'Acquisition Type': acquisition_type,
                 # TODO: Add software version dynamically
                 'Software Name': 'microTool',
                 'Software Version': 'v1.0',
@@ -62,88 +111,208 @@ class AcquireStream:
                 'ROI Offset X': self.camera_control.call_camera_command("offset_x", "get"),
                 'ROI Offset Y': self.camera_control.call_camera_command("offset_y", "get")
             }
-            
-            if not self.h5_handler.init_h5File(metadata):
+            if self.reducer is not None:
+                metadata.update(self.reducer.attrs())
+                metadata.update({'Stored Width': stored_width, 'Stored Height': stored_height})
+                logger.info(f"Recording reduced {self.reducer.reduction_factor}x: {self.reducer.attrs()}")
+            if self.cropper is not None:
+                metadata.update(self.cropper.attrs())
+                logger.info(f"Recording {len(self.cropper.rois)} regions, {self.cropper.stored_pixels / (stored_width * stored_height):.1%} of the frame")
+            if self.recording_corrector is not None:
+                metadata.update(self.recording_corrector.calibration.attrs())
+                metadata['Calibration Output'] = self.recording_corrector.output
+            if self.background is not None:
+                metadata.update(self.background.attrs())
+                logger.info(f"Recording frames minus a rolling {self.background.method} background")
+            if self.trigger is not None:
+                metadata.update(self.trigger.attrs())
+                logger.info(f"Recording frames around changes above {self.trigger.threshold} grey levels")
+
+            if not self.h5_handler.init_h5File(metadata, file_path):
                 raise Exception("Failed to start HDF5 logger")
-            
-            # Start recording thread and saving
-            self.is_recording = True
-            self.camera_aq__thread = threading.Thread(target=self._record_frames, name="CameraAQThread", daemon=True)
-            self.camera_aq__thread.start()
-            
+
             # Start saving frames
             if not self.h5_handler.init_saving_thread(self.queue):
                 raise Exception("Failed to start saving thread")
-            
-            self.camera_control.start_camera()
-            update_notif("Recording Live Stream")
+
+            # Latency histograms and the trace start afresh so what is written at the end covers this recording
+            telemetry.reset()
+            tracer.clear()
+
+            # The recorder is one more subscriber of the acquisition loop, live view keeps running alongside it
+            self.is_recording = True
+            if self.recording_corrector is not None or self.background is not None or self.trigger is not None:
+                put_frame = self._put_processed_frame
+            elif self.reducer is not None or self.cropper is not None:
+                put_frame = self._put_reduced_frame
+            else:
+                put_frame = self.queue.put_frame
+            self.recorder = QueueSubscriber('recorder', put_frame, on_overflow=self._handle_queue_full,
+                                            frame_limit=frame_limit, on_complete=self._handle_frame_limit)
+            self.acquisition_loop.subscribe(self.recorder)
+            self.acquisition_loop.acquire('recording')
+            notify("Recording Live Stream")
+            if self.on_started is not None:
+                self.on_started()
             return True
-            
+
         except Exception as e:
             logger.error(f"Error Starting Recording: {e}")
-            update_notif(f"Error Starting Recording: {e}")
-            self.is_recording = False
+            notify(f"Error Starting Recording: {e}")
+            self._finish_recording()
             self._cleanup()
             return False
-            
+
     def stop_recording(self):
         """Stop recording and save remaining frames."""
         if not self.is_recording:
             return
-            
-        # Stop recording
-        self.is_recording = False
-        self.camera_control.stop_camera()
-        
-        if self.camera_aq__thread:
-            self.camera_aq__thread.join(timeout=5.0)  # Wait up to 5 seconds for recording to stop
-        
-        # Start cleanup in background
-        cleanup_thread = threading.Thread(
-            target=self.h5_handler.cleanup,
-            args=(self.queue, self.was_streaming, self.window),
-            daemon=True
-        )
-        cleanup_thread.start()
-
-    def _record_frames(self):
-        """Record frames from camera to queue."""
-        while self.is_recording:
-            try:
-                self.camera_control.get_image()
-                timestamp = self.camera_control.get_image_timestamp()
-                frame = self.camera_control.get_image_data()
-                
-                if frame is not None:
-                    if not self.queue.put_frame(frame, timestamp):
-                        # If queue is full, stop recording
-                        logger.debug("Queue Full - Stopping Stream")
-                        update_notif("Queue Full - Stopping Stream", duration=2000)
-                        self.is_recording = False
-                        self.camera_control.stop_camera()
-                        
-                        # Start cleanup in background
-                        cleanup_thread = threading.Thread(
-                            target=self.h5_handler.cleanup,
-                            args=(self.queue, self.was_streaming, self.window),
-                            daemon=True
-                        )
-                        cleanup_thread.start()
-                        
-                        # Update UI state
-                        self.window.start_recording.is_recording = False
-                        self.window.start_recording.setIcon(qta.icon("fa5.dot-circle"))
-                        break
-                        
-            except Exception as e:
-                logger.error(f"Error recording frame: {e}")
-                time.sleep(0.1) 
+
+        self._finish_recording()
+
+    def _finish_recording(self):
+        """Detach the recorder from the acquisition loop and flush the queue to disk in the background."""
+        with self._finish_lock:
+            # The user, a full queue and the frame limit can all end a recording, only the first one counts
+            if self.stopped.is_set():
+                return
+            self.is_recording = False
+            if self.recorder is not None:
+                self.acquisition_loop.unsubscribe(self.recorder)
+            self.acquisition_loop.release('recording')
+            if self.reducer is not None:
+                self.reducer.discard_partial()
+            if self.trigger is not None:
+                self.trigger.finish()
+                if self.h5_handler.create_hdf5:
+                    self.h5_handler.add_datasets_on_close(self.trigger.datasets())
+                logger.info(f"Change trigger committed {self.trigger.frames_committed} frames in {len(self.trigger.events)} events, "
+                            f"skipped {self.trigger.frames_skipped}")
+            if self.recording_corrector is not None and self.h5_handler.create_hdf5:
+                self.h5_handler.add_datasets_on_close(self.recording_corrector.calibration.datasets())
+            if self.background is not None and self.h5_handler.create_hdf5:
+                # The pedestal is chosen from the first frame, after the attributes were written
+                self.h5_handler.add_attrs_on_close(self.background.attrs())
+
+            if self.queue is not None and self.h5_handler.create_hdf5:
+                # Start cleanup in background
+                self.save_thread = threading.Thread(target=self.h5_handler.cleanup, args=(self.queue,), name="HDF5CleanupThread", daemon=True)
+                self.save_thread.start()
+            self.stopped.set()
+        if self.on_stopped is not None:
+            self.on_stopped()
+
+    def _stored_dtype(self, camera_dtype=np.uint8):
+        """
+        The dtype of the stored frames, which the queue is sized with. The camera dtype is not known
+        before the first frame, the queue corrects its size once that arrives.
+        """
+        dtype = np.dtype(camera_dtype)
+        if self.recording_corrector is not None and self.recording_corrector.output == 'float32':
+            dtype = np.dtype(np.float32)
+        if self.background is not None and self.background.output == 'float32':
+            dtype = np.dtype(np.float32)
+        if self.reducer is not None:
+            dtype = binned_dtype(dtype, self.reducer.binning, self.reducer.bin_mode)
+        return dtype
+
+    def _put_processed_frame(self, frame, timestamp):
+        """
+        Calibrate the frame and subtract the background, then pass on only the frames the change trigger
+        commits, with their pre-roll.
+        """
+        if self.recording_corrector is not None:
+            frame = self.recording_corrector.correct(frame)
+        if self.background is not None:
+            frame = self.background.process(frame)
+        if self.trigger is None:
+            return self._put_reduced_frame(frame, timestamp)
+        for committed, committed_timestamp in self.trigger.process(frame, timestamp):
+            if not self._put_reduced_frame(committed, committed_timestamp):
+                return False
+        return True
+
+    def _put_reduced_frame(self, frame, timestamp):
+        """Reduce and crop the frame on the acquisition thread, only the reduced frames take up queue space."""
+        if self.reducer is not None:
+            frame, timestamp = self.reducer.reduce(frame, timestamp)
+            if frame is None:
+                return True
+        if self.cropper is not None:
+            frame = self.cropper.crop(frame)
+        return self.queue.put_frame(frame, timestamp)
+
+    def wait_until_saved(self, timeout=None):
+        """Block until the queue is flushed and the file closed, returns False on timeout."""
+        if self.save_thread is None:
+            return True
+        self.save_thread.join(timeout)
+        return not self.save_thread.is_alive()
+
+    def get_recording_stats(self):
+        """
+        Measured recording statistics, read from in-memory counters only.
+
+        eta_s is the time until either the queue or the disk fills at the current rates, inf if neither is
+        filling (or no recording is running).
+        """
+        if self.queue is None:
+            return {}
+        stats = self.queue.get_queue_stats()
+        write_rate = self.h5_handler.write_rate.rate()
+        stats['writer_bytes_per_s'] = write_rate
+
+        eta = float('inf')
+        if self.is_recording:
+            inflow = stats['enqueue_bytes_per_s']
+            # The queue grows at the difference between what comes in and what the writer keeps up with,
+            # in memory that is more than the bytes written when the queued frames are cropped views
+            if inflow > write_rate:
+                eta = min(eta, (stats['queue_capacity_bytes'] - stats['queue_bytes']) / ((inflow - write_rate) * self.queue.held_ratio))
+            # Everything that is queued ends up on disk
+            if inflow > 0 and self.h5_handler.file_path:
+                disk_free = psutil.disk_usage(os.path.dirname(os.path.abspath(self.h5_handler.file_path))).free
+                eta = min(eta, max(disk_free - stats['queue_bytes'], 0) / inflow)
+        stats['eta_s'] = eta
+        if self.reducer is not None:
+            stats['reduction_factor'] = self.reducer.reduction_factor
+        if self.trigger is not None:
+            stats.update(self.trigger.get_stats())
+        return stats
+
+    def get_buffered_bytes(self):
+        """Bytes of frames waiting in the recording queue, held as change trigger pre-roll and as background."""
+        queue = self.queue
+        if queue is None:
+            return 0
+        trigger_bytes = self.trigger.get_buffered_bytes() if self.trigger is not None else 0
+        background_bytes = self.background.get_buffered_bytes() if self.background is not None else 0
+        frame_bytes = queue.frame_bytes or queue.roi_width * queue.roi_height * queue.bytes_per_pixel
+        return queue.img_data_queue.qsize() * frame_bytes + trigger_bytes + background_bytes
+
+    def get_net_inflow(self):
+        """Bytes per second the queue grows by, acquisition rate minus write rate, 0 when not recording."""
+        if not self.is_recording or self.queue is None:
+            return 0.0
+        return (self.queue.enqueue_rate.rate() - self.h5_handler.write_rate.rate()) * self.queue.held_ratio
+
+    def _handle_queue_full(self, recorder):
+        """Called on the acquisition thread when the queue stays full, ends the recording."""
+        logger.debug("Queue Full - Stopping Recording")
+        notify("Queue Full - Stopping Recording", duration=2000)
+        self._stop_from_acquisition_thread()
+
+    def _handle_frame_limit(self, recorder):
+        """Called on the acquisition thread once the requested number of frames is queued."""
+        logger.info(f"Recorded {recorder.frames_delivered} frames - Stopping Recording")
+        notify("Frame Limit Reached - Stopping Recording", duration=2000)
+        self._stop_from_acquisition_thread()
+
+    def _stop_from_acquisition_thread(self):
+        # Releasing the loop joins the acquisition thread, so it has to happen off it
+        threading.Thread(target=self._finish_recording, daemon=True).start()
 
     def _cleanup(self):
         self.queue = None
-        self.camera_aq__thread = None
-        self.was_streaming = False
+        self.recorder = None
         self.is_recording = False
-        self.h5_handler = None
-        self.window = None
-        self.camera_control = None
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""
+Single camera acquisition loop that fans every frame out to subscribers.
+The loop owns the camera: live view, recording and snapshots subscribe to it instead of starting and
+stopping acquisition themselves, so they can all run at the same time.
+"""
+import threading, time, logging
+from queue import Queue, Empty
+
+from utils import RateMeter, telemetry, tracer
+
+logger = logging.getLogger(__name__)
+
+class FrameSubscriber:
+    """
+    Base class for consumers of the acquisition loop.
+
+    offer() is called on the acquisition thread with every frame and must return quickly. Each subclass
+    carries its own backpressure policy, so a slow consumer only ever loses its own frames.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.frames_offered = 0
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+
+    @property
+    def finished(self):
+        """True once the subscriber wants no more frames, the loop then detaches it."""
+        return False
+
+    def offer(self, frame, timestamp, frame_number):
+        raise NotImplementedError
+
+    def get_stats(self):
+        return {
+            'frames_offered': self.frames_offered,
+            'frames_delivered': self.frames_delivered,
+            'frames_dropped': self.frames_dropped
+        }
+
+class LatestFrameSubscriber(FrameSubscriber):
+    """
+    Decimated feed for viewers: the callback gets at most `max_fps` frames per second and frames in
+    between are skipped. The callback must only hand the frame off (e.g. into a latest-frame slot).
+    """
+
+    def __init__(self, name, callback, max_fps=None):
+        super().__init__(name)
+        self.callback = callback
+        self.min_interval = 0.0
+        self._next_delivery = 0.0
+        self.set_max_fps(max_fps)
+
+    def set_max_fps(self, max_fps):
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+
+    def offer(self, frame, timestamp, frame_number):
+        self.frames_offered += 1
+        now = time.monotonic()
+        if now < self._next_delivery:
+            self.frames_dropped += 1
+            return
+        # Step the schedule rather than restarting it, so a camera rate that is not a multiple of the cap
+        # still averages out at max_fps. After a gap in frames the schedule starts again from now.
+        if now - self._next_delivery > self.min_interval:
+            self._next_delivery = now + self.min_interval
+        else:
+            self._next_delivery += self.min_interval
+        self.callback(frame)
+        self.frames_delivered += 1
+
+class QueueSubscriber(FrameSubscriber):
+    """
+    Lossless feed for the recorder: every frame goes to `put_frame(frame, timestamp)`, which may wait
+    briefly for space. If it still reports the sink full, the subscriber stops taking frames and calls
+    `on_overflow` once, rather than silently skipping frames in the middle of a recording.
+
+    With `frame_limit` set the subscriber finishes after that many frames and calls `on_complete` once.
+    """
+
+    def __init__(self, name, put_frame, on_overflow=None, frame_limit=None, on_complete=None):
+        super().__init__(name)
+        self.put_frame = put_frame
+        self.on_overflow = on_overflow
+        self.frame_limit = frame_limit
+        self.on_complete = on_complete
+        self.overflowed = False
+
+    @property
+    def finished(self):
+        return self.overflowed or self.complete
+
+    @property
+    def complete(self):
+        return self.frame_limit is not None and self.frames_delivered >= self.frame_limit
+
+    def offer(self, frame, timestamp, frame_number):
+        if self.finished:
+            return
+        self.frames_offered += 1
+        if self.put_frame(frame, timestamp):
+            self.frames_delivered += 1
+            if self.complete and self.on_complete is not None:
+                self.on_complete(self)
+            return
+        self.frames_dropped += 1
+        self.overflowed = True
+        if self.on_overflow is not None:
+            self.on_overflow(self)
+
+class TapSubscriber(FrameSubscriber):
+    """
+    Takes the next `count` consecutive frames and then detaches itself, for snapshots.
+    Frames are handed over through a queue, so the consumer can process each one as it arrives.
+    """
+
+    def __init__(self, name='snapshot', count=1):
+        super().__init__(name)
+        self.count = count
+        self._frames = Queue()
+        self._taken = 0
+
+    @property
+    def finished(self):
+        return self._taken >= self.count
+
+    def offer(self, frame, timestamp, frame_number):
+        if self._taken >= self.count:
+            return
+        self.frames_offered += 1
+        self._frames.put_nowait((frame, timestamp))
+        self._taken += 1
+        self.frames_delivered += 1
+
+    def iter_frames(self, timeout=None):
+        """Yield (frame, timestamp) pairs as they arrive, stopping early if no frame comes within `timeout` seconds."""
+        for _ in range(self.count):
+            try:
+                yield self._frames.get(timeout=timeout)
+            except Empty:
+                logger.warning(f"Tap '{self.name}' timed out waiting for a frame")
+                return
+
+    def wait(self, timeout=None):
+        """Block until all frames have arrived, returns the list of (frame, timestamp) or None on timeout."""
+        frames = list(self.iter_frames(timeout))
+        return frames if len(frames) == self.count else None
+
+class AcquisitionLoop:
+    """
+    Runs the camera on one thread and hands each frame to every subscriber in turn.
+
+    Clients (live view, recording, a snapshot) acquire the loop while they need frames; the camera is
+    started by the first and stopped when the last one releases it.
+    """
+
+    def __init__(self, camera_control):
+        self.camera_control = camera_control
+        self.acquisition_rate = RateMeter()
+        self.frame_number = 0
+        self.is_running = False
+        self._thread = None
+
+        # Subscribers are swapped as a whole tuple so the acquisition thread can iterate without a lock
+        self._subscribers = ()
+        self._lock = threading.Lock()
+        self._clients = set()
+        # Serialises starting and stopping, only ever taken off the acquisition thread
+        self._control_lock = threading.RLock()
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            if subscriber not in self._subscribers:
+                self._subscribers = self._subscribers + (subscriber,)
+        logger.debug(f"Subscriber '{subscriber.name}' attached")
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+        logger.debug(f"Subscriber '{subscriber.name}' detached")
+
+    def acquire(self, client):
+        """Register a client that needs frames, starting the camera if it is the first."""
+        with self._control_lock:
+            with self._lock:
+                self._clients.add(client)
+            if not self.is_running:
+                self.start()
+
+    def release(self, client):
+        """Drop a client, stopping the camera once no client needs it. Must not be called on the acquisition thread."""
+        with self._control_lock:
+            with self._lock:
+                self._clients.discard(client)
+                stop = not self._clients
+            if stop and self.is_running:
+                self.stop()
+
+    def is_active(self, client=None):
+        """True if the loop is running, or if `client` currently holds it."""
+        with self._lock:
+            if client is None:
+                return self.is_running
+            return client in self._clients and self.is_running
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self.is_running = True
+        self.acquisition_rate.reset()
+        self.camera_control.start_camera()
+        self._thread = threading.Thread(target=self._run, name="CameraAQThread", daemon=True)
+        self._thread.start()
+        logger.debug("Acquisition loop started")
+
+    def stop(self):
+        """Stop the loop. Safe to call from a subscriber, the camera is then stopped when the loop unwinds."""
+        self.is_running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        logger.debug("Acquisition loop stopped")
+
+    def _run(self):
+        # No sleep here, get_image() blocks until the camera delivers the next frame so the loop runs at the camera rate
+        while self.is_running:
+            try:
+                start = time.perf_counter()
+                self.camera_control.get_image()
+                got_image = time.perf_counter()
+                timestamp = self.camera_control.get_image_timestamp()
+                frame = self.camera_control.get_image_data()
+                copied = time.perf_counter()
+                telemetry.record('camera_get_image', got_image - start)
+                telemetry.record('copy', copied - got_image)
+                if tracer.enabled:
+                    tracer.complete('grab', 'camera', int(start * 1e6), int((got_image - start) * 1e6))
+                    tracer.complete('copy', 'camera', int(got_image * 1e6), int((copied - got_image) * 1e6))
+
+                if frame is not None:
+                    self.frame_number += 1
+                    self.acquisition_rate.tick()
+                    with tracer.span('fan_out', 'acquisition'):
+                        self._publish(frame, timestamp)
+
+            except Exception as e:
+                logger.error(f"Error in camera thread: {str(e)}")
+                time.sleep(0.1)  # Sleep briefly on error to prevent hammering CPU on error
+
+        try:
+            self.camera_control.stop_camera()
+        except Exception as e:
+            logger.error(f"Error stopping camera: {str(e)}")
+
+    def _publish(self, frame, timestamp):
+        """Offer the frame to every subscriber, one failing subscriber does not affect the others."""
+        finished = []
+        for subscriber in self._subscribers:
+            try:
+                subscriber.offer(frame, timestamp, self.frame_number)
+            except Exception as e:
+                logger.error(f"Error in frame subscriber '{subscriber.name}': {str(e)}")
+            if subscriber.finished:
+                finished.append(subscriber)
+        for subscriber in finished:
+            self.unsubscribe(subscriber)
+
+    def get_stats(self):
+        return {
+            'acquisition_fps': self.acquisition_rate.rate() if self.is_running else 0.0,
+            'frames_acquired': self.frame_number,
+            'subscribers': {s.name: s.get_stats() for s in self._subscribers}
+        }
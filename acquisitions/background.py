@@ -0,0 +1,184 @@
+"""
+Rolling background subtraction, to bring out weakly scattering particles on a static background.
+
+Three estimators, all costing the same per frame whatever the window:
+    mean    Mean of the last `window` frames, a ring buffer of the frames and a running sum
+    ema     Exponential average with weight `alpha` (2 / (window + 1) by default), one map
+    median  Approximate running median by frugal streaming, two maps. Each pixel's estimate steps
+            towards the new value by `alpha` times the pixel's running mean absolute deviation, so it
+            follows the median of roughly the last `window` frames, reaching 90% of a step change
+            in about `window` frames. Outliers such as a passing particle only move it by that step,
+            so particles do not smear into the background as they do with the mean.
+"""
+import time, logging
+import numpy as np
+
+from utils import telemetry
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('mean', 'ema', 'median')
+OUTPUTS = ('camera', 'float32')
+
+class BackgroundSubtractor:
+    """
+    Estimates the background from the frames it is given and returns them with it subtracted.
+
+    Not thread-safe, the estimate follows one stream of frames. The display and the recorder each use
+    their own subtractor.
+
+    Args:
+        method: 'mean', 'ema' or 'median'
+        window: Frames the mean covers, also sets the default `alpha`
+        alpha: Weight of each new frame in the exponential average, and the median's step in units of
+            the mean absolute deviation
+        output: 'camera' adds `pedestal` and clips back to the frame dtype, so the display and recordings
+            work as for raw frames. 'float32' returns the signed difference.
+        pedestal: Level a pixel equal to the background ends up at with 'camera' output. Defaults to the
+            mean level of the first frame, frozen until reset() so the offset does not flicker
+    """
+
+    def __init__(self, method='median', window=50, alpha=None, output='camera', pedestal=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown background method '{method}', use one of {', '.join(METHODS)}")
+        if output not in OUTPUTS:
+            raise ValueError(f"Unknown background output '{output}', use 'camera' or 'float32'")
+        if window < 1:
+            raise ValueError("Background window must be at least 1 frame")
+        self.method = method
+        self.window = int(window)
+        self.alpha = float(alpha) if alpha else 2.0 / (self.window + 1)
+        self.output = output
+        self.pedestal = pedestal
+        self.frames_seen = 0
+        self._pedestal = None  # Offset added with 'camera' output, fixed once chosen
+        self._reset_state()
+
+    @classmethod
+    def from_settings(cls, settings):
+        """A subtractor from the 'background' settings, or None if background subtraction is off."""
+        if not settings or not settings.get('enabled'):
+            return None
+        return cls(settings.get('method', 'median'), settings.get('window', 50), settings.get('alpha'),
+                   settings.get('output', 'camera'), settings.get('pedestal'))
+
+    def _reset_state(self):
+        self._shape = None
+        self._estimate = None  # float32 background for 'ema' and 'median'
+        self._ring = None  # Last `window` frames for 'mean'
+        self._sum = None
+        self._count = 0
+        self._position = 0
+        self._deviation = None  # Running mean absolute deviation per pixel, scales the median's step
+        self._min_deviation = 0.0
+
+    def reset(self):
+        """Forget the background and the pedestal, both are rebuilt from the next frames."""
+        self._reset_state()
+        self._pedestal = None
+
+    @property
+    def background(self):
+        """The current background estimate as float32, None before the first frame."""
+        if self.method == 'mean':
+            if self._sum is None:
+                return None
+            return (self._sum / self._count).astype(np.float32)
+        return self._estimate
+
+    def _start(self, frame):
+        self._shape = frame.shape
+        if self.method == 'mean':
+            self._ring = np.empty((self.window,) + frame.shape, dtype=frame.dtype)
+            # An exact integer sum when the window of frames cannot overflow it
+            if frame.dtype.kind in 'ui' and int(np.iinfo(frame.dtype).max) * self.window < np.iinfo(np.int32).max:
+                sum_dtype = np.int32
+            elif frame.dtype.kind in 'ui':
+                sum_dtype = np.int64
+            else:
+                sum_dtype = np.float64
+            self._sum = np.zeros(frame.shape, dtype=sum_dtype)
+        else:
+            self._estimate = frame.astype(np.float32)
+            if self.method == 'median':
+                # Integer frames step by at least alpha grey levels, or a noiseless pixel would never move
+                self._min_deviation = 1.0 if frame.dtype.kind in 'ui' else 0.0
+                self._deviation = np.full(frame.shape, self._min_deviation, dtype=np.float32)
+
+    def update(self, frame):
+        """Fold `frame` into the background estimate."""
+        if self._shape != frame.shape:
+            if self._shape is not None:
+                logger.info(f"Frame size changed to {frame.shape[1]}x{frame.shape[0]}, restarting the background")
+            self._reset_state()
+            self._start(frame)
+            if self.method != 'mean':
+                return
+        if self.method == 'mean':
+            # Replace the oldest frame of the ring, the sum follows without touching the other frames
+            if self._count == self.window:
+                self._sum -= self._ring[self._position]
+            else:
+                self._count += 1
+            self._ring[self._position] = frame
+            self._sum += frame
+            self._position = (self._position + 1) % self.window
+        elif self.method == 'ema':
+            difference = np.subtract(frame, self._estimate, dtype=np.float32)
+            difference *= self.alpha
+            self._estimate += difference
+        else:
+            self._update_median(frame)
+
+    def _update_median(self, frame):
+        difference = np.subtract(frame, self._estimate, dtype=np.float32)
+        direction = np.sign(difference)
+        distance = np.abs(difference, out=difference)
+        # deviation += alpha * (|frame - estimate| - deviation), the same time constant as the ema
+        self._deviation += self.alpha * (np.maximum(distance, self._min_deviation) - self._deviation)
+        # Step by alpha deviations, never past the new value so a single frame cannot overshoot
+        step = np.minimum(self._deviation * self.alpha, distance, out=distance)
+        step *= direction
+        self._estimate += step
+
+    def subtract(self, frame):
+        """Return `frame` minus the current background, before `frame` is folded in."""
+        background = self.background
+        if background is None or background.shape != frame.shape:
+            background = frame.astype(np.float32)
+        subtracted = np.subtract(frame, background, dtype=np.float32)
+        if self.output == 'float32':
+            return subtracted
+        if self._pedestal is None:
+            self._pedestal = float(self.pedestal) if self.pedestal is not None else round(float(background[::8, ::8].mean()), 2)
+        subtracted += self._pedestal
+        if frame.dtype.kind in 'ui':
+            info = np.iinfo(frame.dtype)
+            np.clip(subtracted, info.min, info.max, out=subtracted)
+            np.rint(subtracted, out=subtracted)
+        return subtracted.astype(frame.dtype)
+
+    def process(self, frame):
+        """Subtract the background from `frame`, then update the background with it."""
+        start = time.perf_counter()
+        subtracted = self.subtract(frame)
+        self.update(frame)
+        self.frames_seen += 1
+        telemetry.record('background', time.perf_counter() - start)
+        return subtracted
+
+    def get_buffered_bytes(self):
+        """Bytes held by the estimate, the whole ring of frames for 'mean'."""
+        return sum(array.nbytes for array in (self._ring, self._sum, self._estimate, self._deviation)
+                   if array is not None)
+
+    def attrs(self):
+        """Estimator parameters for the HDF5 file attributes."""
+        return {
+            'Background Method': self.method,
+            'Background Window': self.window,
+            'Background Alpha': self.alpha if self.method != 'mean' else 0.0,
+            'Background Output': self.output,
+            # The offset added to the stored frames, -1 while it is not chosen yet
+            'Background Pedestal': 0.0 if self.output == 'float32' else (self._pedestal if self._pedestal is not None else -1.0)
+        }
@@ -0,0 +1,283 @@
+"""
+Dark-frame, flat-field and hot-pixel calibration.
+
+Workflow:
+    1. Block the light and average a stack of dark frames, hot pixels are found from its statistics
+    2. Illuminate evenly and average a stack of flat frames (optional)
+    3. Apply the calibration live: corrected = (frame - offset) * gain, then hot pixels are replaced
+       by the mean of their good 4-neighbours
+
+The maps are precomputed in float32 once, so the live correction is two array operations per pixel,
+spread across a thread pool in row stripes (numpy releases the GIL on large arrays).
+"""
+import os, time, logging
+from concurrent.futures import ThreadPoolExecutor
+import h5py
+import numpy as np
+
+from .acquisition_loop import TapSubscriber
+from utils import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Frames smaller than this are corrected on the calling thread, stripes would cost more than they save
+MIN_STRIPED_PIXELS = 256 * 1024
+
+def acquire_frame_stack(acquisition_loop, count, timeout=5.0):
+    """
+    Average the next `count` frames from the acquisition loop.
+
+    Returns:
+        tuple: (mean, std, frames) as float32 maps and the number of frames averaged, std is per pixel
+        over the stack. None if no frame arrived.
+    """
+    tap = TapSubscriber('calibration', count)
+    acquisition_loop.subscribe(tap)
+    acquisition_loop.acquire(tap)
+    try:
+        mean = None
+        m2 = None
+        frames = 0
+        # Welford's update in float64, a long stack of bright frames would lose precision in float32
+        for frame, timestamp in tap.iter_frames(timeout=timeout):
+            frames += 1
+            values = frame.astype(np.float64)
+            if mean is None:
+                mean = values
+                m2 = np.zeros_like(values)
+                continue
+            delta = values - mean
+            mean += delta / frames
+            m2 += delta * (values - mean)
+    finally:
+        acquisition_loop.unsubscribe(tap)
+        acquisition_loop.release(tap)
+    if mean is None:
+        return None
+    std = np.sqrt(m2 / max(frames - 1, 1))
+    return mean.astype(np.float32), std.astype(np.float32), frames
+
+def _robust_outliers(values, sigma):
+    """Pixels more than `sigma` robust standard deviations (from the MAD) above the median."""
+    median = float(np.median(values))
+    spread = float(np.median(np.abs(values - median))) * 1.4826
+    return values > median + sigma * max(spread, 1e-3)
+
+class Calibration:
+    """
+    Correction maps for one sensor size.
+
+    Args:
+        offset: float32 map subtracted from every frame (the dark mean)
+        gain: float32 map multiplied in after the offset (flat normalisation), ones without a flat
+        hot_pixels: Flat indices of defective pixels
+        stacks: The dark_mean, dark_std and flat_mean the maps were built from, kept so one step can be redone
+        info: Provenance, e.g. frame counts and the time the stacks were taken
+    """
+
+    def __init__(self, offset, gain, hot_pixels, stacks=None, info=None):
+        self.offset = np.ascontiguousarray(offset, dtype=np.float32)
+        self.gain = np.ascontiguousarray(gain, dtype=np.float32)
+        self.hot_pixels = np.asarray(hot_pixels, dtype=np.int64)
+        self.stacks = stacks or {}
+        self.info = info or {}
+        self._neighbours, self._weights = self._replacement_neighbours()
+
+    @property
+    def shape(self):
+        return self.offset.shape
+
+    @classmethod
+    def from_stacks(cls, dark_mean=None, dark_std=None, flat_mean=None, hot_sigma=6.0, min_flat_fraction=0.05, info=None):
+        """
+        Build the maps from averaged stacks.
+
+        Hot pixels are dark-mean outliers (hot) or dark-std outliers (noisy). With a flat, pixels that
+        get less than `min_flat_fraction` of the median flat signal are dead and replaced as well. The
+        gain normalises to the median flat signal, so corrected frames keep their brightness.
+        """
+        if dark_mean is None and flat_mean is None:
+            raise ValueError("A calibration needs a dark or a flat stack")
+        shape = (dark_mean if dark_mean is not None else flat_mean).shape
+        offset = dark_mean if dark_mean is not None else np.zeros(shape, dtype=np.float32)
+        defective = np.zeros(shape, dtype=bool)
+        if dark_mean is not None:
+            defective |= _robust_outliers(dark_mean, hot_sigma)
+        if dark_std is not None:
+            defective |= _robust_outliers(dark_std, hot_sigma)
+
+        gain = np.ones(shape, dtype=np.float32)
+        if flat_mean is not None:
+            if flat_mean.shape != shape:
+                raise ValueError(f"Flat stack {flat_mean.shape} does not match the dark stack {shape}")
+            signal = flat_mean.astype(np.float32) - offset
+            target = float(np.median(signal[~defective])) if (~defective).any() else float(np.median(signal))
+            if target <= 0:
+                raise ValueError("The flat stack is not brighter than the dark stack")
+            dead = signal < min_flat_fraction * target
+            defective |= dead
+            np.divide(target, signal, out=gain, where=~dead)
+
+        stacks = {name: stack for name, stack in (('dark_mean', dark_mean), ('dark_std', dark_std), ('flat_mean', flat_mean))
+                  if stack is not None}
+        calibration = cls(offset, gain, np.flatnonzero(defective), stacks, info)
+        logger.info(f"Calibration built for {shape[1]}x{shape[0]}: {len(calibration.hot_pixels)} defective pixels"
+                    f"{', with flat field' if flat_mean is not None else ''}")
+        return calibration
+
+    def _replacement_neighbours(self):
+        """Indices and weights of the good 4-neighbours of every defective pixel."""
+        if not len(self.hot_pixels):
+            return np.zeros((0, 4), dtype=np.int64), np.zeros((0, 4), dtype=np.float32)
+        height, width = self.shape
+        rows, columns = np.divmod(self.hot_pixels, width)
+        defective = np.zeros(height * width, dtype=bool)
+        defective[self.hot_pixels] = True
+
+        neighbour_rows = np.stack([rows, rows, rows - 1, rows + 1], axis=1)
+        neighbour_columns = np.stack([columns - 1, columns + 1, columns, columns], axis=1)
+        inside = (neighbour_rows >= 0) & (neighbour_rows < height) & (neighbour_columns >= 0) & (neighbour_columns < width)
+        neighbours = np.where(inside, neighbour_rows * width + neighbour_columns, 0)
+        valid = inside & ~defective[neighbours]
+        counts = valid.sum(axis=1, keepdims=True)
+        weights = np.where(valid, 1.0 / np.maximum(counts, 1), 0.0).astype(np.float32)
+        # A pixel in a cluster with no good neighbour keeps its own corrected value
+        isolated = counts[:, 0] == 0
+        neighbours[isolated, 0] = self.hot_pixels[isolated]
+        weights[isolated, 0] = 1.0
+        return neighbours, weights
+
+    def replace_hot_pixels(self, image):
+        """Replace the defective pixels of a corrected image in place."""
+        if not len(self.hot_pixels):
+            return
+        flat = image.reshape(-1)
+        values = (flat[self._neighbours].astype(np.float32) * self._weights).sum(axis=1)
+        if image.dtype.kind != 'f':
+            values = np.rint(values)
+        flat[self.hot_pixels] = values
+
+    def attrs(self):
+        """Provenance for the HDF5 attributes of a corrected recording."""
+        attrs = {f"Calibration {key}": value for key, value in self.info.items()}
+        attrs['Calibration Hot Pixels'] = len(self.hot_pixels)
+        attrs['Calibration Flat Field'] = 'flat_mean' in self.stacks
+        return attrs
+
+    def datasets(self, prefix='calibration'):
+        """The maps to store next to a corrected recording."""
+        return {
+            f"{prefix}/offset": self.offset,
+            f"{prefix}/gain": self.gain,
+            f"{prefix}/hot_pixels": self.hot_pixels
+        }
+
+    def save(self, file_path):
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        with h5py.File(file_path, 'w') as f:
+            f.attrs.update(self.info)
+            for path, data in self.datasets('').items():
+                f.create_dataset(path.lstrip('/'), data=data)
+            for name, stack in self.stacks.items():
+                f.create_dataset(f"stacks/{name}", data=stack)
+        logger.info(f"Calibration saved to {file_path}")
+
+    @classmethod
+    def load(cls, file_path):
+        with h5py.File(file_path, 'r') as f:
+            stacks = {name: dataset[()] for name, dataset in f['stacks'].items()} if 'stacks' in f else {}
+            return cls(f['offset'][()], f['gain'][()], f['hot_pixels'][()], stacks, dict(f.attrs))
+
+def update_calibration(calibration, kind, mean, std=None, hot_sigma=6.0, info=None):
+    """
+    Replace the 'dark' or 'flat' stack of `calibration` and rebuild the maps, so either step can be
+    redone on its own. A calibration for another frame size, or None, starts afresh.
+    """
+    if kind not in ('dark', 'flat'):
+        raise ValueError(f"Unknown calibration stack '{kind}', use 'dark' or 'flat'")
+    stacks = {}
+    merged_info = {}
+    if calibration is not None and calibration.shape == mean.shape:
+        stacks.update(calibration.stacks)
+        merged_info.update(calibration.info)
+    elif calibration is not None:
+        logger.info(f"Discarding the calibration for {calibration.shape[1]}x{calibration.shape[0]} frames")
+    if kind == 'dark':
+        stacks['dark_mean'] = mean
+        stacks.pop('dark_std', None)
+        if std is not None:
+            stacks['dark_std'] = std
+    else:
+        stacks['flat_mean'] = mean
+    merged_info.update(info or {})
+    return Calibration.from_stacks(hot_sigma=hot_sigma, info=merged_info, **stacks)
+
+class FrameCorrector:
+    """
+    Applies a Calibration to frames, in row stripes across a thread pool.
+
+    Safe to share between threads (the display and the recorder), every call gets its own output array.
+
+    Args:
+        calibration: Calibration matching the frames
+        workers: Threads, one stripe each
+        output: 'camera' rounds and clips back to the frame dtype so recordings stay the same size,
+            'float32' keeps the corrected values as they are
+    """
+
+    OUTPUTS = ('camera', 'float32')
+
+    def __init__(self, calibration, workers=4, output='camera'):
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Unknown calibration output '{output}', use 'camera' or 'float32'")
+        self.calibration = calibration
+        self.workers = max(int(workers), 1)
+        self.output = output
+        self.frames_corrected = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="Calibration") if self.workers > 1 else None
+
+    def check(self, height, width):
+        """Raise ValueError if frames of this size cannot be corrected, e.g. after the ROI changed."""
+        if self.calibration.shape != (height, width):
+            calibration_height, calibration_width = self.calibration.shape
+            raise ValueError(f"Calibration is for {calibration_width}x{calibration_height} frames, not {width}x{height}")
+
+    def correct(self, frame):
+        """Return the corrected frame."""
+        if frame.shape != self.calibration.shape:
+            self.check(*frame.shape[:2])
+        start = time.perf_counter()
+        corrected = np.empty(frame.shape, dtype=np.float32 if self.output == 'float32' else frame.dtype)
+        height = frame.shape[0]
+        if self._executor is None or frame.size < MIN_STRIPED_PIXELS:
+            self._correct_stripe(frame, corrected, 0, height)
+        else:
+            bounds = np.linspace(0, height, self.workers + 1).astype(int)
+            futures = [self._executor.submit(self._correct_stripe, frame, corrected, first, last)
+                       for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+            for future in futures:
+                future.result()
+        self.calibration.replace_hot_pixels(corrected)
+        self.frames_corrected += 1
+        telemetry.record('calibration', time.perf_counter() - start)
+        return corrected
+
+    def _correct_stripe(self, frame, corrected, first, last):
+        offset = self.calibration.offset[first:last]
+        gain = self.calibration.gain[first:last]
+        if corrected.dtype == np.float32:
+            values = corrected[first:last]
+            np.subtract(frame[first:last], offset, out=values, dtype=np.float32)
+            np.multiply(values, gain, out=values)
+            return
+        values = np.subtract(frame[first:last], offset, dtype=np.float32)
+        np.multiply(values, gain, out=values)
+        if corrected.dtype.kind != 'f':
+            info = np.iinfo(corrected.dtype)
+            np.clip(values, info.min, info.max, out=values)
+            np.rint(values, out=values)
+        corrected[first:last] = values
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,200 @@
+"""
+Change-triggered recording: frames are only committed to the recording while the scene changes.
+"""
+import time, threading, logging
+from array import array
+from collections import deque
+import numpy as np
+
+from utils import telemetry
+
+logger = logging.getLogger(__name__)
+
+class ChangeTrigger:
+    """
+    Decides per camera frame whether it is recorded.
+
+    The change metric is the mean absolute difference between a subsampled grid of the frame and a
+    running reference of the same grid (an exponential average with weight `reference_alpha`, so slow
+    drift such as bleaching does not trigger). A frame whose change exceeds `threshold` (in grey levels)
+    is committed together with up to `pre_roll` frames before it, and the `post_roll` frames after the
+    change has stopped are committed too.
+
+    The reference keeps following the frames while they are committed, so a lasting change (a particle
+    that settles) is absorbed and the trigger ends. The flip side is that after a transient of amplitude
+    A the reference has moved towards it, and the change stays above the threshold for about
+    log(threshold / A) / log(1 - reference_alpha) frames after the scene is back, on top of `post_roll`.
+
+    Every frame that is not committed has its timestamp kept in `skipped_timestamps`, and every run of
+    committed frames is kept in `events` as (first timestamp, last timestamp, frames), so the timing of
+    the whole acquisition can be reconstructed from the file.
+
+    Args:
+        threshold: Mean absolute difference that counts as change, in grey levels
+        subsample: Grid step in pixels
+        roi: Optional (x, y, width, height) the metric is restricted to, in frame coordinates
+        reference_alpha: Weight of each new frame in the running reference
+        pre_roll: Frames kept before a change
+        post_roll: Frames kept after the change has stopped
+    """
+
+    def __init__(self, threshold=2.0, subsample=8, roi=None, reference_alpha=0.1, pre_roll=10, post_roll=30):
+        if subsample < 1 or pre_roll < 0 or post_roll < 0:
+            raise ValueError("Trigger subsample must be at least 1, pre- and post-roll at least 0")
+        self.threshold = float(threshold)
+        self.subsample = int(subsample)
+        self.roi = tuple(int(value) for value in roi) if roi else None
+        self.reference_alpha = float(reference_alpha)
+        self.pre_roll = int(pre_roll)
+        self.post_roll = int(post_roll)
+
+        self.change = 0.0
+        self.frames_seen = 0
+        self.frames_committed = 0
+        self.skipped_timestamps = array('d')
+        self.events = []
+        self._reference = None
+        self._buffer = deque()
+        self._post_remaining = 0
+        self._event = None  # [first timestamp, last timestamp, frames] of the run being committed
+        # finish() runs on the thread stopping the recording, a frame may still be in process()
+        self._lock = threading.Lock()
+        self._roi_warned = False
+
+    @classmethod
+    def from_settings(cls, settings):
+        """A trigger from the 'trigger' settings, or None if triggered recording is off."""
+        if not settings or not settings.get('enabled'):
+            return None
+        return cls(settings.get('threshold', 2.0), settings.get('subsample', 8), settings.get('roi'),
+                   settings.get('reference_alpha', 0.1), settings.get('pre_roll', 10), settings.get('post_roll', 30))
+
+    @property
+    def active(self):
+        """True while frames are being committed."""
+        return self._event is not None
+
+    @property
+    def frames_skipped(self):
+        return len(self.skipped_timestamps)
+
+    def validate(self, frame_height, frame_width):
+        """Raise ValueError if the ROI does not lie inside frames of the given size."""
+        if self.roi is None:
+            return
+        x, y, width, height = self.roi
+        if x < 0 or y < 0 or width < 1 or height < 1 or x + width > frame_width or y + height > frame_height:
+            raise ValueError(f"Trigger ROI ({x}, {y}, {width}x{height}) lies outside the {frame_width}x{frame_height} frame")
+
+    def _grid(self, frame):
+        step = self.subsample
+        if self.roi is not None:
+            try:
+                self.validate(*frame.shape[:2])
+                x, y, width, height = self.roi
+                frame = frame[y:y + height, x:x + width]
+            except ValueError as e:
+                # E.g. the frames changed size after the recording started, an empty grid would never trigger
+                if not self._roi_warned:
+                    logger.warning(f"{str(e)}, measuring change on the full frame")
+                    self._roi_warned = True
+        return frame[::step, ::step].astype(np.float32)
+
+    def measure(self, frame):
+        """Update the running reference with `frame` and return its change against the reference."""
+        grid = self._grid(frame)
+        if self._reference is None or self._reference.shape != grid.shape:
+            self._reference = grid
+            return 0.0
+        difference = grid - self._reference
+        change = float(np.abs(difference).mean())
+        # reference += alpha * (grid - reference), reusing the difference
+        difference *= self.reference_alpha
+        self._reference += difference
+        return change
+
+    def process(self, frame, timestamp):
+        """
+        Take one camera frame, returns the list of (frame, timestamp) to commit now: empty while the scene
+        is static, the pre-roll plus this frame when a change starts.
+        """
+        with self._lock:
+            return self._process(frame, timestamp)
+
+    def _process(self, frame, timestamp):
+        start = time.perf_counter()
+        self.frames_seen += 1
+        self.change = self.measure(frame)
+        commit = []
+        if self.change > self.threshold:
+            if self._event is None:
+                logger.debug(f"Change {self.change:.2f} above {self.threshold}, committing {len(self._buffer)} pre-roll frames")
+            commit.extend(self._buffer)
+            self._buffer.clear()
+            commit.append((frame, timestamp))
+            self._post_remaining = self.post_roll
+        elif self._post_remaining > 0:
+            commit.append((frame, timestamp))
+            self._post_remaining -= 1
+        else:
+            self._end_event()
+            self._buffer.append((frame, timestamp))
+            if len(self._buffer) > self.pre_roll:
+                _, skipped = self._buffer.popleft()
+                self._skip(skipped)
+
+        for _, committed in commit:
+            if self._event is None:
+                self._event = [committed, committed, 0]
+            self._event[1] = committed
+            self._event[2] += 1
+        self.frames_committed += len(commit)
+        telemetry.record('change_trigger', time.perf_counter() - start)
+        return commit
+
+    def _skip(self, timestamp):
+        self.skipped_timestamps.append(timestamp if timestamp is not None else np.nan)
+
+    def _end_event(self):
+        if self._event is not None:
+            self.events.append(tuple(self._event))
+            self._event = None
+
+    def finish(self):
+        """End of the recording: close the open event, the frames still held as pre-roll count as skipped."""
+        with self._lock:
+            self._end_event()
+            while self._buffer:
+                _, timestamp = self._buffer.popleft()
+                self._skip(timestamp)
+
+    def get_buffered_bytes(self):
+        """Bytes of pre-roll frames held in memory."""
+        return sum(frame.nbytes for frame, _ in list(self._buffer))
+
+    def attrs(self):
+        """Trigger parameters for the HDF5 file attributes."""
+        return {
+            'Trigger Threshold': self.threshold,
+            'Trigger Subsample': self.subsample,
+            'Trigger ROI': list(self.roi) if self.roi else [],
+            'Trigger Reference Alpha': self.reference_alpha,
+            'Trigger Pre-roll': self.pre_roll,
+            'Trigger Post-roll': self.post_roll
+        }
+
+    def datasets(self):
+        """What is stored under 'trigger/' once the recording ends."""
+        return {
+            'trigger/skipped_timestamps': np.array(self.skipped_timestamps, dtype=np.float64),
+            'trigger/events': np.array(self.events, dtype=np.float64).reshape(-1, 3)
+        }
+
+    def get_stats(self):
+        return {
+            'trigger_change': self.change,
+            'trigger_active': self.active,
+            'trigger_frames_committed': self.frames_committed,
+            'trigger_frames_skipped': self.frames_skipped,
+            'trigger_events': len(self.events) + (1 if self.active else 0)
+        }
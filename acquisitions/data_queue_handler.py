@@ -1,7 +1,7 @@
-import threading
+import threading, time
 from queue import Queue, Empty, Full
 import psutil
-from interface.status_bar.update_notif import update_notif
+from utils import telemetry, RateMeter, tracer, notify
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,32 +9,29 @@ logger = logging.getLogger(__name__)
 class ImgDataQueueHandler:
     """Handles the queue setup and management for frame logging."""
     
-    def __init__(self, window, roi_width, roi_height):
-        self.window = window
-        
+    def __init__(self, roi_width, roi_height, bytes_per_pixel=1):
         # Store ROI dimensions
         self.roi_width = roi_width
         self.roi_height = roi_height
+        self.bytes_per_pixel = bytes_per_pixel
         
         # Initialize queue
-        self.queue_size = self._calculate_queue_size()
+        self.queue_size = self._calculate_queue_size(roi_width * roi_height * bytes_per_pixel)
         self.img_data_queue = Queue(maxsize=self.queue_size)
         self.frame_bytes = None
+        self.held_ratio = 1.0  # Memory a queued frame holds per byte that gets written
         
         # Performance tracking
         self.frames_dropped = 0
         self.frames_recorded = 0
         self.frames_saved = 0
+        self.enqueue_rate = RateMeter()  # Bytes per second going into the queue
         
-    def _calculate_queue_size(self):
+    def _calculate_queue_size(self, bytes_per_frame):
         """Calculate queue size based on 90% of available RAM."""
         available_ram = psutil.virtual_memory().available
         queue_size_bytes = available_ram * 0.9
         
-        # Calculate bytes per frame (assuming 8-bit depth) We can update this one day to handle any bit depth
-        bytes_per_pixel = 1  # 8-bit = 1 byte
-        bytes_per_frame = self.roi_width * self.roi_height * bytes_per_pixel
-        
         queue_size_elements = queue_size_bytes / bytes_per_frame
         queue_size_GB = int(queue_size_bytes / 1024**3)
         
@@ -44,7 +41,7 @@ class ImgDataQueueHandler:
     def _update_notif(self, message):
         """Update status bar and print message."""
         logger.debug(message)
-        update_notif(message)
+        notify(message)
         
     def _format_size(self, bytes_size):
         """Format bytes to human readable size."""
@@ -63,20 +60,37 @@ class ImgDataQueueHandler:
     def put_frame(self, frame, timestamp):
         """Put a frame in the queue with backpressure handling."""
         if self.frame_bytes is None:
-            self.frame_bytes = frame.nbytes
+            # Cropped frames hold on to the whole frame they are views of
+            self.frame_bytes = getattr(frame, 'held_bytes', frame.nbytes)
+            self.held_ratio = self.frame_bytes / frame.nbytes if frame.nbytes else 1.0
+            # The queue was sized from the expected dtype, the first frame tells what each one really holds
+            if self.frame_bytes != self.roi_width * self.roi_height * self.bytes_per_pixel:
+                self.queue_size = self._calculate_queue_size(self.frame_bytes)
+                self.img_data_queue.maxsize = self.queue_size
             
+        start = time.perf_counter()
         try:
-            self.img_data_queue.put((frame, timestamp), timeout=0.1)
+            # The enqueue time travels with the frame so the wait in the queue can be measured
+            self.img_data_queue.put((frame, timestamp, start), timeout=0.1)
             self.frames_recorded += 1
+            self.enqueue_rate.tick(frame.nbytes)
             return True
         except Full:
+            self.frames_dropped += 1
             return False
+        finally:
+            duration = time.perf_counter() - start
+            telemetry.record('enqueue', duration)
+            if tracer.enabled:
+                tracer.complete('queue.put', 'queue', int(start * 1e6), int(duration * 1e6))
             
     def get_frame(self, timeout=0.1):
         """Get a frame from the queue."""
         try:
-            frame, timestamp = self.img_data_queue.get(timeout=timeout)
+            with tracer.span('queue.get', 'queue'):
+                frame, timestamp, enqueued = self.img_data_queue.get(timeout=timeout)
             self.img_data_queue.task_done()
+            telemetry.record('queue_wait', time.perf_counter() - enqueued)
             return frame, timestamp
         except Empty:
             return None, None
@@ -87,12 +101,19 @@ class ImgDataQueueHandler:
         
     def get_queue_stats(self):
         """Get current queue statistics."""
+        queue_size = self.img_data_queue.qsize()
+        # Before the first frame arrives fall back on the estimate the queue was sized with
+        frame_bytes = self.frame_bytes or self.roi_width * self.roi_height * self.bytes_per_pixel
         return {
             'frames_recorded': self.frames_recorded,
             'frames_saved': self.frames_saved,
             'frames_dropped': self.frames_dropped,
-            'queue_size': self.img_data_queue.qsize(),
-            'queue_capacity': self.queue_size
+            'queue_size': queue_size,
+            'queue_capacity': self.queue_size,
+            'queue_bytes': queue_size * frame_bytes,
+            'queue_capacity_bytes': self.queue_size * frame_bytes,
+            'queue_fill': queue_size / self.queue_size if self.queue_size else 0.0,
+            'enqueue_bytes_per_s': self.enqueue_rate.rate()
         }
         
     def reset_stats(self):
@@ -100,3 +121,4 @@ class ImgDataQueueHandler:
         self.frames_dropped = 0
         self.frames_recorded = 0
         self.frames_saved = 0
+        self.enqueue_rate.reset()
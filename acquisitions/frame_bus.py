@@ -0,0 +1,289 @@
+"""
+Shared-memory frame bus for analysis programs running in other processes.
+
+The publisher copies frames into a named ring of fixed-size slots. Each slot carries a small header, and
+a seqlock counter that is odd while the slot is being written. Readers copy a slot and check the
+counter did not move, and compare the slot's bus sequence with the one they asked for, so they can tell
+a torn or overwritten read and how many frames they were lapped by. The producer never waits for
+anybody, a slow reader only loses frames itself.
+
+Reading from another process:
+    from acquisitions.frame_bus import FrameBusReader
+
+    with FrameBusReader('microtool_frames') as bus:
+        while True:
+            frame, info = bus.read_next(timeout=1.0)
+            if frame is None:
+                continue
+            if info['lapped']:
+                print(f"missed {info['lapped']} frames")
+
+Stores are ordered on x86, so the seqlock holds there. On weaker memory models a torn read is still
+caught by the sequence check in most cases, but not guaranteed.
+"""
+import os, time, logging
+import numpy as np
+from multiprocessing import shared_memory
+
+from .acquisition_loop import FrameSubscriber
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MTFB'
+VERSION = 1
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+
+BUS_HEADER = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('slot_count', '<u4'),
+    ('producer_pid', '<u4'),
+    ('slot_size', '<u8'),
+    ('write_sequence', '<u8')  # Bus sequence of the newest complete frame, 0 before the first
+])
+
+SLOT_HEADER = np.dtype([
+    ('lock', '<u8'),  # Seqlock counter, odd while the slot is written
+    ('sequence', '<u8'),  # Bus sequence, counts every published frame from 1
+    ('frame_number', '<u8'),  # Acquisition loop frame number
+    ('timestamp', '<f8'),
+    ('shape', '<u4', (3,)),
+    ('ndim', '<u4'),
+    ('nbytes', '<u8'),
+    ('dtype', 'S8')
+])
+
+def _segment_size(slot_count, slot_size):
+    return HEADER_SIZE + slot_count * (SLOT_HEADER_SIZE + slot_size)
+
+def _views(buffer, slot_count, slot_size):
+    """numpy views of the bus header, the slot headers and the slot data in a shared buffer."""
+    header = np.ndarray((), dtype=BUS_HEADER, buffer=buffer, offset=0)
+    slot_headers, slot_data = [], []
+    for slot in range(slot_count):
+        offset = HEADER_SIZE + slot * (SLOT_HEADER_SIZE + slot_size)
+        slot_headers.append(np.ndarray((), dtype=SLOT_HEADER, buffer=buffer, offset=offset))
+        slot_data.append(np.ndarray((slot_size,), dtype=np.uint8, buffer=buffer, offset=offset + SLOT_HEADER_SIZE))
+    return header, slot_headers, slot_data
+
+def _attach(name):
+    """Attach to an existing segment without registering it for cleanup, that stays with the producer."""
+    try:
+        return shared_memory.SharedMemory(name=name, create=False, track=False)
+    except TypeError:
+        # Before Python 3.13 every attach is tracked, and the segment would be unlinked when the reader exits
+        memory = shared_memory.SharedMemory(name=name, create=False)
+        header = np.ndarray((), dtype=BUS_HEADER, buffer=memory.buf, offset=0)
+        # In the producer's own process the registration is the producer's, leave it
+        if int(header['producer_pid']) != os.getpid():
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(memory._name, 'shared_memory')
+            except Exception:
+                pass
+        del header
+        return memory
+
+class FrameBusPublisher(FrameSubscriber):
+    """
+    Acquisition loop subscriber publishing frames into the shared-memory ring.
+
+    Frames larger than a slot are skipped and counted in frames_dropped. With `max_fps` set, frames in
+    between are skipped rather than published.
+    """
+
+    def __init__(self, name='microtool_frames', slot_count=8, slot_size=16 * 1024**2, max_fps=None):
+        super().__init__('frame_bus')
+        self.bus_name = name
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.published = 0
+        self._next_publish = 0.0
+
+        try:
+            # A segment left behind by a crashed session is replaced
+            stale = shared_memory.SharedMemory(name=name, create=False)
+            stale.close()
+            stale.unlink()
+            logger.warning(f"Replaced stale frame bus segment '{name}'")
+        except FileNotFoundError:
+            pass
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=_segment_size(slot_count, slot_size))
+        self.header, self.slot_headers, self.slot_data = _views(self.memory.buf, slot_count, slot_size)
+        self.header['magic'] = MAGIC
+        self.header['version'] = VERSION
+        self.header['slot_count'] = slot_count
+        self.header['producer_pid'] = os.getpid()
+        self.header['slot_size'] = slot_size
+        self.header['write_sequence'] = 0
+        logger.info(f"Frame bus '{name}' published with {slot_count} slots of {slot_size / 1024**2:.1f} MB")
+
+    @property
+    def nbytes(self):
+        return self.memory.size
+
+    def offer(self, frame, timestamp, frame_number):
+        """Copy one frame into the next slot, called on the acquisition thread."""
+        self.frames_offered += 1
+        if self.min_interval:
+            now = time.monotonic()
+            if now < self._next_publish:
+                return
+            self._next_publish = now + self.min_interval
+        if frame.nbytes > self.slot_size or frame.ndim > 3:
+            self.frames_dropped += 1
+            return
+
+        sequence = self.published + 1
+        slot = sequence % self.slot_count
+        slot_header = self.slot_headers[slot]
+        lock = int(slot_header['lock'])
+        slot_header['lock'] = lock + 1
+        slot_header['sequence'] = sequence
+        slot_header['frame_number'] = frame_number
+        slot_header['timestamp'] = timestamp if timestamp is not None else np.nan
+        slot_header['shape'] = frame.shape + (0,) * (3 - frame.ndim)
+        slot_header['ndim'] = frame.ndim
+        slot_header['nbytes'] = frame.nbytes
+        slot_header['dtype'] = frame.dtype.str.encode()
+        self.slot_data[slot][:frame.nbytes] = np.ascontiguousarray(frame).reshape(-1).view(np.uint8)
+        slot_header['lock'] = lock + 2
+        self.header['write_sequence'] = sequence
+        self.published = sequence
+        self.frames_delivered += 1
+
+    def close(self):
+        """Remove the segment, attached readers keep their mapping until they close."""
+        # The numpy views hold exports of the buffer, they have to go before the segment can close
+        self.header = self.slot_headers = self.slot_data = None
+        try:
+            self.memory.close()
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+        logger.info(f"Frame bus '{self.bus_name}' closed after {self.published} frames")
+
+class FrameBusReader:
+    """
+    Reads frames from a frame bus published by another process. Frames are returned as copies.
+
+    read_next() returns every frame in order as long as the reader keeps up. Once it falls a ring behind
+    it skips ahead to the oldest frame that is still safe to read, and reports the skipped count as
+    'lapped'. latest() always returns the newest frame.
+    """
+
+    # Sleep between polls while waiting for a new frame
+    POLL_INTERVAL = 0.0005
+
+    def __init__(self, name='microtool_frames'):
+        self.name = name
+        self.memory = _attach(name)
+        header = np.ndarray((), dtype=BUS_HEADER, buffer=self.memory.buf, offset=0)
+        if bytes(header['magic']) != MAGIC or int(header['version']) != VERSION:
+            header = None
+            self.memory.close()
+            raise ValueError(f"'{name}' is not a version {VERSION} microTool frame bus")
+        self.slot_count = int(header['slot_count'])
+        self.slot_size = int(header['slot_size'])
+        self.header, self.slot_headers, self.slot_data = _views(self.memory.buf, self.slot_count, self.slot_size)
+        # Start from the newest frame, not from whatever was published before the reader attached
+        self.last_sequence = int(self.header['write_sequence'])
+        self.frames_read = 0
+        self.frames_lapped = 0
+
+    @property
+    def write_sequence(self):
+        return int(self.header['write_sequence'])
+
+    def _read_slot(self, sequence):
+        """Copy the frame with bus `sequence`, or None if the slot no longer (or not yet) holds it."""
+        slot = sequence % self.slot_count
+        slot_header = self.slot_headers[slot]
+        lock = int(slot_header['lock'])
+        if lock & 1:
+            return None
+        meta = slot_header.copy()[()]
+        if int(meta['sequence']) != sequence:
+            return None
+        ndim = int(meta['ndim'])
+        shape = tuple(int(size) for size in meta['shape'][:ndim])
+        frame = self.slot_data[slot][:int(meta['nbytes'])].view(np.dtype(meta['dtype'].decode())).reshape(shape).copy()
+        if int(slot_header['lock']) != lock:
+            return None
+        return frame, {
+            'sequence': sequence,
+            'frame_number': int(meta['frame_number']),
+            'timestamp': float(meta['timestamp'])
+        }
+
+    def read_next(self, timeout=None):
+        """
+        Wait for the frame after the last one read.
+
+        Returns:
+            tuple: (frame, info) with info holding sequence, frame_number, timestamp and lapped, the number
+            of frames skipped since the previous read. (None, None) on timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        lapped = 0
+        while True:
+            target = self.last_sequence + 1
+            latest = self.write_sequence
+            if latest < target:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None, None
+                time.sleep(self.POLL_INTERVAL)
+                continue
+            # One slot is kept as margin for the frame being written right now
+            oldest_safe = max(latest - self.slot_count + 2, 1)
+            if target < oldest_safe:
+                lapped += oldest_safe - target
+                self.last_sequence = oldest_safe - 1
+                continue
+            result = self._read_slot(target)
+            if result is None:
+                # Overwritten while copying, the writer has come round again
+                lapped += 1
+                self.last_sequence = target
+                continue
+            self.last_sequence = target
+            self.frames_read += 1
+            self.frames_lapped += lapped
+            frame, info = result
+            info['lapped'] = lapped
+            return frame, info
+
+    def latest(self):
+        """The newest frame as (frame, info), (None, None) before the first frame."""
+        for _ in range(self.slot_count):
+            sequence = self.write_sequence
+            if sequence == 0:
+                return None, None
+            result = self._read_slot(sequence)
+            if result is not None:
+                self.last_sequence = max(self.last_sequence, sequence)
+                frame, info = result
+                info['lapped'] = 0
+                return frame, info
+        return None, None
+
+    def frames(self, timeout=None):
+        """Iterate over read_next() results until a read times out."""
+        while True:
+            frame, info = self.read_next(timeout)
+            if frame is None:
+                return
+            yield frame, info
+
+    def close(self):
+        self.header = self.slot_headers = self.slot_data = None
+        self.memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
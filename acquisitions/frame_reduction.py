@@ -0,0 +1,170 @@
+"""
+Reduction of frames on their way to the recording queue: spatial binning, temporal decimation and
+temporal averaging. Reducing before the queue shrinks the queue's memory as well as the writer
+bandwidth and the file.
+"""
+import time, threading, logging
+import numpy as np
+
+from utils import telemetry
+
+logger = logging.getLogger(__name__)
+
+BIN_MODES = ('sum', 'mean')
+
+def binned_dtype(dtype, factor, mode='sum'):
+    """The dtype a `factor` x `factor` bin is stored in, wide enough that a sum cannot overflow."""
+    dtype = np.dtype(dtype)
+    if mode == 'mean' or dtype.kind == 'f':
+        return dtype
+    info = np.iinfo(dtype)
+    bound = int(info.max) * factor * factor
+    for candidate in ((np.uint16, np.uint32, np.uint64) if dtype.kind == 'u' else (np.int16, np.int32, np.int64)):
+        if np.dtype(candidate).itemsize >= dtype.itemsize and np.iinfo(candidate).max >= bound:
+            return np.dtype(candidate)
+    return np.dtype(np.uint64 if dtype.kind == 'u' else np.int64)
+
+def bin_frame(frame, factor, mode='sum'):
+    """
+    Sum or average `factor` x `factor` blocks of pixels, trailing rows and columns that do not fill a
+    block are cut off. Sums are widened so they cannot overflow, means keep the input dtype (rounded).
+
+    Adds strided slices rather than reshape().sum(), which walks the frame in small blocks and is several
+    times slower on large frames.
+    """
+    if factor == 1:
+        return frame
+    height = frame.shape[0] // factor * factor
+    width = frame.shape[1] // factor * factor
+    accumulate_dtype = binned_dtype(frame.dtype, factor, 'sum')
+    wide = frame[:height, :width].astype(accumulate_dtype, copy=False)
+    columns = wide[:, 0::factor].copy()
+    for offset in range(1, factor):
+        columns += wide[:, offset::factor]
+    binned = columns[0::factor].copy()
+    for offset in range(1, factor):
+        binned += columns[offset::factor]
+    if mode == 'sum':
+        return binned
+    count = factor * factor
+    if frame.dtype.kind == 'f':
+        return (binned / count).astype(frame.dtype, copy=False)
+    # Integer mean rounded to nearest
+    binned += count // 2
+    binned //= count
+    return binned.astype(frame.dtype, copy=False)
+
+class FrameReducer:
+    """
+    Reduces the recorded frames, in this order:
+        decimate  keep one frame in every `decimate`
+        binning   `binning` x `binning` sum or mean bins
+        average   average every `average` kept frames into one, stored with their mean timestamp
+
+    An average that is not complete when the recording stops is discarded, so every stored frame is the
+    mean of the same number of frames.
+
+    Args:
+        binning: Bin size, 1 for none
+        bin_mode: 'sum' keeps all the signal in a wider dtype, 'mean' keeps the camera dtype
+        decimate: Keep every n-th frame
+        average: Frames averaged into one stored frame
+    """
+
+    def __init__(self, binning=1, bin_mode='sum', decimate=1, average=1):
+        if bin_mode not in BIN_MODES:
+            raise ValueError(f"Unknown bin mode '{bin_mode}', use 'sum' or 'mean'")
+        if binning < 1 or decimate < 1 or average < 1:
+            raise ValueError("Binning, decimation and averaging factors must be at least 1")
+        self.binning = int(binning)
+        self.bin_mode = bin_mode
+        self.decimate = int(decimate)
+        self.average = int(average)
+        self.frames_in = 0
+        self.frames_out = 0
+        self._accumulator = None
+        self._accumulated = 0
+        self._timestamp_sum = 0.0
+        # discard_partial() runs on the thread stopping the recording, a frame may still be in reduce()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings):
+        """A reducer from a settings dict, or None if the settings leave frames as they are."""
+        if not settings:
+            return None
+        reducer = cls(settings.get('binning', 1), settings.get('bin_mode', 'sum'),
+                      settings.get('decimate', 1), settings.get('average', 1))
+        return reducer if reducer.active else None
+
+    @property
+    def active(self):
+        return self.binning > 1 or self.decimate > 1 or self.average > 1
+
+    @property
+    def reduction_factor(self):
+        """How many camera pixels go into one stored pixel."""
+        return self.binning * self.binning * self.decimate * self.average
+
+    def output_shape(self, height, width):
+        return height // self.binning, width // self.binning
+
+    def attrs(self):
+        """Reduction parameters for the HDF5 file attributes."""
+        return {
+            'Binning': self.binning,
+            'Binning Mode': self.bin_mode,
+            'Temporal Decimation': self.decimate,
+            'Temporal Average': self.average
+        }
+
+    def reduce(self, frame, timestamp):
+        """
+        Returns the reduced (frame, timestamp), or (None, None) while the frame is skipped or being
+        averaged into the next stored frame.
+        """
+        with self._lock:
+            return self._reduce(frame, timestamp)
+
+    def _reduce(self, frame, timestamp):
+        self.frames_in += 1
+        if (self.frames_in - 1) % self.decimate:
+            return None, None
+
+        start = time.perf_counter()
+        frame = bin_frame(frame, self.binning, self.bin_mode)
+        if self.average > 1:
+            if self._accumulator is None or self._accumulator.shape != frame.shape:
+                self._accumulator = np.zeros(frame.shape, dtype=np.float64 if frame.dtype.kind == 'f' else np.int64)
+                self._accumulated = 0
+                self._timestamp_sum = 0.0
+            self._accumulator += frame
+            self._timestamp_sum += timestamp if timestamp is not None else np.nan
+            self._accumulated += 1
+            if self._accumulated < self.average:
+                telemetry.record('reduction', time.perf_counter() - start)
+                return None, None
+            if frame.dtype.kind == 'f':
+                averaged = (self._accumulator / self.average).astype(frame.dtype)
+            else:
+                averaged = ((self._accumulator + self.average // 2) // self.average).astype(frame.dtype)
+            timestamp = self._timestamp_sum / self.average
+            frame = averaged
+            self._accumulator.fill(0)
+            self._accumulated = 0
+            self._timestamp_sum = 0.0
+        telemetry.record('reduction', time.perf_counter() - start)
+        self.frames_out += 1
+        return frame, timestamp
+
+    def discard_partial(self):
+        """Drop an incomplete average, returns how many frames it held."""
+        with self._lock:
+            discarded = self._accumulated
+            self._accumulated = 0
+            self._timestamp_sum = 0.0
+            if self._accumulator is not None:
+                self._accumulator.fill(0)
+        if discarded:
+            logger.info(f"Discarded an incomplete average of {discarded}/{self.average} frames")
+        return discarded
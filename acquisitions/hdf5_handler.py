@@ -1,7 +1,8 @@
 import h5py, time, threading, logging
 import numpy as np
 from datetime import datetime
-from interface.status_bar.update_notif import update_notif
+from utils import telemetry, RateMeter, tracer, notify
+from .roi_recording import CroppedFrame
 
 logger = logging.getLogger(__name__)
 
@@ -10,18 +11,25 @@ class HDF5Handler:
     def __init__(self):
         self.create_hdf5 = None
         self.dataset = None
+        self.roi_datasets = None  # {name: dataset} under 'rois/' when only regions are recorded
         self.timestamps = None
         self.frame_count = 0
         self.is_saving = False
         self.saving_thread = None
+        self.file_path = None
+        self.write_rate = RateMeter()  # Bytes per second written to the file
+        self.batch_bytes = 0  # Bytes collected for the next batch write while the queue is drained
+        self.close_datasets = {}  # {path: array} written just before the file is closed
+        self.close_attrs = {}  # File attributes only known once recording stops
         
-    def init_h5File(self, metadata=None):
+    def init_h5File(self, metadata=None, file_path=None):
         if self.create_hdf5:
             return False            
         try:
             timestamp = "" #datetime.now().strftime("%Y%m%d_%H%M%S")
             # TODO: Create UI to select save location
-            self.create_hdf5 = h5py.File(f"_data/recording_{timestamp}.h5", 'w')
+            self.file_path = file_path or f"_data/recording_{timestamp}.h5"
+            self.create_hdf5 = h5py.File(self.file_path, 'w')
             # Store metadata if provided
             if metadata:
                 self.create_hdf5.attrs.update(metadata)
@@ -33,12 +41,20 @@ class HDF5Handler:
             self._cleanup()
             return False
     
+    def add_datasets_on_close(self, datasets):
+        """Store {path: array} in the file when it is closed, for data only complete once recording stops."""
+        self.close_datasets.update(datasets)
+
+    def add_attrs_on_close(self, attrs):
+        """Set file attributes when the file is closed, replacing those written at the start."""
+        self.close_attrs.update(attrs)
+            
     def init_saving_thread(self, queue):
         if self.is_saving:
             return False
         
         self.is_saving = True
-        self.saving_thread = threading.Thread(target=self._save_frames, args=(queue,), daemon=True)
+        self.saving_thread = threading.Thread(target=self._save_frames, args=(queue,), name="HDF5WriterThread", daemon=True)
         self.saving_thread.start()
         return True
         
@@ -76,34 +92,28 @@ class HDF5Handler:
             
         try:
             # Initialize datasets on first frame
-            if self.dataset is None:
-                self.dataset = self.create_hdf5.create_dataset(
-                    'frames',
-                    shape=(0,) + frame.shape,
-                    maxshape=(None,) + frame.shape,
-                    dtype=frame.dtype,
-                    chunks=True
-                )
-                self.timestamps = self.create_hdf5.create_dataset(
-                    'timestamps',
-                    shape=(0,),
-                    maxshape=(None,),
-                    dtype=np.float64
-                )
+            if self.timestamps is None:
+                self._init_datasets(frame)
             
             # Resize datasets before writing
             new_size = self.frame_count + 1
-            self.dataset.resize(new_size, axis=0)
-            self.timestamps.resize(new_size, axis=0)
+            self._resize_datasets(new_size)
             
             # Save frame and timestamp
-            self.dataset[self.frame_count] = frame
+            start = time.perf_counter()
+            self._write_frame(self.frame_count, frame)
             self.timestamps[self.frame_count] = timestamp
+            duration = time.perf_counter() - start
+            telemetry.record('hdf5_write', duration)
+            if tracer.enabled:
+                tracer.complete('hdf5.write', 'disk', int(start * 1e6), int(duration * 1e6))
+            self.write_rate.tick(frame.nbytes)
             self.frame_count = new_size
             
             # Periodic flush to disk
             if self.frame_count % 100 == 0:
-                self.create_hdf5.flush()
+                with tracer.span('hdf5.flush', 'disk'):
+                    self.create_hdf5.flush()
                 
             return True
             
@@ -113,9 +123,9 @@ class HDF5Handler:
             
     def _update_save_status(self, queue, current_time, start_time):
         queue_size = queue.get_queue_size()
-        update_notif(f"Saving Remaining Data in Queue... {queue_size}")
+        notify(f"Saving Remaining Data in Queue... {queue_size}")
                 
-    def cleanup(self, queue, was_streaming, window):
+    def cleanup(self, queue):
         try:
             # Stop saving thread first to prevent new frames from being added
             self.stop_saving_thread()
@@ -145,6 +155,7 @@ class HDF5Handler:
                         
                     frames_to_save.append(frame)
                     timestamps_to_save.append(timestamp)
+                    self.batch_bytes += getattr(frame, 'held_bytes', frame.nbytes)
                     
                     # Save batch when it reaches batch_size
                     if len(frames_to_save) >= batch_size:
@@ -152,6 +163,7 @@ class HDF5Handler:
                         queue.frames_saved += len(frames_to_save)
                         frames_to_save = []
                         timestamps_to_save = []
+                        self.batch_bytes = 0
                         
                 except Exception as e:
                     logger.error(f"Error during batch saving: {e}")
@@ -163,25 +175,43 @@ class HDF5Handler:
             if frames_to_save:
                 self._save_batch(frames_to_save, timestamps_to_save)
                 queue.frames_saved += len(frames_to_save)
+            self.batch_bytes = 0
             
             # Verify all frames were handled
             frames_handled = queue.frames_saved + queue.frames_dropped
             if frames_handled < queue.frames_recorded:
                 logger.warning(f"Warning: {queue.frames_recorded - frames_handled} frames were lost during cleanup")
             
-            # Show completion message
-            update_notif("Acquisition finished and saved to disk.", duration=2000)
+            self._dump_telemetry()
+            self._export_trace()
             
-            # Restart streaming if it was active
-            if was_streaming:
-                window.start_stream.trigger()
+            # Show completion message
+            notify("Acquisition finished and saved to disk.", duration=2000)
                 
         except Exception as e:
-            update_notif(f"Error during cleanup: {e}", duration=2000)
+            notify(f"Error during cleanup: {e}", duration=2000)
             
         finally:
             self._cleanup()
             
+    def _dump_telemetry(self):
+        """Write the per-stage latency summary of this recording next to the HDF5 file."""
+        try:
+            path_base = self.file_path.rsplit('.', 1)[0] + "_telemetry"
+            telemetry.dump(path_base)
+            logger.info(f"Pipeline telemetry saved to {path_base}.csv/.json")
+        except Exception as e:
+            logger.error(f"Error saving telemetry: {e}")
+            
+    def _export_trace(self):
+        """Write the timeline of this recording next to the HDF5 file if tracing is on."""
+        if not tracer.enabled:
+            return
+        try:
+            tracer.export(self.file_path.rsplit('.', 1)[0] + "_trace.json")
+        except Exception as e:
+            logger.error(f"Error saving trace: {e}")
+            
     def _save_batch(self, frames, timestamps):
         """Save a batch of frames and timestamps efficiently."""
         if not self.create_hdf5 or not frames:
@@ -189,34 +219,28 @@ class HDF5Handler:
             
         try:
             # Initialize datasets if needed
-            if self.dataset is None:
-                self.dataset = self.create_hdf5.create_dataset(
-                    'frames',
-                    shape=(0,) + frames[0].shape,
-                    maxshape=(None,) + frames[0].shape,
-                    dtype=frames[0].dtype,
-                    chunks=True
-                )
-                self.timestamps = self.create_hdf5.create_dataset(
-                    'timestamps',
-                    shape=(0,),
-                    maxshape=(None,),
-                    dtype=np.float64
-                )
+            if self.timestamps is None:
+                self._init_datasets(frames[0])
             
             # Calculate new size and resize datasets
             current_size = self.frame_count
             new_size = current_size + len(frames)
-            self.dataset.resize(new_size, axis=0)
-            self.timestamps.resize(new_size, axis=0)
+            self._resize_datasets(new_size)
             
             # Save frames and timestamps in batch
             for i, (frame, timestamp) in enumerate(zip(frames, timestamps)):
-                self.dataset[current_size + i] = frame
+                start = time.perf_counter()
+                self._write_frame(current_size + i, frame)
                 self.timestamps[current_size + i] = timestamp
+                duration = time.perf_counter() - start
+                telemetry.record('hdf5_write', duration)
+                if tracer.enabled:
+                    tracer.complete('hdf5.write', 'disk', int(start * 1e6), int(duration * 1e6))
+                self.write_rate.tick(frame.nbytes)
             
             self.frame_count = new_size
-            self.create_hdf5.flush()  # Flush after batch save
+            with tracer.span('hdf5.flush', 'disk'):
+                self.create_hdf5.flush()  # Flush after batch save
             
             return True
             
@@ -224,10 +248,69 @@ class HDF5Handler:
             logger.error(f"Error saving batch: {e}")
             return False
             
+    def _init_datasets(self, frame):
+        """Create 'frames', or one dataset per region under 'rois/', and 'timestamps' from the first frame."""
+        if isinstance(frame, CroppedFrame):
+            group = self.create_hdf5.create_group('rois')
+            self.roi_datasets = {}
+            for name, crop in frame.crops.items():
+                self.roi_datasets[name] = group.create_dataset(
+                    name,
+                    shape=(0,) + crop.shape,
+                    maxshape=(None,) + crop.shape,
+                    dtype=crop.dtype,
+                    chunks=True
+                )
+        else:
+            self.dataset = self.create_hdf5.create_dataset(
+                'frames',
+                shape=(0,) + frame.shape,
+                maxshape=(None,) + frame.shape,
+                dtype=frame.dtype,
+                chunks=True
+            )
+        self.timestamps = self.create_hdf5.create_dataset(
+            'timestamps',
+            shape=(0,),
+            maxshape=(None,),
+            dtype=np.float64
+        )
+            
+    def _resize_datasets(self, size):
+        for dataset in self._frame_datasets():
+            dataset.resize(size, axis=0)
+        self.timestamps.resize(size, axis=0)
+            
+    def _write_frame(self, index, frame):
+        if isinstance(frame, CroppedFrame):
+            # The crops are views into the whole frame, h5py copies just their pixels out
+            for name, crop in frame.crops.items():
+                self.roi_datasets[name][index] = crop
+        else:
+            self.dataset[index] = frame
+            
+    def _frame_datasets(self):
+        if self.roi_datasets is not None:
+            return list(self.roi_datasets.values())
+        return [self.dataset] if self.dataset is not None else []
+            
+    def get_buffer_bytes(self):
+        """Bytes the writer holds in memory: the pending batch plus the HDF5 chunk cache of the frame datasets."""
+        cache_bytes = 0
+        for dataset in self._frame_datasets():
+            try:
+                cache_bytes += dataset.id.get_access_plist().get_chunk_cache()[1]
+            except Exception:
+                pass
+        return self.batch_bytes + cache_bytes
+            
     def _cleanup(self):
         """Clean up resources."""
         if self.create_hdf5:
             try:
+                for path, data in self.close_datasets.items():
+                    self.create_hdf5.create_dataset(path, data=data)
+                self.create_hdf5.attrs.update(self.close_attrs)
                 self.create_hdf5.flush()
                 self.create_hdf5.close()
             except Exception as e:
@@ -235,5 +318,8 @@ class HDF5Handler:
             finally:
                 self.create_hdf5 = None
                 self.dataset = None
+                self.roi_datasets = None
+                self.close_datasets = {}
+                self.close_attrs = {}
                 self.timestamps = None
                 self.frame_count = 0 
\ No newline at end of file
@@ -1,89 +1,80 @@
+import threading, logging
 
-import queue, time, logging
-from PyQt6.QtCore import QObject, pyqtSignal, QThread
+from .acquisition_loop import AcquisitionLoop, LatestFrameSubscriber
 
 logger = logging.getLogger(__name__)
 
-class LiveStreamQThread(QThread):
+class LiveStreamHandler:
+    """
+    Live view on top of the shared acquisition loop.
+
+    The loop owns the camera and also feeds recording and snapshots, so live view keeps running while
+    either is active. Frame listeners (e.g. the display render thread) are notified from the camera thread
+    through a decimated latest-frame subscriber. They must only hand the frame off, so a slow consumer never
+    slows acquisition.
+    """
 
-    live_img_acq_qtSignal = pyqtSignal(object) # Signal to emit when a new frame has been captured from the camera
-    
     def __init__(self, camera_control):
-        super().__init__()
         self.camera_control = camera_control
-        self.live_is_running = True
-        self.live_stream_freq = 60
-
-    # run() is a special method in QThread. It is automatically called when QThread is started using the start()
-    def run(self):
-        self.live_stream_handler()
-        
-    def live_stream_handler(self):
-        while self.live_is_running:
-            try:
-                self.camera_control.get_image()
-                image_data = self.camera_control.get_image_data()
-                
-                if image_data is not None:
-                    self.live_img_acq_qtSignal.emit(image_data)
-                    # TODO: We should have a global freq for the ui.
-                    time.sleep(1/self.live_stream_freq)
+        self.camera = None
+        self.acquisition_loop = AcquisitionLoop(camera_control)
+        self.frame_listeners = []
+        self.display_subscriber = LatestFrameSubscriber('display', self._handle_frame)
 
-            except Exception as e:
-                logger.error(f"Error in camera thread: {str(e)}")
-                time.sleep(0.1)  # Sleep briefly on error to prevent hammering CPU on error
-    
-    def stop(self):
-        self.live_is_running = False
-        self.wait()
+        # Latest-frame slot
+        self._frame_lock = threading.Lock()
+        self._latest_frame = None
+        self._frame_number = 0
 
-class LiveStreamHandler(QObject):
+    def add_frame_listener(self, listener):
+        """Register a callable taking the newest numpy frame, called on the camera thread."""
+        self.frame_listeners.append(listener)
 
-    live_img_in_queue_qtSignal = pyqtSignal() # Signal to emit when a new frame is available in the queue
-    
-    def __init__(self, camera_control):
-        super().__init__()
-        self.camera_control = camera_control
-        self.camera = None
-        self.live_stream_queue = queue.Queue(maxsize=1)
-        self.live_stream_qthread = None
+    def set_display_rate(self, max_fps):
+        """Cap the rate at which frames are passed on to the display, recording still gets every frame."""
+        self.display_subscriber.set_max_fps(max_fps)
+
+    def is_streaming(self):
+        return self.acquisition_loop.is_active('live')
 
     def start_stream(self):
-        if self.live_stream_qthread is None or not self.live_stream_qthread.isRunning():
-            self.live_stream_qthread = LiveStreamQThread(self.camera_control)
-            self.live_stream_qthread.live_img_acq_qtSignal.connect(self._handle_frame)
-            self.camera_control.start_camera()
-            self.live_stream_qthread.start()
+        if not self.is_streaming():
+            self.acquisition_loop.subscribe(self.display_subscriber)
+            self.acquisition_loop.acquire('live')
 
     def _handle_frame(self, image_data):
 
-        try:
-            if not self.live_stream_queue.full():
-                self.live_stream_queue.put(image_data)
-                self.live_img_in_queue_qtSignal.emit()
-        except Exception as e:
-            logger.error(f"Error handling frame: {str(e)}")
+        with self._frame_lock:
+            self._latest_frame = image_data
+            self._frame_number += 1
+
+        for listener in self.frame_listeners:
+            try:
+                listener(image_data)
+            except Exception as e:
+                logger.error(f"Error handling frame: {str(e)}")
 
     def stop_stream(self):
-        try:
-            if hasattr(self, 'live_stream_qthread') and self.live_stream_qthread is not None:
-                if self.live_stream_qthread.isRunning():
-                    self.live_stream_qthread.stop()
-                self.live_stream_qthread = None
-            self.camera_control.stop_camera()
-            logger.debug("Camera stream stopped.")
-        except RuntimeError: # Ignore errors if the thread has already been deleted
-            pass
-
-    def get_img_from_queue(self):
-        if not self.live_stream_queue.empty():
-            return self.live_stream_queue.get()
-        return None
+        # The camera only stops if nothing else (e.g. a recording) still needs frames
+        self.acquisition_loop.unsubscribe(self.display_subscriber)
+        self.acquisition_loop.release('live')
+        logger.debug("Camera stream stopped.")
+
+    def get_latest_frame(self):
+        """Return (frame_number, frame) for the newest displayed frame, frame is None before the first one."""
+        with self._frame_lock:
+            return self._frame_number, self._latest_frame
+
+    def get_stream_stats(self):
+        """Measured live stream statistics, read from in-memory counters only."""
+        loop_stats = self.acquisition_loop.get_stats()
+        return {
+            'acquisition_fps': loop_stats['acquisition_fps'],
+            'frames_acquired': loop_stats['frames_acquired']
+        }
 
     def cleanup(self):
-        self.stop_stream()
-        while not self.live_stream_queue.empty():
-            try:
-                self.live_stream_queue.get_nowait()
-            except queue.Empty:
-                break
\ No newline at end of file
+        self.acquisition_loop.unsubscribe(self.display_subscriber)
+        self.acquisition_loop.stop()
+        with self._frame_lock:
+            self._latest_frame = None
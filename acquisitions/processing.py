@@ -0,0 +1,271 @@
+"""
+Per-frame processing stages fed by the acquisition loop.
+
+A stage wraps a plain numpy function, `func(frame, **params)`, and runs it on a thread or process pool.
+Stages are acquisition loop subscribers like the display and the recorder, so they never sit in the
+path to the writer: a stage that cannot keep up only loses its own frames, according to its drop policy.
+
+Example:
+    pipeline = ProcessingPipeline(acquisition_loop)
+    pipeline.add_stage('binned', bin_2x2, executor='process', workers=4)
+    pipeline.add_stage('mean', np.mean, source='binned', on_result=print)
+
+Results come out in frame order. A stage can take its input from another stage instead of the camera,
+which chains them into a pipeline.
+"""
+import time, threading, importlib, logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .acquisition_loop import FrameSubscriber
+from utils import RateMeter, telemetry
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+def _timed_call(func, frame, params):
+    """Run one stage function and time it in the worker, so queueing and transfer are not counted."""
+    start = time.perf_counter()
+    result = func(frame, **params)
+    return result, time.perf_counter() - start
+
+def load_function(path):
+    """Resolve 'package.module:function' to the function, for stages defined in the config."""
+    module_name, _, attribute = path.partition(':')
+    if not attribute:
+        raise ValueError(f"Stage function '{path}' must be given as module:function")
+    target = importlib.import_module(module_name)
+    for part in attribute.split('.'):
+        target = getattr(target, part)
+    return target
+
+class ProcessingStage(FrameSubscriber):
+    """
+    Runs `func` on frames in a worker pool with bounded work in flight and ordered results.
+
+    Args:
+        name: Stage name, also the telemetry stage 'processing.<name>'
+        func: Called as func(frame, **params). With executor='process' it has to be picklable, i.e. a
+            module-level function, and every frame is copied to the worker
+        executor: 'thread' for numpy code that releases the GIL, 'process' for pure Python analysis
+        workers: Pool size
+        max_in_flight: Frames submitted to the pool at once, defaults to `workers`
+        max_pending: Frames waiting for a free worker before the drop policy applies
+        drop_policy: What offer() does when `max_pending` frames are already waiting:
+            'drop_newest' skips the incoming frame, 'drop_oldest' replaces the oldest waiting frame so
+            results stay as fresh as possible, 'block' waits up to `block_timeout` for space. Blocking
+            holds up the acquisition thread, so only use it where losing a frame is worse.
+        on_result: Called as on_result(result, frame_number, timestamp) on the stage thread, in frame order
+    """
+
+    def __init__(self, name, func, params=None, executor='thread', workers=1, max_in_flight=None,
+                 max_pending=2, drop_policy='drop_newest', block_timeout=1.0, on_result=None):
+        super().__init__(name)
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop_policy}', use one of {', '.join(DROP_POLICIES)}")
+        self.func = func
+        self.params = params or {}
+        self.executor_type = executor
+        self.workers = workers
+        self.max_in_flight = max_in_flight or workers
+        self.max_pending = max(max_pending, 1)
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.on_result = on_result
+
+        self.latest_result = None
+        self.frames_failed = 0
+        self.throughput = RateMeter()
+        self._downstream = ()
+        self._pending = deque()
+        self._in_flight = deque()
+        self._pending_bytes = 0
+        # Condition on an RLock, a future finishing straight away runs its callback inside submit()
+        self._condition = threading.Condition()
+        self._closing = False
+
+        if executor == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        elif executor == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"Stage-{name}")
+        else:
+            raise ValueError(f"Unknown executor '{executor}', use 'thread' or 'process'")
+        self._thread = threading.Thread(target=self._run, name=f"ProcessingStage-{name}", daemon=True)
+        self._thread.start()
+
+    def add_downstream(self, stage):
+        """Feed this stage's results to `stage` as its frames."""
+        self._downstream = self._downstream + (stage,)
+
+    def offer(self, frame, timestamp, frame_number):
+        """Queue one frame for the pool, called on the acquisition thread (or an upstream stage's thread)."""
+        if self._closing:
+            return
+        self.frames_offered += 1
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                if self.drop_policy == 'drop_newest':
+                    self.frames_dropped += 1
+                    return
+                if self.drop_policy == 'drop_oldest':
+                    dropped = self._pending.popleft()
+                    self._pending_bytes -= getattr(dropped[0], 'nbytes', 0)
+                    self.frames_dropped += 1
+                elif not self._condition.wait_for(lambda: len(self._pending) < self.max_pending or self._closing,
+                                                  timeout=self.block_timeout):
+                    self.frames_dropped += 1
+                    return
+            self._pending.append((frame, timestamp, frame_number, time.perf_counter()))
+            self._pending_bytes += getattr(frame, 'nbytes', 0)
+            self._condition.notify_all()
+
+    def _has_work(self):
+        return ((self._in_flight and self._in_flight[0][0].done())
+                or (self._pending and len(self._in_flight) < self.max_in_flight)
+                or (self._closing and not self._pending and not self._in_flight))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(self._has_work)
+                if self._closing and not self._pending and not self._in_flight:
+                    return
+                # Submit what the in-flight bound allows
+                while self._pending and len(self._in_flight) < self.max_in_flight:
+                    frame, timestamp, frame_number, offered = self._pending.popleft()
+                    self._pending_bytes -= getattr(frame, 'nbytes', 0)
+                    try:
+                        future = self._executor.submit(_timed_call, self.func, frame, self.params)
+                    except Exception as e:
+                        logger.error(f"Error submitting frame to stage '{self.name}': {str(e)}")
+                        self.frames_failed += 1
+                        continue
+                    future.add_done_callback(self._wake)
+                    self._in_flight.append((future, timestamp, frame_number, offered))
+                # Only the head of the queue may be delivered, that keeps results in frame order
+                ready = []
+                while self._in_flight and self._in_flight[0][0].done():
+                    ready.append(self._in_flight.popleft())
+                self._condition.notify_all()
+
+            for future, timestamp, frame_number, offered in ready:
+                self._deliver(future, timestamp, frame_number, offered)
+
+    def _wake(self, future):
+        with self._condition:
+            self._condition.notify_all()
+
+    def _deliver(self, future, timestamp, frame_number, offered):
+        try:
+            result, duration = future.result()
+        except Exception as e:
+            self.frames_failed += 1
+            logger.error(f"Error in processing stage '{self.name}' on frame {frame_number}: {str(e)}")
+            return
+        telemetry.record(f"processing.{self.name}", duration)
+        telemetry.record(f"processing.{self.name}.latency", time.perf_counter() - offered)
+        self.latest_result = (result, frame_number, timestamp)
+        self.frames_delivered += 1
+        self.throughput.tick()
+        if self.on_result is not None:
+            try:
+                self.on_result(result, frame_number, timestamp)
+            except Exception as e:
+                logger.error(f"Error in result callback of stage '{self.name}': {str(e)}")
+        for stage in self._downstream:
+            try:
+                stage.offer(result, timestamp, frame_number)
+            except Exception as e:
+                logger.error(f"Error passing results of '{self.name}' to '{stage.name}': {str(e)}")
+
+    @property
+    def pending_bytes(self):
+        """Bytes of frames waiting for a worker. Frames in flight are held by the pool and not counted."""
+        return self._pending_bytes
+
+    def get_stats(self):
+        stats = super().get_stats()
+        latency = telemetry.stage(f"processing.{self.name}.latency").summary(rolling=True)
+        compute = telemetry.stage(f"processing.{self.name}").summary(rolling=True)
+        stats.update({
+            'frames_failed': self.frames_failed,
+            'throughput_fps': self.throughput.rate(),
+            'pending': len(self._pending),
+            'in_flight': len(self._in_flight),
+            'compute_p50_ms': compute['p50_ms'],
+            'latency_p50_ms': latency['p50_ms'],
+            'latency_p95_ms': latency['p95_ms']
+        })
+        return stats
+
+    def close(self, wait=True):
+        """Stop taking frames. With wait=True frames already queued are processed and delivered first."""
+        with self._condition:
+            self._closing = True
+            if not wait:
+                self._pending.clear()
+                self._pending_bytes = 0
+            self._condition.notify_all()
+        if wait:
+            self._thread.join()
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+class ProcessingPipeline:
+    """
+    The processing stages attached to one acquisition loop.
+
+    Stages without a source subscribe to the loop, the others are fed by the stage named as `source`.
+    """
+
+    def __init__(self, acquisition_loop):
+        self.acquisition_loop = acquisition_loop
+        self.stages = {}
+
+    def add_stage(self, name, func, source=None, **options):
+        """Create a ProcessingStage (see there for the options) and attach it."""
+        if name in self.stages:
+            raise ValueError(f"Processing stage '{name}' already exists")
+        if source is not None and source not in self.stages:
+            raise ValueError(f"Unknown source stage '{source}' for '{name}'")
+        if isinstance(func, str):
+            func = load_function(func)
+        stage = ProcessingStage(name, func, **options)
+        self.stages[name] = stage
+        if source is None:
+            self.acquisition_loop.subscribe(stage)
+        else:
+            self.stages[source].add_downstream(stage)
+        logger.info(f"Processing stage '{name}' added on {stage.workers} {stage.executor_type} worker(s)")
+        return stage
+
+    def add_stages_from_config(self, stage_settings):
+        """Add the stages listed in the 'processing' config section, skipping any that fail to load."""
+        for settings in stage_settings:
+            settings = dict(settings)
+            name = settings.pop('name', None)
+            try:
+                self.add_stage(name, settings.pop('function'), **settings)
+            except Exception as e:
+                logger.error(f"Error adding processing stage '{name}': {str(e)}")
+
+    def remove_stage(self, name, wait=False):
+        stage = self.stages.pop(name)
+        self.acquisition_loop.unsubscribe(stage)
+        for other in self.stages.values():
+            other._downstream = tuple(s for s in other._downstream if s is not stage)
+        stage.close(wait)
+
+    def latest_results(self):
+        """Most recent result of each stage as {name: (result, frame_number, timestamp)}."""
+        return {name: stage.latest_result for name, stage in self.stages.items()}
+
+    def get_pending_bytes(self):
+        return sum(stage.pending_bytes for stage in self.stages.values())
+
+    def get_stats(self):
+        return {'processing': {name: stage.get_stats() for name, stage in self.stages.items()}}
+
+    def close(self, wait=False):
+        for name in list(self.stages):
+            self.remove_stage(name, wait)
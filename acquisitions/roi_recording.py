@@ -0,0 +1,68 @@
+"""
+Recording of several named regions out of one full-frame stream.
+
+Each frame is cut into numpy views, one per region, so nothing is copied on the acquisition thread. The
+views keep their frame alive until the writer has stored them, and the writer copies only the region
+pixels to disk. Each region becomes its own dataset under 'rois/' in the recording.
+"""
+import json, logging
+
+logger = logging.getLogger(__name__)
+
+class CroppedFrame:
+    """
+    The regions of one frame, as views into it.
+
+    `nbytes` counts the region pixels, which is what gets written. `held_bytes` is the size of the whole
+    frame the views keep in memory while they wait in the queue.
+    """
+
+    __slots__ = ('crops', 'nbytes', 'held_bytes')
+
+    def __init__(self, crops, held_bytes):
+        self.crops = crops
+        self.nbytes = sum(crop.nbytes for crop in crops.values())
+        self.held_bytes = held_bytes
+
+class RoiCropper:
+    """
+    Cuts the named rectangles out of every frame.
+
+    Args:
+        rois: {name: (x, y, width, height)} in full-frame pixel coordinates
+        scale: Binning applied before cropping, the rectangles are divided by it
+    """
+
+    def __init__(self, rois, scale=1):
+        if not rois:
+            raise ValueError("No regions to record")
+        self.rois = {}
+        for name, (x, y, width, height) in rois.items():
+            name = str(name).replace('/', '_')
+            x, y, width, height = (int(value) // scale for value in (x, y, width, height))
+            if width < 1 or height < 1:
+                raise ValueError(f"Region '{name}' is empty")
+            self.rois[name] = (x, y, width, height)
+        self._slices = {name: (slice(y, y + height), slice(x, x + width)) for name, (x, y, width, height) in self.rois.items()}
+
+    @classmethod
+    def from_settings(cls, rois, scale=1):
+        """A cropper for `rois`, or None when there are no regions and whole frames are recorded."""
+        return cls(rois, scale) if rois else None
+
+    def validate(self, frame_height, frame_width):
+        """Raise ValueError if a region does not lie inside frames of the given size."""
+        for name, (x, y, width, height) in self.rois.items():
+            if x < 0 or y < 0 or x + width > frame_width or y + height > frame_height:
+                raise ValueError(f"Region '{name}' ({x}, {y}, {width}x{height}) lies outside the {frame_width}x{frame_height} frame")
+
+    def crop(self, frame):
+        return CroppedFrame({name: frame[rows, columns] for name, (rows, columns) in self._slices.items()}, frame.nbytes)
+
+    @property
+    def stored_pixels(self):
+        return sum(width * height for _, _, width, height in self.rois.values())
+
+    def attrs(self):
+        """Region layout for the HDF5 file attributes."""
+        return {'Regions': json.dumps({name: list(rect) for name, rect in self.rois.items()})}
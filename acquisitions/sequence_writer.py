@@ -0,0 +1,92 @@
+import h5py, json, threading, logging
+import numpy as np
+from queue import Queue
+
+from utils import telemetry, RateMeter
+
+logger = logging.getLogger(__name__)
+
+class SequenceWriter:
+    """
+    Writes a time-lapse or parameter series into one HDF5 file.
+
+    Layout:
+        frames          (N, height, width) image data
+        timestamps      (N,) camera timestamps
+        frame_metadata/ one (N,) dataset per metadata key, e.g. point, requested_s, acquired_s, exposure
+        attrs           recording metadata, plus 'timing_report' as JSON once closed
+
+    write() only queues the frame, a writer thread does the disk work so bursts are not slowed down.
+    A key that first appears part way through (a setting changed later in the series) is back-filled
+    for the earlier frames, with -1 for integer keys and NaN for the others.
+    """
+
+    def __init__(self, file_path, metadata=None, max_queued=256):
+        self.file_path = file_path
+        self.file = h5py.File(file_path, 'w')
+        if metadata:
+            self.file.attrs.update(metadata)
+        self.frames = None
+        self.timestamps = None
+        self.frame_metadata = self.file.create_group('frame_metadata')
+        self.frame_count = 0
+        self.write_rate = RateMeter()
+        self._queue = Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, name="SequenceWriterThread", daemon=True)
+        self._thread.start()
+
+    def write(self, frame, timestamp, frame_metadata):
+        """Queue one frame, blocks only if the writer has fallen `max_queued` frames behind."""
+        self._queue.put((frame, timestamp, frame_metadata))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                with telemetry.measure('sequence_write'):
+                    self._write_frame(*item)
+            except Exception as e:
+                logger.error(f"Error writing sequence frame: {str(e)}")
+
+    def _write_frame(self, frame, timestamp, frame_metadata):
+        if self.frames is None:
+            self.frames = self.file.create_dataset('frames', shape=(0,) + frame.shape, maxshape=(None,) + frame.shape,
+                                                   dtype=frame.dtype, chunks=(1,) + frame.shape)
+            self.timestamps = self.file.create_dataset('timestamps', shape=(0,), maxshape=(None,), dtype=np.float64)
+
+        index = self.frame_count
+        self.frames.resize(index + 1, axis=0)
+        self.timestamps.resize(index + 1, axis=0)
+        self.frames[index] = frame
+        self.timestamps[index] = timestamp if timestamp is not None else np.nan
+
+        for key, value in frame_metadata.items():
+            dataset = self.frame_metadata.get(key)
+            if dataset is None:
+                dtype = np.int64 if isinstance(value, (int, np.integer)) and not isinstance(value, bool) else np.float64
+                dataset = self.frame_metadata.create_dataset(key, shape=(index,), maxshape=(None,), dtype=dtype,
+                                                             fillvalue=-1 if dtype == np.int64 else np.nan)
+            dataset.resize(index + 1, axis=0)
+            dataset[index] = value
+        # Keys this frame does not carry get the fill value
+        for key, dataset in self.frame_metadata.items():
+            if dataset.shape[0] < index + 1:
+                dataset.resize(index + 1, axis=0)
+
+        self.frame_count = index + 1
+        self.write_rate.tick(frame.nbytes)
+
+    def close(self, timing_report=None):
+        """Write out the queued frames, store the timing report and close the file."""
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if timing_report is not None:
+                self.file.attrs['timing_report'] = json.dumps(timing_report)
+            self.file.attrs['frame_count'] = self.frame_count
+            self.file.close()
+            logger.info(f"Sequence of {self.frame_count} frames saved to {self.file_path}")
+        except Exception as e:
+            logger.error(f"Error closing sequence file: {str(e)}")
@@ -1,50 +1,132 @@
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import numpy as np
 import tifffile, logging
 
+from .acquisition_loop import TapSubscriber
+from utils import notify
+
 logger = logging.getLogger(__name__)
 
 class Snapshot:
-    """Handles saving individual snapshots from the camera as TIFF files."""
-    
-    def __init__(self, stream_camera, window):
-        """Initialize with references to stream camera and window."""
+    """
+    Saves snapshots from the running acquisition loop as TIFF files.
+
+    Modes:
+        'single'  - the next frame
+        'burst'   - the next N consecutive frames as pages of one multi-page TIFF (BigTIFF when large)
+        'average' - the mean of the next N frames, accumulated in float32
+
+    The frames are tapped from the loop without stopping acquisition. Waiting for them, averaging and
+    TIFF encoding all run on a background executor, so taking a snapshot never stalls the GUI thread.
+    """
+
+    MODES = ('single', 'burst', 'average')
+
+    # Classic TIFF uses 32-bit offsets, switch to BigTIFF comfortably before 4 GB
+    BIGTIFF_THRESHOLD = 2**32 - 2**25
+
+    def __init__(self, stream_camera, snapshot_settings):
+        """Initialize with the stream camera and the 'snapshot' section of the UI scaffolding."""
         self.stream_camera = stream_camera
         self.camera_control = stream_camera.camera_control
-        self.window = window
-    
-    def save_snapshot(self):
-        # Check if camera is streaming
-        was_streaming = self.stream_camera.live_stream_qthread is not None and self.stream_camera.live_stream_qthread.isRunning()
-        
+        self.acquisition_loop = stream_camera.acquisition_loop
+
+        self.compression = snapshot_settings['compression']
+        self.frame_timeout = snapshot_settings['frame_timeout_s']
+        self.executor = ThreadPoolExecutor(max_workers=snapshot_settings['max_workers'], thread_name_prefix="SnapshotWriter")
+
+    def save_snapshot(self, mode='single', frame_count=1):
+        """
+        Start a snapshot and return straight away.
+
+        The tap is attached here, so the frames are the ones following the click, even if the executor is
+        still busy with an earlier snapshot.
+
+        Returns:
+            Future: resolves to the saved filename, or None if saving failed. None if the snapshot could
+            not be started.
+        """
+        if mode not in self.MODES:
+            logger.error(f"Unknown snapshot mode '{mode}'")
+            return None
+        count = 1 if mode == 'single' else max(int(frame_count), 1)
+
+        # Generate filename with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        # TODO: Create UI to select save location
+        suffix = "" if mode == 'single' else f"_{mode}{count}"
+        filename = f"_data/snapshot_{timestamp}{suffix}.tiff"
+
+        try:
+            # The tap is its own client, so the camera runs only if nothing else is using it
+            tap = TapSubscriber('snapshot', count)
+            self.acquisition_loop.subscribe(tap)
+            self.acquisition_loop.acquire(tap)
+            return self.executor.submit(self._capture_and_save, tap, mode, filename)
+        except Exception as e:
+            logger.error(f"Error starting snapshot: {str(e)}")
+            return None
+
+    def _capture_and_save(self, tap, mode, filename):
+        """Runs on the executor: consume the tapped frames as they arrive and encode them."""
         try:
-            if was_streaming:
-                self.window.stop_stream.trigger()
-
-            self.camera_control.start_camera()
-            self.camera_control.get_image()
-            snapshot = self.camera_control.get_image_data()
-            self.camera_control.stop_camera()
-            
-            if snapshot is None:
-                logger.error("Failed to capture snapshot")
-                return False
-                
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            # TODO: Create UI to select save location
-            filename = f"_data/snapshot_{timestamp}.tiff"
-            
-            # Save the image as TIFF
-            tifffile.imwrite(filename, snapshot)
-            logger.info(f"Snapshot saved as {filename}")
-            
-            return True
-            
+            frames = tap.iter_frames(timeout=self.frame_timeout)
+            if mode == 'average':
+                saved = self._save_average(frames, filename)
+            else:
+                saved = self._save_pages(frames, tap.count, filename)
         except Exception as e:
             logger.error(f"Error saving snapshot: {str(e)}")
-            return False
-            
+            saved = 0
         finally:
-            # Restore streaming if it was active by triggering the start button
-            if was_streaming:
-                self.window.start_stream.trigger() 
\ No newline at end of file
+            self.acquisition_loop.unsubscribe(tap)
+            self.acquisition_loop.release(tap)
+
+        if saved == 0:
+            logger.error("Failed to capture snapshot")
+            notify("Failed to Save Snapshot", duration=2000)
+            return None
+        if saved < tap.count:
+            logger.warning(f"Snapshot {filename} only got {saved} of {tap.count} frames")
+
+        logger.info(f"Snapshot saved as {filename}")
+        notify("Snapshot Saved" if mode == 'single' else f"Snapshot Saved ({mode}, {saved} frames)", duration=2000)
+        return filename
+
+    def _save_pages(self, frames, count, filename):
+        """Write each frame as a page as soon as it arrives, returns the number of pages written."""
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            return 0
+
+        bigtiff = first[0].nbytes * count > self.BIGTIFF_THRESHOLD
+        written = 0
+        with tifffile.TiffWriter(filename, bigtiff=bigtiff) as tif:
+            for frame, timestamp in itertools.chain([first], frames):
+                # Uncompressed pages are stored back to back as one series
+                tif.write(frame, photometric='minisblack', compression=self.compression, contiguous=self.compression is None)
+                written += 1
+        return written
+
+    def _save_average(self, frames, filename):
+        """Accumulate the frames in float32 and write their mean, returns the number of frames averaged."""
+        accumulator = None
+        averaged = 0
+        for frame, timestamp in frames:
+            if accumulator is None:
+                accumulator = np.zeros(frame.shape, dtype=np.float32)
+            accumulator += frame
+            averaged += 1
+        if averaged == 0:
+            return 0
+
+        accumulator /= averaged
+        tifffile.imwrite(filename, accumulator, photometric='minisblack', compression=self.compression)
+        return averaged
+
+    def cleanup(self):
+        """Wait for snapshots still being written."""
+        self.executor.shutdown(wait=True)
@@ -1,7 +1,5 @@
-import sys, os, logging
-from datetime import datetime
+import sys, logging
 from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QTimer
 
 from interface import AppUI, UIMethods
 
@@ -11,22 +9,7 @@ from acquisitions.live_stream_handler import LiveStreamHandler
 
 from interface.status_bar.update_notif import set_main_window
 
-# Configure global logging
-def setup_logging():
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    log_file = f'logs/microTool_{timestamp}.log'
-
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(levelname)s - %(threadName)s - %(filename)s - %(name)s:%(funcName)s() - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()  # Also log to console
-        ]
-    )
-    logging.info("Starting microTool application")
+from utils import setup_logging
 
 class microTool():
     def __init__(self):
@@ -49,11 +32,6 @@ class microTool():
         """Set the main window"""
         set_main_window(self.window)
 
-        # Create a timer to update UI at a reasonable rate
-        self.ui_update_timer = QTimer()
-        self.ui_update_timer.timeout.connect(self.ui_methods.update_img_display)
-        self.ui_update_timer.start(8)  # ~30 FPS for UI updates
-        
         """Connect the window close event to our cleanup method"""
         self.window.closeEvent = self.cleanup
 
@@ -68,6 +46,8 @@ class microTool():
         
     def cleanup(self, event):
         try:
+            if hasattr(self, 'ui_methods'):
+                self.ui_methods.cleanup()
             if hasattr(self, 'stream_camera'):
                 self.stream_camera.cleanup()
             if hasattr(self, 'camera_sequences'):
@@ -0,0 +1,409 @@
+"""
+Headless acquisition from the command line.
+Runs camera control, the acquisition loop, the queue and the HDF5 writer without creating a QApplication
+or any window, for dedicated recording machines.
+
+Examples:
+    python cli.py record --frames 1000 --exposure 2000 --roi 1024 768 0 0
+    python cli.py record --duration 60 --output /data/run1.h5
+    python cli.py record --frames 10000 --bin 2 --average 4
+    python cli.py record --duration 60 --crop left 100 200 64 64 --crop right 900 200 64 64
+    python cli.py record --duration 3600 --trigger 3.0 --pre-roll 20 --post-roll 100
+    python cli.py calibrate dark --frames 100 && python cli.py record --frames 1000 --calibration _data/calibration.h5
+    python cli.py record --duration 60 --background median
+    python cli.py serve --port 5757
+    python cli.py record --frames 1000 --stage mean=numpy:mean --stage-workers 2
+    python cli.py timelapse --interval 30 --count 120
+    python cli.py timelapse --interval 600 --count 12 --exposures 1000 2000 5000 --frames-per-point 5
+"""
+import sys, os, json, time, threading, argparse, logging
+from datetime import datetime
+
+from instruments import CameraControl, CameraSequences
+from acquisitions.acquisition_loop import AcquisitionLoop
+from acquisitions.acquire_stream import AcquireStream
+from acquisitions.live_stream_handler import LiveStreamHandler
+from acquisitions.snapshot import Snapshot
+from acquisitions.sequence_writer import SequenceWriter
+from acquisitions.frame_bus import FrameBusPublisher
+from acquisitions.processing import ProcessingPipeline
+from acquisitions.calibration import Calibration, FrameCorrector, acquire_frame_stack, update_calibration
+from remote import ControlServer
+from utils import setup_logging, add_notification_handler, get_computer_name
+
+logger = logging.getLogger(__name__)
+
+def _format_bytes(size_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.1f} TB"
+
+def apply_camera_settings(camera_control, args):
+    """Send the requested exposure, ROI and frame rate to the camera."""
+    if args.exposure is not None:
+        camera_control.call_camera_command("exposure", "set", args.exposure)
+    if args.roi is not None:
+        width, height, offset_x, offset_y = args.roi
+        # Offsets go to zero first so the new width and height always fit on the sensor
+        camera_control.call_camera_command("offset_x", "set", 0)
+        camera_control.call_camera_command("offset_y", "set", 0)
+        camera_control.call_camera_command("width", "set", width)
+        camera_control.call_camera_command("height", "set", height)
+        camera_control.call_camera_command("offset_x", "set", offset_x)
+        camera_control.call_camera_command("offset_y", "set", offset_y)
+    if args.framerate is not None:
+        camera_control.call_camera_command("framerate", "set", args.framerate)
+
+    # Reading back waits for the queued set commands and shows what the camera actually accepted
+    settings = {name: camera_control.call_camera_command(name, "get") for name in ("exposure", "framerate", "width", "height", "offset_x", "offset_y")}
+    print("Camera settings: " + ", ".join(f"{name} {value}" for name, value in settings.items()))
+
+def _start_frame_bus(acquisition_loop, args):
+    """Publish every acquired frame to shared memory when --frame-bus is given."""
+    if not args.frame_bus:
+        return None
+    frame_bus = FrameBusPublisher(args.frame_bus, args.frame_bus_slots, int(args.frame_bus_slot_mb * 1024**2))
+    acquisition_loop.subscribe(frame_bus)
+    print(f"Publishing frames on shared-memory frame bus '{args.frame_bus}'")
+    return frame_bus
+
+def _start_processing(acquisition_loop, args):
+    """Attach the --stage functions, each on its own worker pool."""
+    if not args.stage:
+        return None
+    pipeline = ProcessingPipeline(acquisition_loop)
+    for spec in args.stage:
+        name, _, function = spec.partition('=')
+        pipeline.add_stage(name, function, executor=args.stage_executor, workers=args.stage_workers)
+    return pipeline
+
+def _load_corrector(recorder, args):
+    """Have the recorder correct frames with the --calibration file."""
+    if not args.calibration:
+        return None
+    corrector = FrameCorrector(Calibration.load(args.calibration), args.calibration_workers, args.calibration_output)
+    recorder.corrector = corrector
+    recorder.default_calibrate = True
+    print(f"Correcting frames with {args.calibration}, {len(corrector.calibration.hot_pixels)} defective pixels")
+    return corrector
+
+def _format_trigger(stats):
+    if 'trigger_change' not in stats:
+        return ""
+    return (f"  change {stats['trigger_change']:.2f}{' REC' if stats['trigger_active'] else ''} "
+            f"({stats['trigger_frames_skipped']} skipped)")
+
+def _format_processing(pipeline):
+    if pipeline is None:
+        return ""
+    return "".join(f"  {name} {stats['throughput_fps']:.1f} fps ({stats['frames_dropped']} dropped)"
+                   for name, stats in pipeline.get_stats()['processing'].items())
+
+def record(args):
+    """Record until the frame count or duration is reached, or Ctrl+C. Returns the process exit code."""
+    camera_control = CameraControl()
+    camera_sequences = CameraSequences(camera_control)
+    camera_sequences.connect_camera()
+    acquisition_loop = AcquisitionLoop(camera_control)
+    frame_bus = _start_frame_bus(acquisition_loop, args)
+    processing = _start_processing(acquisition_loop, args)
+    corrector = None
+    try:
+        apply_camera_settings(camera_control, args)
+
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        os.makedirs(output_dir, exist_ok=True)
+
+        recorder = AcquireStream(camera_control, acquisition_loop)
+        corrector = _load_corrector(recorder, args)
+        reduction = {'binning': args.bin, 'bin_mode': args.bin_mode, 'decimate': args.decimate, 'average': args.average}
+        rois = {name: tuple(int(value) for value in rect) for name, *rect in args.crop}
+        background = {'enabled': args.background is not None, 'method': args.background, 'window': args.background_window,
+                      'alpha': args.background_alpha, 'output': args.background_output}
+        trigger = {'enabled': args.trigger is not None, 'threshold': args.trigger, 'subsample': args.trigger_subsample,
+                   'roi': args.trigger_roi, 'reference_alpha': args.trigger_alpha, 'pre_roll': args.pre_roll, 'post_roll': args.post_roll}
+        if not recorder.start_recording(args.output, frame_limit=args.frames, acquisition_type='Command Line',
+                                        reduction=reduction, rois=rois, trigger=trigger, background=background):
+            print("Failed to start recording", file=sys.stderr)
+            return 1
+
+        start = time.monotonic()
+        deadline = start + args.duration if args.duration else None
+        try:
+            while not recorder.stopped.wait(args.status_interval):
+                stats = recorder.get_recording_stats()
+                print(f"{time.monotonic() - start:7.1f} s  {stats['frames_recorded']} frames  "
+                      f"{acquisition_loop.get_stats()['acquisition_fps']:.1f} fps  "
+                      f"queue {_format_bytes(stats['queue_bytes'])} ({stats['queue_fill'] * 100:.0f}%)  "
+                      f"write {stats['writer_bytes_per_s'] / 1024**2:.1f} MB/s" + _format_trigger(stats) + _format_processing(processing))
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        except KeyboardInterrupt:
+            print("Interrupted, saving what was recorded")
+
+        recorder.stop_recording()
+        print("Flushing the queue to disk...")
+        recorder.wait_until_saved()
+
+        stats = recorder.queue.get_queue_stats()
+        elapsed = time.monotonic() - start
+        print(f"Saved {stats['frames_saved']} of {stats['frames_recorded']} frames to {args.output} in {elapsed:.1f} s "
+              f"({stats['frames_dropped']} dropped)")
+        return 0 if stats['frames_saved'] == stats['frames_recorded'] and not stats['frames_dropped'] else 2
+
+    finally:
+        acquisition_loop.stop()
+        if frame_bus is not None:
+            frame_bus.close()
+        if processing is not None:
+            processing.close()
+        if corrector is not None:
+            corrector.close()
+        camera_sequences.disconnect_camera()
+
+def calibrate(args):
+    """Average a dark or flat stack and update the calibration file with it."""
+    camera_control = CameraControl()
+    camera_sequences = CameraSequences(camera_control)
+    camera_sequences.connect_camera()
+    acquisition_loop = AcquisitionLoop(camera_control)
+    try:
+        apply_camera_settings(camera_control, args)
+        print(f"Averaging {args.frames} {args.kind} frames...")
+        stack = acquire_frame_stack(acquisition_loop, args.frames)
+        if stack is None:
+            print("No frames arrived from the camera", file=sys.stderr)
+            return 1
+        mean, std, frames = stack
+        previous = Calibration.load(args.output) if os.path.exists(args.output) else None
+        info = {
+            f"{args.kind.capitalize()} Frames": frames,
+            f"{args.kind.capitalize()} Exposure": camera_control.call_camera_command("exposure", "get"),
+            f"{args.kind.capitalize()} Time": datetime.now().isoformat()
+        }
+        try:
+            calibration = update_calibration(previous, args.kind, mean, std, args.hot_sigma, info)
+        except ValueError as e:
+            print(f"Calibration not saved: {str(e)}", file=sys.stderr)
+            return 1
+        calibration.save(args.output)
+        print(f"Saved the calibration to {args.output}: {frames} {args.kind} frames, {len(calibration.hot_pixels)} defective pixels"
+              f"{', with flat field' if 'flat_mean' in calibration.stacks else ''}")
+        return 0 if frames == args.frames else 2
+
+    finally:
+        acquisition_loop.stop()
+        camera_sequences.disconnect_camera()
+
+def timelapse(args):
+    """Run a time-lapse, optionally stepping through exposures or frame rates at each time point."""
+    camera_control = CameraControl()
+    camera_sequences = CameraSequences(camera_control)
+    camera_sequences.connect_camera()
+    try:
+        apply_camera_settings(camera_control, args)
+
+        if args.exposures or args.framerates:
+            name, values = ('exposure', args.exposures) if args.exposures else ('framerate', args.framerates)
+            block = camera_sequences.parameter_series(name, values, interval=args.series_interval, frames=args.frames_per_point)
+            points = camera_sequences.repeat(block, args.count, args.interval)
+        else:
+            points = camera_sequences.time_lapse(args.interval, args.count, frames=args.frames_per_point)
+
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        writer = SequenceWriter(args.output, {
+            'Computer Name': get_computer_name(),
+            'Acquisition Type': 'Time Lapse',
+            'Software Name': 'microTool',
+            'Camera Model': camera_control.camera.get_device_name().decode('utf-8'),
+            'Start Time': datetime.now().isoformat(),
+            'Interval': args.interval,
+            'Points': len(points)
+        })
+
+        # The sequence runs on its own thread so Ctrl+C can end it cleanly between frames
+        stop_event = threading.Event()
+        result = {}
+        def run():
+            result['report'] = camera_sequences.run_sequence(points, writer.write, stop_event)
+        sequence_thread = threading.Thread(target=run, name="SequenceThread")
+        print(f"Time-lapse of {len(points)} points over {points[-1]['time']:.1f} s, writing to {args.output}")
+        sequence_thread.start()
+        try:
+            while sequence_thread.is_alive():
+                sequence_thread.join(args.status_interval)
+                if sequence_thread.is_alive():
+                    print(f"{writer.frame_count} frames written")
+        except KeyboardInterrupt:
+            print("Interrupted, finishing the current point")
+            stop_event.set()
+            sequence_thread.join()
+
+        report = result.get('report')
+        writer.close(report)
+        if report is None:
+            print("Sequence failed, see the log", file=sys.stderr)
+            return 1
+        with open(args.output.rsplit('.', 1)[0] + "_timing.json", 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"{report['points_acquired']}/{report['points_requested']} points, {report['frames']} frames. "
+              f"Timing error vs schedule: mean {report['mean_error_ms']:.3f} ms, std {report['std_error_ms']:.3f} ms, "
+              f"p95 {report['p95_abs_error_ms']:.3f} ms, max {report['max_abs_error_ms']:.3f} ms")
+        return 0 if report['points_acquired'] == report['points_requested'] else 2
+
+    finally:
+        camera_sequences.disconnect_camera()
+
+def serve(args):
+    """Run the remote control server without a GUI until Ctrl+C."""
+    camera_control = CameraControl()
+    camera_sequences = CameraSequences(camera_control)
+    camera_sequences.connect_camera()
+    stream_camera = LiveStreamHandler(camera_control)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interface', 'ui_scaffolding.json'), 'r') as f:
+        snapshot_settings = json.load(f)['snapshot']
+    snapshot = Snapshot(stream_camera, snapshot_settings)
+    # Snapshots and recordings without a path go under _data
+    os.makedirs('_data', exist_ok=True)
+    recorder = AcquireStream(camera_control, stream_camera.acquisition_loop)
+    corrector = _load_corrector(recorder, args)
+    frame_bus = _start_frame_bus(stream_camera.acquisition_loop, args)
+    processing = _start_processing(stream_camera.acquisition_loop, args)
+    server = ControlServer(camera_control, stream_camera, recorder, snapshot, processing=processing,
+                           host=args.host, port=args.port, unix_socket=args.unix_socket)
+    try:
+        if not server.start():
+            print(f"Failed to start the control server on {server.address}", file=sys.stderr)
+            return 1
+        print(f"Control server listening on {server.address}, Ctrl+C to quit")
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        if recorder.is_recording:
+            print("Stopping the recording and flushing the queue to disk...")
+            recorder.stop_recording()
+        recorder.wait_until_saved()
+        return 0
+
+    finally:
+        server.stop()
+        snapshot.cleanup()
+        stream_camera.cleanup()
+        if frame_bus is not None:
+            frame_bus.close()
+        if processing is not None:
+            processing.close()
+        if corrector is not None:
+            corrector.close()
+        camera_sequences.disconnect_camera()
+
+def _add_frame_bus_arguments(parser):
+    parser.add_argument('--frame-bus', metavar='NAME', default=None, help="Publish frames to analysis processes on this shared-memory bus")
+    parser.add_argument('--frame-bus-slots', type=int, default=8, help="Frames kept in the bus ring")
+    parser.add_argument('--frame-bus-slot-mb', type=float, default=16, help="Largest frame the bus takes, in MB")
+
+def _add_processing_arguments(parser):
+    parser.add_argument('--stage', metavar='NAME=MODULE:FUNCTION', action='append', default=[],
+                        help="Run a function on every frame, e.g. mean=numpy:mean. Can be given more than once")
+    parser.add_argument('--stage-executor', choices=['thread', 'process'], default='thread', help="Worker pool type for the stages")
+    parser.add_argument('--stage-workers', type=int, default=1, help="Workers per stage")
+
+def _add_calibration_arguments(parser):
+    parser.add_argument('--calibration', metavar='FILE', default=None, help="Record frames corrected with this calibration file")
+    parser.add_argument('--calibration-output', choices=['camera', 'float32'], default='camera',
+                        help="Store corrected frames in the camera dtype, or as float32")
+    parser.add_argument('--calibration-workers', type=int, default=4, help="Threads correcting each frame")
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="microTool", description="Headless microTool acquisition.")
+    parser.add_argument('--log-profile', choices=['development', 'production'], default=None,
+                        help="Logging profile, defaults to MICROTOOL_LOG_PROFILE or utils/logging.json")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help="Record frames to an HDF5 file")
+    limit = record_parser.add_mutually_exclusive_group()
+    limit.add_argument('--frames', type=int, help="Stop after this many camera frames")
+    limit.add_argument('--duration', type=float, help="Stop after this many seconds")
+    record_parser.add_argument('--output', default=f"_data/recording_{time.strftime('%Y%m%d_%H%M%S')}.h5", help="HDF5 file to write")
+    record_parser.add_argument('--exposure', type=float, help="Exposure time in microseconds")
+    record_parser.add_argument('--framerate', type=float, help="Frame rate in Hz")
+    record_parser.add_argument('--roi', type=int, nargs=4, metavar=('WIDTH', 'HEIGHT', 'OFFSET_X', 'OFFSET_Y'), help="Region of interest")
+    record_parser.add_argument('--status-interval', type=float, default=1.0, help="Seconds between progress lines")
+    record_parser.add_argument('--bin', type=int, default=1, choices=[1, 2, 4], help="Bin N x N pixels before storage")
+    record_parser.add_argument('--bin-mode', choices=['sum', 'mean'], default='sum', help="Sum bins in a wider dtype, or average them in the camera dtype")
+    record_parser.add_argument('--decimate', type=int, default=1, help="Store every N-th frame")
+    record_parser.add_argument('--average', type=int, default=1, help="Average N frames into each stored frame")
+    record_parser.add_argument('--crop', nargs=5, action='append', default=[], metavar=('NAME', 'X', 'Y', 'WIDTH', 'HEIGHT'),
+                               help="Store only this region, as rois/NAME. Can be given more than once")
+    record_parser.add_argument('--trigger', type=float, metavar='THRESHOLD', default=None,
+                               help="Store only frames around changes above this mean absolute difference, in grey levels")
+    record_parser.add_argument('--trigger-subsample', type=int, default=8, help="Grid step of the change metric in pixels")
+    record_parser.add_argument('--trigger-roi', type=int, nargs=4, metavar=('X', 'Y', 'WIDTH', 'HEIGHT'), help="Measure change only in this region")
+    record_parser.add_argument('--trigger-alpha', type=float, default=0.1, help="Weight of each frame in the running reference")
+    record_parser.add_argument('--pre-roll', type=int, default=10, help="Frames stored before a change")
+    record_parser.add_argument('--post-roll', type=int, default=30, help="Frames stored after a change")
+    record_parser.add_argument('--background', choices=['mean', 'ema', 'median'], default=None,
+                               help="Store frames minus a rolling background estimated this way")
+    record_parser.add_argument('--background-window', type=int, default=50, help="Frames the rolling background covers, for every method")
+    record_parser.add_argument('--background-alpha', type=float, default=None, help="Weight of each frame in the ema background")
+    record_parser.add_argument('--background-output', choices=['camera', 'float32'], default='camera',
+                               help="Store the difference offset to the background level in the camera dtype, or signed as float32")
+    _add_frame_bus_arguments(record_parser)
+    _add_processing_arguments(record_parser)
+    _add_calibration_arguments(record_parser)
+    record_parser.set_defaults(func=record)
+
+    calibrate_parser = subparsers.add_parser('calibrate', help="Average dark or flat frames into a calibration file")
+    calibrate_parser.add_argument('kind', choices=['dark', 'flat'], help="Dark frames with the light blocked, or an evenly lit flat field")
+    calibrate_parser.add_argument('--frames', type=int, default=50, help="Frames to average")
+    calibrate_parser.add_argument('--output', default="_data/calibration.h5", help="Calibration file, the other stack in it is kept")
+    calibrate_parser.add_argument('--hot-sigma', type=float, default=6.0, help="Robust standard deviations above which a pixel is defective")
+    calibrate_parser.add_argument('--exposure', type=float, help="Exposure time in microseconds")
+    calibrate_parser.add_argument('--framerate', type=float, help="Frame rate in Hz")
+    calibrate_parser.add_argument('--roi', type=int, nargs=4, metavar=('WIDTH', 'HEIGHT', 'OFFSET_X', 'OFFSET_Y'), help="Region of interest")
+    calibrate_parser.set_defaults(func=calibrate)
+
+    timelapse_parser = subparsers.add_parser('timelapse', help="Time-lapse and exposure/frame rate series into one HDF5 file")
+    timelapse_parser.add_argument('--interval', type=float, required=True, help="Seconds between time points")
+    timelapse_parser.add_argument('--count', type=_positive_int, required=True, help="Number of time points")
+    timelapse_parser.add_argument('--frames-per-point', type=_positive_int, default=1, help="Burst length at each point")
+    series = timelapse_parser.add_mutually_exclusive_group()
+    series.add_argument('--exposures', type=float, nargs='+', help="Step through these exposures (us) at each time point")
+    series.add_argument('--framerates', type=float, nargs='+', help="Step through these frame rates (Hz) at each time point")
+    timelapse_parser.add_argument('--series-interval', type=float, default=0.0, help="Seconds between the steps of a series")
+    timelapse_parser.add_argument('--output', default=f"_data/timelapse_{time.strftime('%Y%m%d_%H%M%S')}.h5", help="HDF5 file to write")
+    timelapse_parser.add_argument('--exposure', type=float, help="Exposure time in microseconds")
+    timelapse_parser.add_argument('--framerate', type=float, help="Frame rate in Hz")
+    timelapse_parser.add_argument('--roi', type=int, nargs=4, metavar=('WIDTH', 'HEIGHT', 'OFFSET_X', 'OFFSET_Y'), help="Region of interest")
+    timelapse_parser.add_argument('--status-interval', type=float, default=5.0, help="Seconds between progress lines")
+    timelapse_parser.set_defaults(func=timelapse)
+
+    serve_parser = subparsers.add_parser('serve', help="Run the remote control server without a GUI")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="Address to listen on, keep it local, there is no authentication")
+    serve_parser.add_argument('--port', type=int, default=5757, help="TCP port")
+    serve_parser.add_argument('--unix-socket', default=None, help="Listen on this Unix socket instead of TCP")
+    _add_frame_bus_arguments(serve_parser)
+    _add_processing_arguments(serve_parser)
+    _add_calibration_arguments(serve_parser)
+    serve_parser.set_defaults(func=serve)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_profile)
+    # Status messages from the acquisition core go to the terminal
+    add_notification_handler(lambda message, duration: print(message))
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
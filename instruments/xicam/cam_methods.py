@@ -1,9 +1,10 @@
-import json
+import json, os, time, threading
 from ximea import xiapi
 from queue import Queue
 from threading import Lock, Thread
 
 from . import logger
+from utils import TracedLock, tracer
 
 class CameraControl:
     
@@ -20,13 +21,14 @@ class CameraControl:
         # Setup queue for camera commands
         self.command_queue = Queue()
         # Setup lock for camera access, ensures only one command is sent to the camera at a time
-        self.camera_lock = Lock()
+        self.camera_lock = TracedLock("camera_lock", Lock())
         self.command_thread = None
         self.running = True
                 
     def _load_commands_from_json(self):
                
-        with open('instruments/xicam/commands.json', 'r') as file:
+        # Relative to this module, so the command line tool works from any directory
+        with open(os.path.join(os.path.dirname(__file__), 'commands.json'), 'r') as file:
             commands = json.load(file)
         self.set_commands = {cmd['cmd']: cmd for cmd in commands['set']}
         self.get_commands = {cmd['cmd']: cmd for cmd in commands['get']}
@@ -60,7 +62,8 @@ class CameraControl:
                 
                 with self.camera_lock:
                     try:
-                        result = self._execute_camera_command(friendly_name, method, value)
+                        with tracer.span(f"command.{method}", 'camera', {'name': friendly_name}):
+                            result = self._execute_camera_command(friendly_name, method, value)
                         if result_queue:
                             result_queue.put(result)
                     except Exception as e:
@@ -105,11 +108,11 @@ class CameraControl:
                     logger.error(f"Error converting value to {value_type}: {str(e)}")
                     return None
                     
-                logger.debug(f"Setting {friendly_name} to {value} ({type(value)})")  # Debug print
+                logger.debug("Setting %s to %s (%s)", friendly_name, value, type(value).__name__)
                 camera_method(value)
                 return value
             else:  # method == "get"
-                logger.debug(f"Getting {friendly_name} value")  # Debug print
+                logger.debug("Getting %s value", friendly_name)
                 result = camera_method()
                 return result
             
@@ -227,28 +230,39 @@ class CameraControl:
 
 class CameraSequences():
     """
-    Handles high-level camera acquisition patterns like streaming and time series capture.
+    Handles high-level camera acquisition patterns: connecting, time-lapse, parameter series and bursts.
 
     Called by:
     - app.py: Main application initializes CameraSequences on startup
-    - interface/ui_methods.py: UIMethods uses sequences for camera operations
-    - acquisitions/stream_camera.py: LiveStreamHandler uses sequences for streaming
+    - cli.py: Headless recording, the remote server and time-lapse runs
+
+    A sequence is a list of points, each a dict with
+        'time'     - seconds after the start at which the point is due
+        'frames'   - consecutive frames to take (a burst), default 1
+        'settings' - camera settings applied before the point, e.g. {'exposure': 2000}
+    Deadlines are absolute offsets from one monotonic start time, so a late point never shifts the ones
+    after it and there is no cumulative drift.
 
     Example usage:
         # Initialize camera control and sequences
         ctrl = CameraControl()
         sequences = CameraSequences(ctrl)
-
-        # Start streaming
         sequences.connect_camera()
-        sequences.stream_camera()  # Continuous acquisition
-        
-        # Or capture time series
-        sequences.acquire_time_series(100)  # 100 frames
-        
+
+        # 100 frames, one every 30 s, the camera idles in between
+        report = sequences.run_sequence(sequences.time_lapse(30.0, 100), sink)
+
+        # An exposure series, repeated every 10 minutes
+        series = sequences.parameter_series('exposure', [1000, 2000, 5000], interval=0.5)
+        report = sequences.run_sequence(sequences.repeat(series, 12, 600.0), sink)
+
         # Cleanup
         sequences.disconnect_camera()
     """
+
+    # Deadlines are met by sleeping until this close and then spinning on the monotonic clock
+    SPIN_WINDOW = 0.002
+
     def __init__(self, camera_control):
         
         """Takes a CameraControl instance and uses its camera."""
@@ -266,6 +280,157 @@ class CameraSequences():
         """Disconnect from the Ximea camera."""
         self.camera_control.close()
 
-    def acquire_time_series(self, num_images):
-        for i in range(num_images):
-            return self.camera_control.get_image()
+    @staticmethod
+    def time_lapse(interval, count, frames=1, settings=None):
+        """`count` points `interval` seconds apart, each a burst of `frames` frames."""
+        return [{'time': i * interval, 'frames': frames, 'settings': dict(settings or {})} for i in range(count)]
+
+    @staticmethod
+    def parameter_series(name, values, interval=0.0, frames=1):
+        """One point per value of the camera setting `name`, `interval` seconds apart."""
+        return [{'time': i * interval, 'frames': frames, 'settings': {name: value}} for i, value in enumerate(values)]
+
+    @staticmethod
+    def repeat(points, count, period):
+        """Run a block of points `count` times, starting a new block every `period` seconds."""
+        return [dict(point, time=point['time'] + i * period) for i in range(count) for point in points]
+
+    def acquire_time_series(self, num_images, interval=0.0, sink=None, stop_event=None):
+        """Take `num_images` single frames `interval` seconds apart, returns the timing report."""
+        return self.run_sequence(self.time_lapse(interval, num_images), sink, stop_event)
+
+    def run_sequence(self, points, sink=None, stop_event=None, idle_threshold=0.5):
+        """
+        Acquire the points on a drift-free monotonic schedule.
+
+        When every gap between points is at least `idle_threshold` seconds the camera is stopped between
+        points and started again ahead of the next one, by the start-up latency measured on earlier
+        points, to save bandwidth. Otherwise it keeps running and frames between points are discarded.
+        A running camera is restarted when a point changes its settings, frames it had already exposed or
+        buffered would otherwise be tagged with settings they were not taken with.
+
+        Args:
+            points: Sequence points, see the class docstring
+            sink: Called as sink(frame, timestamp, metadata) for every frame, metadata holds the point and
+                frame index, requested and achieved times in seconds from the start and the applied settings
+            stop_event: threading.Event that ends the sequence early when set
+
+        Returns:
+            dict: Timing report comparing achieved with requested point times
+        """
+        camera = self.camera_control
+        points = sorted(points, key=lambda point: point['time'])
+        gaps = [b['time'] - a['time'] for a, b in zip(points, points[1:])]
+        idle = bool(gaps) and min(gaps) >= idle_threshold
+        stop_event = stop_event or threading.Event()
+        applied = {}
+        errors = []
+        frames_taken = 0
+        start_lead = 0.0
+        running = False
+        frame_period = self._frame_period()  # Longest wait for a frame while draining, so the drain stops a frame early
+
+        logger.info(f"Sequence of {len(points)} points over {points[-1]['time'] if points else 0:.3f} s, camera {'idle' if idle else 'running'} between points")
+        t0 = time.monotonic()
+        try:
+            for index, point in enumerate(points):
+                deadline = t0 + point['time']
+
+                # Settings go in while waiting, the camera accepts most of them while stopped
+                changed = {name: value for name, value in (point.get('settings') or {}).items() if applied.get(name) != value}
+                if changed and running:
+                    camera.stop_camera()
+                    running = False
+                for name, value in changed.items():
+                    camera.call_camera_command(name, "set", value)
+                    applied[name] = camera.call_camera_command(name, "get") if name in camera.get_commands_by_name else value
+                if changed:
+                    frame_period = self._frame_period()
+
+                if idle or not running:
+                    # Start early by the measured start-up latency so the first frame lands on the deadline
+                    if not self._wait_until(deadline - start_lead, stop_event):
+                        break
+                    start_called = time.monotonic()
+                    camera.start_camera()
+                    running = True
+                else:
+                    # Drain frames while a whole frame still fits before the deadline so the next one is fresh
+                    # rather than buffered, then wait out the rest without blocking on the camera
+                    while time.monotonic() + frame_period < deadline - self.SPIN_WINDOW and not stop_event.is_set():
+                        drain_start = time.monotonic()
+                        camera.get_image()
+                        frame_period = max(frame_period, time.monotonic() - drain_start)
+                    if not self._wait_until(deadline, stop_event):
+                        break
+                    start_called = None
+
+                for frame_index in range(point.get('frames', 1)):
+                    camera.get_image()
+                    acquired = time.monotonic()
+                    frame = camera.get_image_data()
+                    timestamp = camera.get_image_timestamp()
+                    if frame_index == 0:
+                        errors.append(acquired - deadline)
+                        if start_called is not None:
+                            latency = acquired - start_called
+                            start_lead = latency if index == 0 else 0.5 * start_lead + 0.5 * latency
+                    frames_taken += 1
+                    if sink is not None:
+                        sink(frame, timestamp, {
+                            'point': index,
+                            'frame': frame_index,
+                            'requested_s': point['time'],
+                            'acquired_s': acquired - t0,
+                            'error_s': acquired - deadline,
+                            **applied
+                        })
+
+                if idle:
+                    camera.stop_camera()
+                    running = False
+        finally:
+            if running:
+                camera.stop_camera()
+
+        report = self._timing_report(errors, len(points), frames_taken, time.monotonic() - t0, idle)
+        report['stopped_early'] = stop_event.is_set()
+        logger.info(f"Sequence finished: {report['points_acquired']}/{report['points_requested']} points, "
+                    f"timing error mean {report['mean_error_ms']:.3f} ms, max {report['max_abs_error_ms']:.3f} ms")
+        return report
+
+    def _frame_period(self):
+        """Seconds between frames at the current frame rate, 0 if the camera does not report it."""
+        try:
+            return 1.0 / float(self.camera_control.call_camera_command("framerate", "get"))
+        except (TypeError, ValueError, ZeroDivisionError):
+            return 0.0
+
+    def _wait_until(self, deadline, stop_event):
+        """Sleep until shortly before the deadline, then spin. Returns False if stop_event was set."""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return not stop_event.is_set()
+            if remaining > self.SPIN_WINDOW:
+                if stop_event.wait(remaining - self.SPIN_WINDOW):
+                    return False
+
+    @staticmethod
+    def _timing_report(errors, points_requested, frames_taken, duration, idle):
+        errors_ms = sorted(error * 1000 for error in errors)
+        abs_ms = sorted(abs(error) for error in errors_ms)
+        count = len(errors_ms)
+        mean = sum(errors_ms) / count if count else 0.0
+        return {
+            'points_requested': points_requested,
+            'points_acquired': count,
+            'frames': frames_taken,
+            'duration_s': round(duration, 6),
+            'camera_idle_between_points': idle,
+            'mean_error_ms': round(mean, 4),
+            'std_error_ms': round((sum((e - mean) ** 2 for e in errors_ms) / count) ** 0.5, 4) if count else 0.0,
+            'max_abs_error_ms': round(abs_ms[-1], 4) if count else 0.0,
+            'p95_abs_error_ms': round(abs_ms[min(int(0.95 * count), count - 1)], 4) if count else 0.0,
+            'errors_ms': [round(error * 1000, 4) for error in errors]
+        }
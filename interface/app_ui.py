@@ -3,7 +3,7 @@ import json, os
 import pyqtgraph as pg  
 import qtawesome as qta
 
-from PyQt6.QtWidgets import QMainWindow, QLabel, QWidget, QSlider, QHBoxLayout, QSpinBox, QVBoxLayout, QToolBar, QStatusBar, QPushButton, QGridLayout
+from PyQt6.QtWidgets import QMainWindow, QLabel, QWidget, QSlider, QHBoxLayout, QSpinBox, QDoubleSpinBox, QComboBox, QVBoxLayout, QToolBar, QStatusBar, QPushButton, QGridLayout, QMenu, QToolButton
 from PyQt6.QtGui import QAction
 from PyQt6.QtCore import Qt
 
@@ -48,8 +48,20 @@ class AppUI(QMainWindow):
         for action_name, action_data in self.ui_scaffolding['toolbar']['icons'].items():
             action_obj = QAction(qta.icon(action_data['icon']), action_name, self)
             action_obj.setToolTip(action_data['tooltip'])
+            action_obj.setCheckable(action_data.get('checkable', False))
             toolbar.addAction(action_obj)
             setattr(self, action_data['cmd'], action_obj)
+            # Actions with a menu open it on click, each menu entry is set as an attribute like the toolbar actions
+            if 'menu' in action_data:
+                menu = QMenu(self)
+                for item_name, item_data in action_data['menu'].items():
+                    item_obj = menu.addAction(item_name)
+                    item_obj.setToolTip(item_data.get('tooltip', item_name))
+                    item_obj.setCheckable(item_data.get('checkable', False))
+                    setattr(self, item_data['cmd'], item_obj)
+                menu.setToolTipsVisible(True)
+                action_obj.setMenu(menu)
+                toolbar.widgetForAction(action_obj).setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
     
     def create_image_container(self):
         image_container = DispMouseHandler(self)
@@ -106,6 +118,62 @@ class AppUI(QMainWindow):
         self.hist_display.setFixedHeight(120)
         self.histogram_plot = ImgHistDisplay(self.hist_display)
     
+    def setup_display_controls(self):
+        display_group_widget = QWidget()
+        display_layout = QHBoxLayout(display_group_widget)
+        display_layout.setContentsMargins(0, 0, 0, 0)
+        display_settings = self.ui_scaffolding['display']
+
+        stretch_settings = display_settings['stretch']
+        self.display_stretch = QComboBox()
+        for label, mode in stretch_settings['options'].items():
+            self.display_stretch.addItem(label, mode)
+        self.display_stretch.setToolTip(stretch_settings['tooltip'])
+        display_layout.addWidget(QLabel(stretch_settings['label']))
+        display_layout.addWidget(self.display_stretch)
+
+        gamma_settings = display_settings['gamma']
+        self.display_gamma = QDoubleSpinBox()
+        self.display_gamma.setRange(gamma_settings['min'], gamma_settings['max'])
+        self.display_gamma.setSingleStep(gamma_settings['step'])
+        self.display_gamma.setValue(gamma_settings['default'])
+        self.display_gamma.setToolTip(gamma_settings['tooltip'])
+        display_layout.addWidget(QLabel(gamma_settings['label']))
+        display_layout.addWidget(self.display_gamma)
+
+        colormap_settings = display_settings['colormap']
+        self.display_colormap = QComboBox()
+        self.display_colormap.addItems(colormap_settings['options'])
+        self.display_colormap.setToolTip(colormap_settings['tooltip'])
+        display_layout.addWidget(QLabel(colormap_settings['label']))
+        display_layout.addWidget(self.display_colormap)
+
+        return display_group_widget
+
+    def setup_snapshot_controls(self):
+        snapshot_group_widget = QWidget()
+        snapshot_layout = QHBoxLayout(snapshot_group_widget)
+        snapshot_layout.setContentsMargins(0, 0, 0, 0)
+        snapshot_settings = self.ui_scaffolding['snapshot']
+
+        mode_settings = snapshot_settings['mode']
+        self.snapshot_mode = QComboBox()
+        for label, mode in mode_settings['options'].items():
+            self.snapshot_mode.addItem(label, mode)
+        self.snapshot_mode.setToolTip(mode_settings['tooltip'])
+        snapshot_layout.addWidget(QLabel(mode_settings['label']))
+        snapshot_layout.addWidget(self.snapshot_mode)
+
+        frames_settings = snapshot_settings['frames']
+        self.snapshot_frames = QSpinBox()
+        self.snapshot_frames.setRange(frames_settings['min'], frames_settings['max'])
+        self.snapshot_frames.setValue(frames_settings['default'])
+        self.snapshot_frames.setToolTip(frames_settings['tooltip'])
+        snapshot_layout.addWidget(QLabel(frames_settings['label']))
+        snapshot_layout.addWidget(self.snapshot_frames)
+
+        return snapshot_group_widget
+    
     def setup_exposure_slider(self):
         self.exposure_slider = QSlider(Qt.Orientation.Horizontal)
         self.exposure_slider.setTickInterval(5000)
@@ -125,6 +193,8 @@ class AppUI(QMainWindow):
         controls_wide_layout = QVBoxLayout(controls_wide)
 
         controls_wide_layout.addWidget(self.hist_display)
+        controls_wide_layout.addWidget(self.setup_display_controls())
+        controls_wide_layout.addWidget(self.setup_snapshot_controls())
         controls_wide_layout.addWidget(self.exposure_slider)
         controls_wide_layout.addWidget(self.exposure_label)
 
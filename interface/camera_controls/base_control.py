@@ -68,15 +68,15 @@ class NumericCameraControl(CameraControl):
     def handle_value_change(self, value: float) -> None:
         self.pending_value = value
         self.control_timer.start(1)  # 1 ms debounce time
-        self.logger.debug(f"{self.display_name} value change queued: {value}")
+        self.logger.debug("%s value change queued: %s", self.display_name, value)
         
     def _apply_change(self) -> None:
         """Apply the pending change to the camera."""
         if self.pending_value is not None:
             try:
-                self.logger.debug(f"Applying {self.display_name} change: {self.pending_value}")
+                self.logger.debug("Applying %s change: %s", self.display_name, self.pending_value)
                 self.camera_control.call_camera_command(self.command_name, "set", self.pending_value)
-                logger.debug(f"{self.display_name} change applied successfully")
+                logger.debug("%s change applied successfully", self.display_name)
                 
                 # Update status bar if available
                 if hasattr(self.window, 'ui_methods') and hasattr(self.window.ui_methods, 'status_bar_manager'):
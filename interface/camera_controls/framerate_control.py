@@ -80,20 +80,20 @@ class FramerateControl(NumericCameraControl):
         try:
             formatted_value = f"Framerate: {value:.1f} Hz"
             self.window.framerate_label.setText(formatted_value)
-            logger.debug(f"Updated framerate label to: {formatted_value}")  # Debug print
+            logger.debug("Updated framerate label to: %s", formatted_value)
         except Exception as e:
             logger.error(f"Error updating framerate label: {str(e)}")
     
     def handle_value_change(self, value):
         """Handle framerate slider value changes."""
-        logger.debug(f"Framerate value changed to: {value}")  # Debug print
+        logger.debug("Framerate value changed to: %s", value)
         self._format_and_update_label(value)
         super().handle_value_change(float(value))  # Convert back to float for camera
         
     def _apply_change(self):
         """Apply the pending framerate change to the camera."""
         if self.pending_value is not None:
-            logger.debug(f"Applying framerate value: {self.pending_value}")  # Debug print
+            logger.debug("Applying framerate value: %s", self.pending_value)
             try:
                 self.camera_control.call_camera_command(self.command_name, "set", self.pending_value)
                 logger.debug("Successfully applied framerate value")  # Debug print
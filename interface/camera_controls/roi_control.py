@@ -78,7 +78,7 @@ class ROIControl(NumericCameraControl):
             # Update camera
             self.camera_control.call_camera_command(command, "set", value)
             
-            logger.debug(f"{command} set to {value}")
+            logger.debug("%s set to %s", command, value)
             
             if command in ['width', 'height']:
                 # Get current dimension and max dimension
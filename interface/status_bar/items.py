@@ -2,11 +2,10 @@
 Specific status bar items for camera information.
 """
 from typing import Any
-from .status_bar_item import StatusBarItem
+from .status_bar_item import StatusBarItem, MeasuredStatusBarItem
 import logging
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.ERROR)  # This will suppress DEBUG, INFO, and WARNING messages
+logger = logging.getLogger(__name__)  # Level set in utils/logging.json
 
 class CameraModelItem(StatusBarItem):
     """Status bar item for camera model name."""
@@ -49,7 +48,7 @@ class ImageSizeItem(StatusBarItem):
         if value:
             width, height = value
             size_bytes = width * height
-            logger.debug(f"ImageSizeItem: Calculating size for {width}x{height} = {size_bytes} bytes")  # Debug print
+            logger.debug("ImageSizeItem: Calculating size for %sx%s = %s bytes", width, height, size_bytes)
 
             if size_bytes >= 1024**3:  # GB
                 return f"{size_bytes / (1024**3):.2f} GB"
@@ -65,7 +64,7 @@ class ImageSizeItem(StatusBarItem):
         try:
             width = int(camera_control.call_camera_command("width", "get"))
             height = int(camera_control.call_camera_command("height", "get"))
-            logger.debug(f"ImageSizeItem: Got dimensions from camera: {width}x{height}")  # Debug print
+            logger.debug("ImageSizeItem: Got dimensions from camera: %sx%s", width, height)
             return (width, height)
         except Exception as e:
             logger.error(f"ImageSizeItem: Error getting dimensions from camera: {str(e)}")  # Debug print
@@ -92,4 +91,112 @@ class StreamingBandwidthItem(StatusBarItem):
         framerate = float(camera_control.call_camera_command("framerate", "get"))
         width = int(camera_control.call_camera_command("width", "get"))
         height = int(camera_control.call_camera_command("height", "get"))
-        return (framerate, width, height) 
\ No newline at end of file
+        return (framerate, width, height)
+
+class AcquisitionFpsItem(MeasuredStatusBarItem):
+    """Status bar item for the measured camera acquisition rate."""
+    
+    def format_value(self, value: float) -> str:
+        return f"Acq {value:.1f} fps"
+        
+    def get_value_from_stats(self, stats: dict) -> float:
+        if 'acquisition_fps' not in stats:
+            return None
+        return round(stats['acquisition_fps'], 1)
+
+class DisplayFpsItem(MeasuredStatusBarItem):
+    """Status bar item for the measured display refresh rate."""
+    
+    def format_value(self, value: float) -> str:
+        return f"Disp {value:.1f} fps"
+        
+    def get_value_from_stats(self, stats: dict) -> float:
+        if 'display_fps' not in stats:
+            return None
+        return round(stats['display_fps'], 1)
+
+def _format_bytes(size_bytes: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+    return f"{size_bytes:.1f} TB"
+
+def _format_duration(seconds: float) -> str:
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+class WriterRateItem(MeasuredStatusBarItem):
+    """Status bar item for the measured rate at which frames are written to disk."""
+    
+    def format_value(self, value: float) -> str:
+        return f"Write {value:.1f} MB/s"
+        
+    def get_value_from_stats(self, stats: dict) -> float:
+        if 'writer_bytes_per_s' not in stats:
+            return None
+        return round(stats['writer_bytes_per_s'] / 1024**2, 1)
+
+class QueueFillItem(MeasuredStatusBarItem):
+    """Status bar item for the recording queue occupancy in bytes and percent."""
+    
+    def format_value(self, value: tuple) -> str:
+        queue_bytes, fill = value
+        return f"Queue {_format_bytes(queue_bytes)} ({fill * 100:.0f}%)"
+        
+    def get_value_from_stats(self, stats: dict) -> tuple:
+        if 'queue_bytes' not in stats:
+            return None
+        return (stats['queue_bytes'], round(stats['queue_fill'], 2))
+
+class DroppedFramesItem(MeasuredStatusBarItem):
+    """Status bar item for frames the recording could not queue."""
+    
+    def format_value(self, value: int) -> str:
+        return f"Dropped {value}"
+        
+    def get_value_from_stats(self, stats: dict) -> int:
+        if 'frames_dropped' not in stats:
+            return None
+        return stats['frames_dropped']
+
+class FillEtaItem(MeasuredStatusBarItem):
+    """Status bar item for the time until the queue or the disk fills at the current rates."""
+    
+    def format_value(self, value: float) -> str:
+        if value == float('inf'):
+            return "ETA --"
+        return f"ETA {_format_duration(value)}"
+        
+    def get_value_from_stats(self, stats: dict) -> float:
+        if 'eta_s' not in stats:
+            return None
+        return stats['eta_s'] if stats['eta_s'] == float('inf') else int(stats['eta_s'])
+
+class MemoryItem(MeasuredStatusBarItem):
+    """Status bar item for process memory against the budget, with its trend and a per-buffer tooltip."""
+    
+    def format_value(self, value: tuple) -> str:
+        rss, budget, trend, eta, warning, accounts = value
+        text = f"Mem {_format_bytes(rss)}/{_format_bytes(budget)} {'+' if trend >= 0 else '-'}{_format_bytes(abs(trend))}/s"
+        # Only worth showing while the budget is within the hour
+        if eta < 3600:
+            text += f" (full in {_format_duration(eta)})"
+        held = ", ".join(f"{name} {_format_bytes(size)}" for name, size in accounts)
+        self.label.setToolTip(f"Held by the pipeline: {held}" if held else "")
+        self.label.setStyleSheet("color: #FF4444;" if warning else "")
+        return text
+        
+    def get_value_from_stats(self, stats: dict) -> tuple:
+        if 'mem_rss_bytes' not in stats:
+            return None
+        # Rounded so the label only changes when something visible does
+        return (
+            round(stats['mem_rss_bytes'], -5),
+            stats['mem_budget_bytes'],
+            round(stats['mem_rss_trend_bytes_per_s'], -4),
+            stats['mem_budget_eta_s'] if stats['mem_budget_eta_s'] == float('inf') else int(stats['mem_budget_eta_s']),
+            stats['mem_warning'],
+            tuple(sorted(stats['mem_accounts'].items()))
+        )
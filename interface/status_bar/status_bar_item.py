@@ -22,13 +22,13 @@ class StatusBarItem(ABC):
     @property
     def value(self) -> Any:
         """Get the current value."""
-        logger.debug(f"StatusBarItem.value: Getting value: {self._value}")
+        logger.debug("StatusBarItem.value: Getting value: %s", self._value)
         return self._value
         
     @value.setter
     def value(self, new_value: Any):
         """Set the value and update the label if needed."""
-        logger.debug(f"StatusBarItem.value.setter: Setting value from {self._value} to {new_value}")
+        logger.debug("StatusBarItem.value.setter: Setting value from %s to %s", self._value, new_value)
         if self._value != new_value:
             self._value = new_value
             self._update_label()
@@ -37,7 +37,7 @@ class StatusBarItem(ABC):
         """Update the label with the new value."""
         try:
             formatted_value = self.format_value(self._value)
-            logger.debug(f"StatusBarItem.update_label: Updating label with formatted value: {formatted_value}")
+            logger.debug("StatusBarItem.update_label: Updating label with formatted value: %s", formatted_value)
             self.label.setText(formatted_value)
         except Exception as e:
             logger.error(f"StatusBarItem.update_label: Error updating status bar label: {str(e)}")
@@ -60,7 +60,7 @@ class StatusBarItem(ABC):
         logger.debug("StatusBarItem.update: Starting update from camera")
         try:
             new_value = self.get_value_from_camera(camera_control)
-            logger.debug(f"StatusBarItem.update: Got new value from camera: {new_value}")
+            logger.debug("StatusBarItem.update: Got new value from camera: %s", new_value)
             if new_value is not None:
                 self.value = new_value
                 logger.debug("StatusBarItem.update: Successfully updated value")
@@ -73,4 +73,35 @@ class StatusBarItem(ABC):
     @abstractmethod
     def get_value_from_camera(self, camera_control) -> Any:
         """Get the value from the camera."""
-        pass 
\ No newline at end of file
+        pass
+
+class MeasuredStatusBarItem(StatusBarItem):
+    """
+    Base class for status bar items fed by measured in-memory statistics rather than camera queries.
+    These are refreshed on a timer by the StatusBarManager, so they must never talk to the camera.
+    """
+    
+    def get_value_from_camera(self, camera_control) -> Any:
+        """Measured items have nothing to read from the camera."""
+        return None
+        
+    def update_from_stats(self, stats: dict) -> bool:
+        """
+        Update the value from a dictionary of measured statistics.
+        
+        Returns:
+            bool: True if the value was updated, False otherwise
+        """
+        try:
+            new_value = self.get_value_from_stats(stats)
+            if new_value is not None:
+                self.value = new_value
+                return True
+        except Exception as e:
+            logger.error(f"MeasuredStatusBarItem.update_from_stats: Error updating status bar item: {str(e)}")
+        return False
+        
+    @abstractmethod
+    def get_value_from_stats(self, stats: dict) -> Any:
+        """Get the value from the measured statistics, or None if it is not available."""
+        pass
@@ -1,17 +1,24 @@
 """
 Manager for updating the status bar with camera information.
 """
-from PyQt6.QtCore import QObject
+from PyQt6.QtCore import QObject, QTimer
 from typing import Dict, Type
 import logging
 
-from .status_bar_item import StatusBarItem
+from .status_bar_item import StatusBarItem, MeasuredStatusBarItem
 from .items import (
     CameraModelItem,
     ROIDataItem,
     FramerateItem,
     ImageSizeItem,
-    StreamingBandwidthItem
+    StreamingBandwidthItem,
+    AcquisitionFpsItem,
+    DisplayFpsItem,
+    WriterRateItem,
+    QueueFillItem,
+    DroppedFramesItem,
+    FillEtaItem,
+    MemoryItem
 )
 
 logger = logging.getLogger(__name__)
@@ -25,15 +32,29 @@ class StatusBarManager(QObject):
         'roi_data': ROIDataItem,
         'framerate': FramerateItem,
         'image_size_on_disk': ImageSizeItem,
-        'streaming_bandwidth': StreamingBandwidthItem
+        'streaming_bandwidth': StreamingBandwidthItem,
+        'acquisition_fps': AcquisitionFpsItem,
+        'display_fps': DisplayFpsItem,
+        'writer_rate': WriterRateItem,
+        'queue_fill': QueueFillItem,
+        'frames_dropped': DroppedFramesItem,
+        'fill_eta': FillEtaItem,
+        'memory': MemoryItem
     }
     
+    # Refresh interval for measured items, these read in-memory stats only
+    MEASURED_UPDATE_INTERVAL_MS = 500
+    
     def __init__(self, window, camera_control):
         """Initialize the status bar manager."""
         super().__init__()
         self.window = window
         self.camera_control = camera_control
         self.items: Dict[str, StatusBarItem] = {}
+        self.stats_source = None
+        
+        self.update_timer = QTimer()
+        self.update_timer.timeout.connect(self.update_measured)
         
     def initialize_items(self):
         """Initialize all registered status bar items."""
@@ -57,10 +78,30 @@ class StatusBarManager(QObject):
                 
         logger.debug(f"Finished initializing items. Active items: {list(self.items.keys())}")  # Debug print
         
+    def set_stats_source(self, stats_source):
+        """Set the callable returning measured statistics and start refreshing the measured items."""
+        self.stats_source = stats_source
+        self.update_timer.start(self.MEASURED_UPDATE_INTERVAL_MS)
+        
     def update_all(self):
         """Update all status bar items."""
         for item_name, item in self.items.items():
-            item.update(self.camera_control)
+            if not isinstance(item, MeasuredStatusBarItem):
+                item.update(self.camera_control)
+        self.update_measured()
+            
+    def update_measured(self):
+        """Update the measured status bar items from the stats source, without any camera round trips."""
+        if self.stats_source is None:
+            return
+        try:
+            stats = self.stats_source()
+        except Exception as e:
+            logger.error(f"StatusBarManager: Error reading stats: {str(e)}")
+            return
+        for item in self.items.values():
+            if isinstance(item, MeasuredStatusBarItem):
+                item.update_from_stats(stats)
             
     def update_on_control_change(self, control_name: str):
         """Update status bar items based on which control changed."""
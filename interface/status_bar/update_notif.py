@@ -7,6 +7,8 @@ from PyQt6.QtCore import Qt, QMetaObject, Q_ARG
 from typing import Optional
 import logging
 
+from utils import add_notification_handler
+
 logger = logging.getLogger(__name__)
 
 # Global reference to the main window
@@ -22,6 +24,8 @@ def set_main_window(window):
     """
     global _main_window
     _main_window = window
+    # Messages from the acquisition core arrive through utils.notify
+    add_notification_handler(update_notif)
 
 def update_notif(message: str, duration: Optional[int] = None):
     """
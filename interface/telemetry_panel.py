@@ -0,0 +1,60 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView, QLabel
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+
+from utils import telemetry
+
+class TelemetryPanel(QWidget):
+    """Tool window listing the rolling latency percentiles of each pipeline stage."""
+
+    COLUMNS = [('Stage', None), ('Count', 'count'), ('p50 ms', 'p50_ms'), ('p95 ms', 'p95_ms'), ('p99 ms', 'p99_ms'), ('Max ms', 'max_ms')]
+
+    closed = pyqtSignal()
+
+    def __init__(self, telemetry_settings, parent=None):
+        super().__init__(parent, Qt.WindowType.Tool)
+        self.setWindowTitle("Pipeline Telemetry")
+        self.resize(520, 260)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"Latency per stage over the last {telemetry.window:g}-{2 * telemetry.window:g} s"))
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([label for label, key in self.COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        # Only refresh while the panel is visible
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(telemetry_settings['refresh_ms'])
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        summary = telemetry.summary(rolling=True)
+        self.table.setRowCount(len(summary))
+        for row, (stage, stats) in enumerate(sorted(summary.items())):
+            for column, (label, key) in enumerate(self.COLUMNS):
+                if key is None:
+                    text = stage
+                elif key == 'count':
+                    text = str(stats[key])
+                else:
+                    text = f"{stats[key]:.3f}"
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(text))
+                else:
+                    item.setText(text)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def closeEvent(self, event):
+        self.closed.emit()
+        super().closeEvent(event)
@@ -1,6 +1,8 @@
 from PyQt6.QtWidgets import QLabel
 from PyQt6.QtGui import QPainter
 
+from utils import tracer
+
 """ Captures mouse events in the image display and passes to UIMethods which in turn passes to DrawROI """
 class DispMouseHandler(QLabel):
 
@@ -10,6 +12,15 @@ class DispMouseHandler(QLabel):
         super().__init__(parent)
         self.setMouseTracking(True)
         self.ui_methods = None
+        self._frame_image = None
+        self._frame_offset = (0, 0)
+
+    def set_frame(self, image, offset_x, offset_y):
+        
+        """Set the rendered frame to blit on the next paint"""
+        self._frame_image = image
+        self._frame_offset = (offset_x, offset_y)
+        self.update()
 
     def mousePressEvent(self, event):
         
@@ -29,10 +40,25 @@ class DispMouseHandler(QLabel):
         if self.ui_methods:
             self.ui_methods.handle_mouse_release(event)
 
+    def wheelEvent(self, event):
+        
+        """Handle mouse wheel events"""
+        if self.ui_methods:
+            self.ui_methods.handle_wheel(event)
+
+    def resizeEvent(self, event):
+        
+        """Handle resize events"""
+        super().resizeEvent(event)
+        if self.ui_methods:
+            self.ui_methods.handle_resize(event.size())
+
     def paintEvent(self, event):
         """Handle paint events"""
-        super().paintEvent(event)
-        if self.ui_methods and self.ui_methods.draw_roi.current_rect:
+        with tracer.span('gui.paint', 'gui'):
             painter = QPainter(self)
-            self.ui_methods.handle_paint(painter)
+            if self._frame_image is not None:
+                painter.drawImage(self._frame_offset[0], self._frame_offset[1], self._frame_image)
+            if self.ui_methods:
+                self.ui_methods.handle_paint(painter)
             painter.end()
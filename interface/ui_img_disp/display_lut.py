@@ -0,0 +1,119 @@
+"""
+Lookup table display transform for live view: contrast stretch, gamma and false colour.
+Tables are rebuilt only when their parameters change and applied to each frame with a single np.take.
+"""
+import numpy as np
+import pyqtgraph as pg
+from PyQt6.QtGui import QImage
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DisplayLUT:
+    """
+    Maps raw 8- or 16-bit pixel values to display pixels.
+
+    Stretch modes:
+        'none'       - the full bit depth maps onto 0-255
+        'minmax'     - the darkest and brightest pixel of the last histogram map onto 0-255
+        'percentile' - the given low/high percentiles of the last histogram map onto 0-255
+
+    Grey output is one uint8 per pixel (Format_Grayscale8), false colour output is one uint32 per pixel
+    (Format_RGB32), so either way the frame is transformed by a single np.take into the display buffer.
+    """
+
+    STRETCH_MODES = ('none', 'minmax', 'percentile')
+
+    def __init__(self, stretch='none', gamma=1.0, colormap='gray', percentile=(0.5, 99.5)):
+        self.stretch = stretch
+        self.gamma = gamma
+        self.colormap = colormap
+        self.percentile = percentile
+        self.levels = None
+        self.table = None
+        self.is_identity = True
+        self._built_colormap = 'gray'
+        self._key = None
+
+    def set_params(self, stretch=None, gamma=None, colormap=None, percentile=None):
+        """Change display parameters, the table is rebuilt on the next prepare()."""
+        if stretch is not None:
+            if stretch not in self.STRETCH_MODES:
+                logger.error(f"Unknown stretch mode '{stretch}'")
+                return
+            self.stretch = stretch
+        if gamma is not None:
+            self.gamma = max(float(gamma), 0.01)
+        if colormap is not None:
+            self.colormap = colormap
+        if percentile is not None:
+            self.percentile = percentile
+
+    # Output type follows the table that was actually built, not a colormap change still pending
+    @property
+    def dtype(self):
+        return np.uint8 if self._built_colormap == 'gray' else np.uint32
+
+    @property
+    def image_format(self):
+        return QImage.Format.Format_Grayscale8 if self._built_colormap == 'gray' else QImage.Format.Format_RGB32
+
+    def prepare(self, bit_depth, histogram_engine=None):
+        """Update the levels from the latest histogram and rebuild the table if anything changed."""
+        levels = 1 << bit_depth
+        low, high = 0, levels - 1
+        if histogram_engine is not None and histogram_engine.stats and histogram_engine.stats['bit_depth'] == bit_depth:
+            if self.stretch == 'minmax':
+                low, high = histogram_engine.stats['min'], histogram_engine.stats['max']
+            elif self.stretch == 'percentile':
+                low, high = histogram_engine.percentile_levels(*self.percentile)
+        if high <= low:
+            high = low + 1
+        self.levels = (low, high)
+
+        # Read the parameters once, the GUI thread may change them while the table is being built
+        gamma, colormap = self.gamma, self.colormap
+        key = (levels, low, high, gamma, colormap)
+        if key != self._key:
+            self._build(levels, low, high, gamma, colormap)
+            self._key = key
+
+    def _build(self, levels, low, high, gamma, colormap):
+        gray = self._build_gray(levels, low, high, gamma)
+        self.is_identity = levels == 256 and colormap == 'gray' and low == 0 and high == 255 and gamma == 1.0
+        if colormap == 'gray':
+            self.table = gray
+        else:
+            self.table = np.take(self._colormap_table(colormap), gray)
+        self._built_colormap = colormap
+        logger.debug(f"Rebuilt display LUT: levels={levels}, window=({low}, {high}), gamma={gamma}, colormap={colormap}")
+
+    @staticmethod
+    def _build_gray(levels, low, high, gamma):
+        values = np.arange(levels, dtype=np.int64)
+        if gamma == 1.0:
+            # Fixed point linear stretch, scale held as a 16.16 integer and the result rounded to nearest
+            scale = (255 << 16) // (high - low)
+            return np.clip(((values - low) * scale + (1 << 15)) >> 16, 0, 255).astype(np.uint8)
+        normalised = np.clip((values - low) / (high - low), 0.0, 1.0)
+        return np.round(255.0 * normalised ** (1.0 / gamma)).astype(np.uint8)
+
+    @staticmethod
+    def _colormap_table(name):
+        """256 entry table of 0xFFRRGGBB values for a pyqtgraph colormap."""
+        try:
+            rgb = pg.colormap.get(name).getLookupTable(nPts=256, mode=pg.ColorMap.BYTE)[:, :3].astype(np.uint32)
+        except Exception as e:
+            logger.error(f"Failed to load colormap '{name}': {str(e)}")
+            rgb = np.repeat(np.arange(256, dtype=np.uint32)[:, None], 3, axis=1)
+        return 0xFF000000 | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+    def apply(self, frame, out=None):
+        """Transform a frame into display pixels, writing into `out` if given."""
+        if self.is_identity and frame.dtype == np.uint8:
+            if out is None:
+                return frame
+            np.copyto(out, frame)
+            return out
+        # Values above the detected bit depth are clipped onto the last table entry
+        return np.take(self.table, frame, out=out, mode='clip')
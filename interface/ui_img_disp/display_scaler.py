@@ -0,0 +1,129 @@
+"""
+Reduces camera frames to roughly the size of the image container in numpy before any Qt work.
+Only the small result is passed through the display LUT and wrapped as a QImage; a smooth mode keeps
+the old full resolution Qt rescale.
+"""
+import numpy as np
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import Qt
+import logging
+
+from .display_lut import DisplayLUT
+from .viewport import compute_view
+from acquisitions.frame_reduction import bin_frame
+
+logger = logging.getLogger(__name__)
+
+class DisplayScaler:
+    """
+    Produces a container sized QImage from a numpy frame.
+
+    In fast mode the frame is binned by the largest integer factor that keeps it at least as large as
+    the target and then nearest-neighbour sampled to the exact target size. The display LUT writes the
+    result into a cached buffer whose QImage wrapper is only rebuilt when the target size or output
+    format changes.
+    In smooth mode the full frame goes through the LUT and is rescaled by Qt with SmoothTransformation.
+    """
+
+    def __init__(self, bin_mode='area'):
+        self.smooth = False
+        self.bin_mode = bin_mode
+        self.lut = DisplayLUT()
+        self._buffer = None
+        self._qimage = None
+        self._sample_key = None
+        self._sample_rows = None
+        self._sample_cols = None
+
+    def set_smooth(self, smooth):
+        self.smooth = bool(smooth)
+        logger.debug(f"Smooth display scaling {'enabled' if self.smooth else 'disabled'}")
+
+    def render(self, frame, container_width, container_height, zoom=1.0, center=None):
+        """
+        Scale the visible part of a frame for display.
+
+        The frame is cropped to the zoomed viewport first, so the cost follows the visible pixels rather
+        than the sensor size. When zoomed in past 1:1 the nearest-neighbour path is always used.
+
+        Returns:
+            tuple: (QImage, geometry) where geometry is a dict with the scale factors, offsets, view origin
+            and sizes needed to map between container and image coordinates, or (None, None) if the
+            container has no area.
+        """
+        height, width = frame.shape[:2]
+        view = compute_view(width, height, container_width, container_height, zoom, center)
+        if view is None:
+            return None, None
+        x0, y0, x1, y1 = view['crop']
+        visible = frame[y0:y1, x0:x1]
+        target_width, target_height = view['target_width'], view['target_height']
+
+        if self.smooth and (zoom == 1.0 or target_width < visible.shape[1]):
+            qimage = self._render_smooth(visible, target_width, target_height)
+        else:
+            qimage = self._render_fast(visible, target_width, target_height)
+
+        geometry = {
+            'scale_factor_x': target_width / visible.shape[1],
+            'scale_factor_y': target_height / visible.shape[0],
+            'offset_x': view['offset_x'],
+            'offset_y': view['offset_y'],
+            'scaled_width': target_width,
+            'scaled_height': target_height,
+            'original_width': width,
+            'original_height': height,
+            'view_x': x0,
+            'view_y': y0,
+            'crop_width': visible.shape[1],
+            'crop_height': visible.shape[0],
+            'container_width': container_width,
+            'container_height': container_height
+        }
+        return qimage, geometry
+
+    def _render_smooth(self, frame, target_width, target_height):
+        display = np.ascontiguousarray(self.lut.apply(frame))
+        height, width = display.shape
+        image = QImage(display.data, width, height, display.strides[0], self.lut.image_format)
+        # scaled() returns a new image so the temporary numpy buffer can be released afterwards
+        return image.scaled(target_width, target_height, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+    def _render_fast(self, frame, target_width, target_height):
+        height, width = frame.shape
+        factor = max(1, min(width // target_width, height // target_height))
+        # 'stride' keeps every factor-th pixel (a view, no copy), 'area' averages factor x factor blocks
+        if self.bin_mode == 'stride':
+            reduced = frame[::factor, ::factor]
+        else:
+            reduced = bin_frame(frame, factor, 'mean')
+
+        if reduced.shape != (target_height, target_width):
+            # Integer factors skip this, the binned frame is already the display size
+            rows, cols = self._get_sample_indices(reduced.shape, target_width, target_height)
+            reduced = np.take(np.take(reduced, rows, axis=0), cols, axis=1)
+
+        self.lut.apply(reduced, out=self._get_buffer(target_width, target_height))
+        return self._qimage
+
+    def _get_buffer(self, target_width, target_height):
+        """Return the cached display buffer, reallocating it and its QImage only on size or format change."""
+        dtype = self.lut.dtype
+        if self._buffer is None or self._buffer.shape != (target_height, target_width) or self._buffer.dtype != dtype:
+            self._buffer = np.empty((target_height, target_width), dtype=dtype)
+            self._qimage = QImage(self._buffer.data, target_width, target_height, self._buffer.strides[0], self.lut.image_format)
+        return self._buffer
+
+    def get_buffer_bytes(self):
+        """Bytes held by the cached display buffer."""
+        buffer = self._buffer
+        return buffer.nbytes if buffer is not None else 0
+
+    def _get_sample_indices(self, shape, target_width, target_height):
+        """Nearest-neighbour row/column indices mapping the reduced frame onto the target size."""
+        key = (shape, target_width, target_height)
+        if self._sample_key != key:
+            self._sample_rows = (np.arange(target_height) * shape[0]) // target_height
+            self._sample_cols = (np.arange(target_width) * shape[1]) // target_width
+            self._sample_key = key
+        return self._sample_rows, self._sample_cols
@@ -15,10 +15,18 @@ class DrawROI:
         self.scaled_height = 0
         self.original_width = 0
         self.original_height = 0
+        # Image coordinates of the top left visible pixel when zoomed in
+        self.view_x = 0
+        self.view_y = 0
+        
+        # Named regions kept for multi-region recording, {name: QRect} in image coordinates
+        self.saved_rois = {}
         
         # Create the pen
         self.pen = QPen(QColor(0, 255, 0))
         self.pen.setWidth(1)
+        self.saved_pen = QPen(QColor(255, 140, 0))
+        self.saved_pen.setWidth(1)
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -60,33 +68,58 @@ class DrawROI:
         adjusted_x = max(0, min(adjusted_x, self.scaled_width))
         adjusted_y = max(0, min(adjusted_y, self.scaled_height))
             
-        # Map the position to the image coordinates using the scale factors
-        image_x = int(adjusted_x / self.scale_factor_x)
-        image_y = int(adjusted_y / self.scale_factor_y)
+        # Map the position to the image coordinates using the scale factors and the visible origin
+        image_x = self.view_x + int(adjusted_x / self.scale_factor_x)
+        image_y = self.view_y + int(adjusted_y / self.scale_factor_y)
 
         return image_x, image_y
 
+    def add_saved_roi(self):
+        """Keep the current rectangle as the next named recording region, returns its name or None."""
+        if not self.current_rect or self.current_rect.width() < 1 or self.current_rect.height() < 1:
+            return None
+        index = len(self.saved_rois) + 1
+        while f"roi{index}" in self.saved_rois:
+            index += 1
+        name = f"roi{index}"
+        self.saved_rois[name] = QRect(self.current_rect)
+        self.current_rect = None
+        return name
+
+    def clear_saved_rois(self):
+        self.saved_rois = {}
+
+    def get_saved_rois(self):
+        """Saved regions as {name: (x, y, width, height)}."""
+        return {name: (rect.x(), rect.y(), rect.width(), rect.height()) for name, rect in self.saved_rois.items()}
+
+    def _to_widget_rect(self, rect):
+        top_left = rect.topLeft()
+        bottom_right = rect.bottomRight()
+        
+        # Apply scaling and offset and convert to integers
+        widget_x1 = int((top_left.x() - self.view_x) * self.scale_factor_x + self.offset_x)
+        widget_y1 = int((top_left.y() - self.view_y) * self.scale_factor_y + self.offset_y)
+        widget_x2 = int((bottom_right.x() - self.view_x) * self.scale_factor_x + self.offset_x)
+        widget_y2 = int((bottom_right.y() - self.view_y) * self.scale_factor_y + self.offset_y)
+        return widget_x1, widget_y1, widget_x2 - widget_x1, widget_y2 - widget_y1
+
     def draw_rectangle(self, painter):
-        """Draw the current rectangle on the image"""
+        """Draw the saved regions with their names, then the current rectangle on the image"""
+        if self.saved_rois:
+            painter.setPen(self.saved_pen)
+            for name, rect in self.saved_rois.items():
+                x, y, width, height = self._to_widget_rect(rect)
+                painter.drawRect(x, y, width, height)
+                painter.drawText(x + 3, y + 12, name)
+        
         if self.current_rect:
             painter.setPen(self.pen)
             
-            # Get coordinates from QPoint objects
-            top_left = self.current_rect.topLeft()
-            bottom_right = self.current_rect.bottomRight()
-            
-            # Apply scaling and offset and convert to integers
-            widget_x1 = int(top_left.x() * self.scale_factor_x + self.offset_x)
-            widget_y1 = int(top_left.y() * self.scale_factor_y + self.offset_y)
-            widget_x2 = int(bottom_right.x() * self.scale_factor_x + self.offset_x)
-            widget_y2 = int(bottom_right.y() * self.scale_factor_y + self.offset_y)
-            
             # Draw the rectangle
-            painter.drawRect(widget_x1, widget_y1, 
-                           widget_x2 - widget_x1, 
-                           widget_y2 - widget_y1)
+            painter.drawRect(*self._to_widget_rect(self.current_rect))
 
-    def update_scale_and_offset(self, scale_factor_x, scale_factor_y, offset_x, offset_y, scaled_width, scaled_height, original_width, original_height):
+    def update_scale_and_offset(self, scale_factor_x, scale_factor_y, offset_x, offset_y, scaled_width, scaled_height, original_width, original_height, view_x=0, view_y=0):
         self.scale_factor_x = scale_factor_x
         self.scale_factor_y = scale_factor_y
         self.offset_x = offset_x
@@ -94,4 +127,6 @@ class DrawROI:
         self.scaled_width = scaled_width
         self.scaled_height = scaled_height
         self.original_width = original_width
-        self.original_height = original_height 
\ No newline at end of file
+        self.original_height = original_height
+        self.view_x = view_x
+        self.view_y = view_y
\ No newline at end of file
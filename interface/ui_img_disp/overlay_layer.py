@@ -0,0 +1,134 @@
+"""
+Cached overlay layer drawn on top of the live frame: ROI rectangles, crosshair, scale bar and measurements.
+The layer is only re-rendered when an overlay or the display geometry changes, so the per-frame cost is one pixmap blit.
+"""
+import math
+import logging
+from PyQt6.QtGui import QPixmap, QPainter, QPen, QColor, QFont
+from PyQt6.QtCore import Qt, QPointF
+
+logger = logging.getLogger(__name__)
+
+# Geometry entries that move overlays when they change
+GEOMETRY_KEYS = ('scale_factor_x', 'scale_factor_y', 'offset_x', 'offset_y', 'scaled_width', 'scaled_height', 'view_x', 'view_y')
+
+class OverlayLayer:
+
+    def __init__(self, draw_roi, overlay_settings):
+        self.draw_roi = draw_roi
+        self.pixel_size_um = overlay_settings.get('pixel_size_um')
+        self.show_scale_bar = overlay_settings.get('scale_bar', True) and bool(self.pixel_size_um)
+        self.show_crosshair = overlay_settings.get('crosshair', False)
+        self.measurements = []
+        self.geometry = None
+
+        self._pixmap = None
+        self._dirty = True
+
+        self.crosshair_pen = QPen(QColor(overlay_settings.get('crosshair_color', '#FFFF00')))
+        self.crosshair_pen.setWidth(1)
+        self.crosshair_pen.setStyle(Qt.PenStyle.DashLine)
+        self.annotation_pen = QPen(QColor(overlay_settings.get('annotation_color', '#FFFFFF')))
+        self.annotation_pen.setWidth(2)
+        self.font = QFont()
+        self.font.setPointSize(9)
+
+    def invalidate(self):
+        """Mark the layer for re-rendering on the next paint."""
+        self._dirty = True
+
+    def set_geometry(self, geometry):
+        """Take the geometry of the latest frame, invalidating only if overlays would move."""
+        if self.geometry is None or any(self.geometry[key] != geometry[key] for key in GEOMETRY_KEYS):
+            self._dirty = True
+        self.geometry = geometry
+
+    def set_crosshair(self, visible):
+        self.show_crosshair = bool(visible)
+        self.invalidate()
+
+    def add_measurement(self, start, end):
+        """Add a measurement line between two (x, y) points in image coordinates."""
+        self.measurements.append((start, end))
+        self.invalidate()
+
+    def clear_measurements(self):
+        self.measurements = []
+        self.invalidate()
+
+    def pixmap(self, size):
+        """Return the overlay pixmap for a container of `size`, re-rendering only if something changed."""
+        if self._pixmap is None or self._pixmap.size() != size:
+            self._pixmap = QPixmap(size)
+            self._dirty = True
+        if self._dirty:
+            self._render()
+            self._dirty = False
+        return self._pixmap
+
+    def _render(self):
+        self._pixmap.fill(Qt.GlobalColor.transparent)
+        if self.geometry is None:
+            return
+        painter = QPainter(self._pixmap)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setFont(self.font)
+        try:
+            self.draw_roi.draw_rectangle(painter)
+            if self.show_crosshair:
+                self._draw_crosshair(painter)
+            for start, end in self.measurements:
+                self._draw_measurement(painter, start, end)
+            if self.show_scale_bar:
+                self._draw_scale_bar(painter)
+        except Exception as e:
+            logger.error(f"Error rendering overlay: {str(e)}")
+        finally:
+            painter.end()
+
+    def _to_widget(self, x, y):
+        """Map image coordinates to container coordinates."""
+        geometry = self.geometry
+        return QPointF((x - geometry['view_x']) * geometry['scale_factor_x'] + geometry['offset_x'],
+                       (y - geometry['view_y']) * geometry['scale_factor_y'] + geometry['offset_y'])
+
+    def _draw_crosshair(self, painter):
+        """Crosshair through the centre of the full frame, so it marks the optical axis even when zoomed."""
+        geometry = self.geometry
+        center = self._to_widget(geometry['original_width'] / 2, geometry['original_height'] / 2)
+        left, top = geometry['offset_x'], geometry['offset_y']
+        right, bottom = left + geometry['scaled_width'], top + geometry['scaled_height']
+        painter.setPen(self.crosshair_pen)
+        if left <= center.x() <= right:
+            painter.drawLine(QPointF(center.x(), top), QPointF(center.x(), bottom))
+        if top <= center.y() <= bottom:
+            painter.drawLine(QPointF(left, center.y()), QPointF(right, center.y()))
+
+    def _draw_measurement(self, painter, start, end):
+        start_point = self._to_widget(*start)
+        end_point = self._to_widget(*end)
+        painter.setPen(self.annotation_pen)
+        painter.drawLine(start_point, end_point)
+
+        length_px = math.hypot(end[0] - start[0], end[1] - start[1])
+        label = f"{length_px:.1f} px"
+        if self.pixel_size_um:
+            label += f" / {length_px * self.pixel_size_um:.1f} µm"
+        painter.drawText(end_point + QPointF(4, -4), label)
+
+    def _draw_scale_bar(self, painter):
+        """Scale bar of a round length close to a fifth of the visible width, bottom right of the image."""
+        geometry = self.geometry
+        visible_um = geometry['scaled_width'] / geometry['scale_factor_x'] * self.pixel_size_um
+        target_um = visible_um / 5
+        magnitude = 10 ** math.floor(math.log10(target_um))
+        length_um = max(step * magnitude for step in (1, 2, 5) if step * magnitude <= target_um)
+        length_widget = length_um / self.pixel_size_um * geometry['scale_factor_x']
+
+        margin = 12
+        right = geometry['offset_x'] + geometry['scaled_width'] - margin
+        bottom = geometry['offset_y'] + geometry['scaled_height'] - margin
+        painter.setPen(self.annotation_pen)
+        painter.drawLine(QPointF(right - length_widget, bottom), QPointF(right, bottom))
+        label = f"{length_um:g} µm" if length_um < 1000 else f"{length_um / 1000:g} mm"
+        painter.drawText(QPointF(right - length_widget, bottom - 6), label)
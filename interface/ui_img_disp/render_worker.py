@@ -0,0 +1,159 @@
+import threading, time, logging
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from .display_scaler import DisplayScaler
+from utils.img_hist_disp import HistogramEngine
+from utils import telemetry, tracer
+
+logger = logging.getLogger(__name__)
+
+class DisplayRenderQThread(QThread):
+    """
+    Prepares frames for display off the GUI thread.
+
+    Frames are submitted into a single latest-frame slot, so a frame that has not been picked up yet is
+    simply replaced by a newer one rather than queued. The worker scales the frame, computes the histogram
+    and emits a finished QImage so the GUI thread only has to blit it.
+    """
+
+    rendered_img_qtSignal = pyqtSignal(object, object, object) # Signal to emit with (QImage, geometry, histogram or None) when a frame is ready
+
+    def __init__(self, max_fps=30, histogram_fps=10, histogram_subsample=1):
+        super().__init__()
+        self.setObjectName("DisplayRenderThread")
+        self.display_scaler = DisplayScaler()
+        self.histogram_engine = HistogramEngine(subsample=histogram_subsample, refresh_interval=1.0 / histogram_fps)
+        self.render_is_running = True
+        self.frames_submitted = 0
+        self.frames_rendered = 0
+
+        # Latest-frame slot, guarded by the condition's lock
+        self._condition = threading.Condition()
+        self._pending_frame = None
+        self._last_frame = None
+        self._target_size = (0, 0)
+        self._view = (1.0, None)
+        self._frame_transform = None  # Applied to each frame before it is displayed, e.g. the calibration
+        self._transform_failed = False
+
+        # Display refresh cap, frames arriving faster than this just replace the pending frame
+        self.min_render_interval = 1.0 / max_fps
+        self._next_render_time = 0.0
+
+    # run() is a special method in QThread. It is automatically called when QThread is started using the start()
+    def run(self):
+        # Register the Qt thread with Python under its object name, so logs and the profiler can find it
+        threading.current_thread().name = self.objectName()
+        while self.render_is_running:
+            with self._condition:
+                while self.render_is_running:
+                    if self._pending_frame is None:
+                        self._condition.wait(timeout=0.1)
+                        continue
+                    delay = self._next_render_time - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(timeout=delay)
+                frame = self._pending_frame
+                self._pending_frame = None
+                target_width, target_height = self._target_size
+                zoom, center = self._view
+                self._next_render_time = time.monotonic() + self.min_render_interval
+
+            if frame is None:
+                continue
+
+            try:
+                with telemetry.measure('display_render'), tracer.span('display.render', 'display'):
+                    self._render(frame, target_width, target_height, zoom, center)
+            except Exception as e:
+                logger.error(f"Error rendering frame: {str(e)}")
+
+    def _render(self, frame, target_width, target_height, zoom, center):
+        transform = self._frame_transform
+        if transform is not None:
+            try:
+                frame = transform(frame)
+            except ValueError as e:
+                # E.g. the calibration no longer matches after an ROI change, show the raw frames meanwhile
+                if not self._transform_failed:
+                    logger.warning(f"Showing uncorrected frames: {str(e)}")
+                    self._transform_failed = True
+        # The histogram refreshes at its own, lower rate. It also feeds the auto contrast levels
+        histogram = None
+        if self.histogram_engine.is_due():
+            x, hist = self.histogram_engine.compute(frame)
+            histogram = (x, hist, self.histogram_engine.stats)
+        self.display_scaler.lut.prepare(self.histogram_engine.bit_depth, self.histogram_engine)
+
+        scaled_image, geometry = self.display_scaler.render(frame, target_width, target_height, zoom, center)
+        if scaled_image is None:
+            return
+        # The scaler reuses its buffer, so hand the GUI thread an image it owns
+        scaled_image = scaled_image.copy()
+        self.frames_rendered += 1
+        self.rendered_img_qtSignal.emit(scaled_image, geometry, histogram)
+
+    def submit_frame(self, frame):
+        """Place a frame in the slot, dropping any frame that has not been rendered yet."""
+        with self._condition:
+            self._pending_frame = frame
+            self._last_frame = frame
+            self.frames_submitted += 1
+            self._condition.notify()
+
+    def get_buffer_bytes(self):
+        """Bytes held by the frame slot and the display buffer, a frame in both slots is counted once."""
+        with self._condition:
+            frames = {id(frame): frame.nbytes for frame in (self._pending_frame, self._last_frame) if frame is not None}
+        return sum(frames.values()) + self.display_scaler.get_buffer_bytes()
+
+    def set_max_fps(self, max_fps):
+        """Cap how often frames are rendered, independently of the camera frame rate."""
+        self.min_render_interval = 1.0 / max_fps
+
+    def set_display_lut(self, **params):
+        """Change stretch, gamma or colormap of the display LUT and re-render the last frame."""
+        self.display_scaler.lut.set_params(**params)
+        with self._condition:
+            self._rerender_last_frame()
+
+    def set_frame_transform(self, transform):
+        """Apply `transform(frame)` to every frame before display, None shows the frames as they are."""
+        with self._condition:
+            self._frame_transform = transform
+            self._transform_failed = False
+            self._rerender_last_frame()
+
+    def set_histogram_roi(self, roi):
+        """Restrict the histogram to (x, y, width, height) in image coordinates, or None for the full frame."""
+        self.histogram_engine.set_roi(roi)
+
+    def set_target_size(self, width, height):
+        """Set the container size and re-render the last frame so the view follows resizes."""
+        with self._condition:
+            self._target_size = (width, height)
+            self._rerender_last_frame()
+
+    def set_view(self, zoom, center):
+        """Set the zoom and pan state and re-render the last frame."""
+        with self._condition:
+            self._view = (zoom, center)
+            self._rerender_last_frame()
+
+    def set_smooth(self, smooth):
+        self.display_scaler.set_smooth(smooth)
+        with self._condition:
+            self._rerender_last_frame()
+
+    def _rerender_last_frame(self):
+        """Queue the last frame again after a display setting changed. Caller must hold the condition."""
+        if self._pending_frame is None and self._last_frame is not None:
+            self._pending_frame = self._last_frame
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self.render_is_running = False
+            self._condition.notify()
+        self.wait()
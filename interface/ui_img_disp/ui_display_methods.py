@@ -1,15 +1,21 @@
-from PyQt6.QtGui import QImage, QPixmap, QPainter
 from PyQt6.QtCore import Qt
 from .draw_roi import DrawROI
+from .render_worker import DisplayRenderQThread
+from .viewport import DisplayViewport
+from .overlay_layer import OverlayLayer
 from interface.status_bar.update_notif import update_notif
 import logging, time
 from interface.camera_controls.control_manager import CameraControlManager
+from utils import RateMeter
 
 
 logger = logging.getLogger(__name__)
 
 class UIDisplayMethods:
     
+    # Zoom factor per mouse wheel notch
+    ZOOM_STEP = 1.25
+    
     def __init__(self, window, image_container, stream_camera, camera_control, status_bar_manager):
         self.window = window
         self.image_container = image_container
@@ -17,64 +23,110 @@ class UIDisplayMethods:
         self.camera_control = camera_control
         self.draw_roi = DrawROI()
         self.original_image_size = None
-        self._last_container_size = None
-        self._cached_image_shape = None
+        
+        # Frames are scaled off the GUI thread, the finished image comes back through a queued signal
+        display_settings = window.ui_scaffolding['display']
+        self.render_worker = DisplayRenderQThread(
+            max_fps=display_settings['max_fps'],
+            histogram_fps=display_settings['histogram_fps'],
+            histogram_subsample=display_settings['histogram_subsample']
+        )
+        self.histogram_roi_only = display_settings['histogram_roi_only']
+        # Corrections applied to displayed frames, in this order
+        self.frame_corrections = {'calibration': None, 'background': None}
+        self.viewport = DisplayViewport()
+        self.display_geometry = None
+        self._pan_last_pos = None
+        
+        # ROI, crosshair, scale bar and measurements live in a cached layer over the frame
+        self.overlay = OverlayLayer(self.draw_roi, window.ui_scaffolding['overlay'])
+        self._measure_start = None
+        self.histogram_stats = {}
+        self.render_worker.rendered_img_qtSignal.connect(self._handle_rendered_frame)
+        self.render_worker.set_target_size(image_container.width(), image_container.height())
+        self.render_worker.start()
+        self.display_rate = RateMeter()
+        
+        # Display refreshes are driven by frame arrival on the camera thread, no polling timer
+        self.stream_camera.set_display_rate(display_settings['max_fps'])
+        self.stream_camera.add_frame_listener(self.render_worker.submit_frame)
         self.status_bar_manager = status_bar_manager
     
-    def update_img_display(self):
+    def _handle_rendered_frame(self, scaled_image, geometry, histogram):
+
+        # Update the ROI drawing parameters
+        self.display_geometry = geometry
+        self.overlay.set_geometry(geometry)
+        self.draw_roi.update_scale_and_offset(
+            geometry['scale_factor_x'], geometry['scale_factor_y'],
+            geometry['offset_x'], geometry['offset_y'],
+            geometry['scaled_width'], geometry['scaled_height'],
+            geometry['original_width'], geometry['original_height'],
+            geometry['view_x'], geometry['view_y']
+        )
+        self.original_image_size = (geometry['original_width'], geometry['original_height'])
+        self.display_rate.tick()
 
-        np_image_data = self.stream_camera.get_img_from_queue()
-        if np_image_data is None:
+        # The container blits the image and draws the ROI on top in its paintEvent
+        self.image_container.set_frame(scaled_image, geometry['offset_x'], geometry['offset_y'])
+
+        if histogram is not None:
+            x, hist, self.histogram_stats = histogram
+            self.window.histogram_plot.draw(x, hist)
+
+    def _update_histogram_roi(self):
+        """Follow the drawn ROI with the histogram when histogram_roi_only is set."""
+        if not self.histogram_roi_only:
             return
-        
-        # Cache the container size and check if it's changed
-        current_size = self.window.image_container.size()
-        size_changed = not hasattr(self, '_last_container_size') or self._last_container_size != current_size
-        self._last_container_size = current_size
-
-        # Only recalculate scaling if the image size or container has changed
-        if not hasattr(self, '_cached_image') or size_changed or self._cached_image_shape != np_image_data.shape:
-            self._cached_image_shape = np_image_data.shape
-            # Do the expensive scaling calculations here
-            height, width = np_image_data.shape
-            bytes_per_line = width
-            image_data = QImage(np_image_data.data, width, height, bytes_per_line, QImage.Format.Format_Grayscale8)
-            image = QPixmap(image_data)
-
-            container_size = self.window.image_container.size()
-
-            scaled_image = image.scaled(container_size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-
-            offset_x = (container_size.width() - scaled_image.width()) // 2
-            offset_y = (container_size.height() - scaled_image.height()) // 2
-            
-            scale_factor_x = scaled_image.width() / width
-            scale_factor_y = scaled_image.height() / height
-            
-            # Update the ROI drawing parameters
-            self.draw_roi.update_scale_and_offset(
-                scale_factor_x, scale_factor_y, 
-                offset_x, offset_y,
-                scaled_image.width(), scaled_image.height(),
-                width, height
-            )
-            
-            # Create a new pixmap for drawing ROIs
-            final_image = QPixmap(container_size)
-            final_image.fill(Qt.GlobalColor.transparent)
-            
-            # Draw the scaled image
-            painter = QPainter(final_image)
-            painter.drawPixmap(offset_x, offset_y, scaled_image)
-            
-            # Draw the ROI if any
-            self.draw_roi.draw_rectangle(painter)
-            painter.end()
-            
-            self.window.image_container.setPixmap(final_image)
-            self.original_image_size = (width, height)
+        rect = self.draw_roi.current_rect
+        if rect is not None and rect.width() > 0 and rect.height() > 0:
+            self.render_worker.set_histogram_roi((rect.x(), rect.y(), rect.width(), rect.height()))
+        else:
+            self.render_worker.set_histogram_roi(None)
+
+    def handle_resize(self, size):
+        self.render_worker.set_target_size(size.width(), size.height())
+
+    def get_display_stats(self):
+        """Measured display statistics, read from in-memory counters only."""
+        return {
+            'display_fps': self.display_rate.rate(),
+            'saturated_pixels': self.histogram_stats.get('saturated', 0),
+            'saturated_fraction': self.histogram_stats.get('saturated_fraction', 0.0)
+        }
+
+    def get_buffer_bytes(self):
+        """Bytes held for the live view, for the memory monitor."""
+        return self.render_worker.get_buffer_bytes()
+
+    def set_smooth_display(self, smooth):
+        """Switch between the fast decimated view and the full smooth rescale."""
+        self.render_worker.set_smooth(smooth)
 
-            self.window.histogram_plot.update(np_image_data)
+    def set_frame_correction(self, name, correct):
+        """Apply `correct(frame)` to displayed frames as the 'calibration' or 'background' step, None removes it."""
+        self.frame_corrections[name] = correct
+        steps = [step for step in self.frame_corrections.values() if step is not None]
+        if not steps:
+            self.render_worker.set_frame_transform(None)
+            return
+
+        def transform(frame):
+            for step in steps:
+                frame = step(frame)
+            return frame
+        self.render_worker.set_frame_transform(transform)
+
+    def handle_display_lut_change(self, *args):
+        """Push the contrast, gamma and colormap controls to the render thread's display LUT."""
+        self.render_worker.set_display_lut(
+            stretch=self.window.display_stretch.currentData(),
+            gamma=self.window.display_gamma.value(),
+            colormap=self.window.display_colormap.currentText()
+        )
+
+    def cleanup(self):
+        self.render_worker.stop()
 
     def handle_apply_roi(self):
 
@@ -117,6 +169,8 @@ class UIDisplayMethods:
             
             """Clear the  rectangle"""
             self.draw_roi.current_rect = None
+            self.overlay.invalidate()
+            self._update_histogram_roi()
         else:
             update_notif("No ROI Selected", duration=2000)
     
@@ -151,6 +205,8 @@ class UIDisplayMethods:
             
             """Clear the current rectangle"""
             self.draw_roi.current_rect = None
+            self.overlay.invalidate()
+            self._update_histogram_roi()
             self.window.image_container.update()
             
             """Update status bar"""
@@ -162,13 +218,85 @@ class UIDisplayMethods:
     
     
     def handle_mouse_press(self, event):
+        # Right or middle button drags the zoomed view, shift + left measures, left button draws the ROI
+        if event.button() in (Qt.MouseButton.RightButton, Qt.MouseButton.MiddleButton):
+            self._pan_last_pos = event.position()
+            return
+        if event.button() == Qt.MouseButton.LeftButton and event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+            self._measure_start = self.draw_roi.map_to_image_coordinates(event.position())
+            return
         self.draw_roi.mousePressEvent(event)
+        self.overlay.invalidate()
 
     def handle_mouse_move(self, event):
+        if self._pan_last_pos is not None:
+            pos = event.position()
+            delta_x = pos.x() - self._pan_last_pos.x()
+            delta_y = pos.y() - self._pan_last_pos.y()
+            self._pan_last_pos = pos
+            if self.viewport.pan(delta_x, delta_y, self.display_geometry):
+                self.render_worker.set_view(*self.viewport.state())
+            return
+        if self._measure_start is not None:
+            return
+        if self.draw_roi.drawing:
+            self.overlay.invalidate()
         self.draw_roi.mouseMoveEvent(event, self.image_container)
 
     def handle_mouse_release(self, event):
+        if event.button() in (Qt.MouseButton.RightButton, Qt.MouseButton.MiddleButton):
+            self._pan_last_pos = None
+            return
+        if self._measure_start is not None:
+            end = self.draw_roi.map_to_image_coordinates(event.position())
+            if end != self._measure_start:
+                self.overlay.add_measurement(self._measure_start, end)
+                self.image_container.update()
+            self._measure_start = None
+            return
+        self.overlay.invalidate()
         self.draw_roi.mouseReleaseEvent(event, self.image_container)
+        self._update_histogram_roi()
+
+    def handle_wheel(self, event):
+        """Zoom the live view about the cursor, one wheel notch is a factor of ZOOM_STEP."""
+        notches = event.angleDelta().y() / 120
+        if notches == 0:
+            return
+        pos = event.position()
+        if self.viewport.zoom_at(self.ZOOM_STEP ** notches, pos.x(), pos.y(), self.display_geometry):
+            self.render_worker.set_view(*self.viewport.state())
+
+    def handle_fit_view(self):
+        """Reset zoom and pan so the whole frame is visible."""
+        self.viewport.reset()
+        self.render_worker.set_view(*self.viewport.state())
 
     def handle_paint(self, painter):
-        self.draw_roi.draw_rectangle(painter)
\ No newline at end of file
+        painter.drawPixmap(0, 0, self.overlay.pixmap(self.image_container.size()))
+
+    def handle_crosshair(self, visible):
+        self.overlay.set_crosshair(visible)
+        self.image_container.update()
+
+    def handle_add_recording_roi(self):
+        """Keep the drawn rectangle as a recording region, recordings then store only the regions."""
+        name = self.draw_roi.add_saved_roi()
+        if name is None:
+            update_notif("No ROI Selected", duration=2000)
+            return
+        rect = self.draw_roi.saved_rois[name]
+        update_notif(f"Recording region {name}: {rect.width()}x{rect.height()} at ({rect.x()}, {rect.y()})", duration=2000)
+        self.overlay.invalidate()
+        self._update_histogram_roi()
+        self.image_container.update()
+
+    def handle_clear_recording_rois(self):
+        self.draw_roi.clear_saved_rois()
+        update_notif("Recording whole frames", duration=2000)
+        self.overlay.invalidate()
+        self.image_container.update()
+
+    def handle_clear_annotations(self):
+        self.overlay.clear_measurements()
+        self.image_container.update()
\ No newline at end of file
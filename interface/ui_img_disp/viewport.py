@@ -0,0 +1,129 @@
+"""
+Zoom and pan state for the live view.
+The visible part of the frame is worked out here so the render thread can crop it in numpy before any other work.
+"""
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+def fit_size(width, height, max_width, max_height):
+    """Return the largest (width, height) with the frame aspect ratio that fits in the container."""
+    if width <= 0 or height <= 0 or max_width <= 0 or max_height <= 0:
+        return 0, 0
+    scale = min(max_width / width, max_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def compute_view(frame_width, frame_height, container_width, container_height, zoom=1.0, center=None):
+    """
+    Work out which part of the frame is visible and how big it is drawn.
+
+    Zoom 1 is the whole frame fitted to the container. The crop origin is snapped to whole pixels so
+    container and image coordinates map onto each other exactly.
+
+    Returns:
+        dict: crop bounds (x0, y0, x1, y1), drawn size and offset within the container, or None if the
+        container has no area.
+    """
+    fit_width, fit_height = fit_size(frame_width, frame_height, container_width, container_height)
+    if fit_width == 0:
+        return None
+    scale = (fit_width / frame_width) * zoom
+
+    visible_width = min(frame_width, int(math.ceil(container_width / scale)))
+    visible_height = min(frame_height, int(math.ceil(container_height / scale)))
+
+    center_x, center_y = center if center is not None else (frame_width / 2, frame_height / 2)
+    x0 = min(max(int(round(center_x - visible_width / 2)), 0), frame_width - visible_width)
+    y0 = min(max(int(round(center_y - visible_height / 2)), 0), frame_height - visible_height)
+
+    if zoom == 1.0:
+        target_width, target_height = fit_width, fit_height
+    else:
+        target_width = max(1, int(round(visible_width * scale)))
+        target_height = max(1, int(round(visible_height * scale)))
+
+    return {
+        'crop': (x0, y0, x0 + visible_width, y0 + visible_height),
+        'target_width': target_width,
+        'target_height': target_height,
+        'offset_x': max(0, (container_width - target_width) // 2),
+        'offset_y': max(0, (container_height - target_height) // 2)
+    }
+
+class DisplayViewport:
+    """Zoom and pan state, changed on the GUI thread and read by the render thread."""
+
+    MIN_ZOOM = 1.0
+    MAX_ZOOM = 32.0
+
+    def __init__(self):
+        self.zoom = 1.0
+        self.center = None
+
+    def state(self):
+        """Return (zoom, center) as one tuple so the render thread reads a consistent pair."""
+        return self.zoom, self.center
+
+    def reset(self):
+        self.zoom = 1.0
+        self.center = None
+
+    def _current_view(self, geometry):
+        """Recompute the view from our own state, so quick successive events don't use a stale frame geometry."""
+        view = compute_view(geometry['original_width'], geometry['original_height'],
+                            geometry['container_width'], geometry['container_height'], self.zoom, self.center)
+        if view is None:
+            return None
+        x0, y0, x1, y1 = view['crop']
+        view['scale_x'] = view['target_width'] / (x1 - x0)
+        view['scale_y'] = view['target_height'] / (y1 - y0)
+        return view
+
+    def zoom_at(self, factor, widget_x, widget_y, geometry):
+        """Zoom by `factor` keeping the image point under the cursor fixed."""
+        new_zoom = min(max(self.zoom * factor, self.MIN_ZOOM), self.MAX_ZOOM)
+        if new_zoom == self.zoom or not geometry:
+            return False
+        view = self._current_view(geometry)
+        if view is None:
+            return False
+
+        # Image point under the cursor before zooming
+        x0, y0 = view['crop'][:2]
+        image_x = x0 + (widget_x - view['offset_x']) / view['scale_x']
+        image_y = y0 + (widget_y - view['offset_y']) / view['scale_y']
+
+        new_scale = view['scale_x'] * new_zoom / self.zoom
+        center_x = image_x + (geometry['container_width'] / 2 - widget_x) / new_scale
+        center_y = image_y + (geometry['container_height'] / 2 - widget_y) / new_scale
+
+        self.zoom = new_zoom
+        self.center = None
+        if new_zoom != 1.0:
+            self.center = self._clamp_center(center_x, center_y, self._current_view(geometry), geometry)
+        logger.debug(f"Zoom {self.zoom:.2f} centred on {self.center}")
+        return True
+
+    def pan(self, delta_x, delta_y, geometry):
+        """Move the view by a drag of (delta_x, delta_y) container pixels."""
+        if self.zoom == 1.0 or not geometry:
+            return False
+        view = self._current_view(geometry)
+        if view is None:
+            return False
+
+        center_x, center_y = self.center if self.center is not None else (geometry['original_width'] / 2, geometry['original_height'] / 2)
+        center_x -= delta_x / view['scale_x']
+        center_y -= delta_y / view['scale_y']
+        self.center = self._clamp_center(center_x, center_y, view, geometry)
+        return True
+
+    @staticmethod
+    def _clamp_center(center_x, center_y, view, geometry):
+        """Keep the centre where the view can reach, so dragging past an edge does not build up hidden overshoot."""
+        x0, y0, x1, y1 = view['crop']
+        visible_width, visible_height = x1 - x0, y1 - y0
+        center_x = min(max(center_x, visible_width / 2), geometry['original_width'] - visible_width / 2)
+        center_y = min(max(center_y, visible_height / 2), geometry['original_height'] - visible_height / 2)
+        return center_x, center_y
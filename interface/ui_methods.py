@@ -1,30 +1,47 @@
-from PyQt6.QtCore import QObject
+from PyQt6.QtCore import QObject, pyqtSignal
+from datetime import datetime
 import qtawesome as qta
-import logging
+import logging, os
+from concurrent.futures import ThreadPoolExecutor
 
 from .camera_controls.control_manager import CameraControlManager
 from .status_bar.status_bar_manager import StatusBarManager
 from acquisitions.acquire_stream import AcquireStream
 from acquisitions.snapshot import Snapshot
-from .ui_img_disp.draw_roi import DrawROI
+from acquisitions.frame_bus import FrameBusPublisher
+from acquisitions.processing import ProcessingPipeline
+from acquisitions.calibration import Calibration, FrameCorrector, acquire_frame_stack, update_calibration
+from acquisitions.background import BackgroundSubtractor
+from remote import ControlServer
 
 from .ui_img_disp.ui_display_methods import UIDisplayMethods
+from .telemetry_panel import TelemetryPanel
 
 from interface.status_bar.update_notif import update_notif
+from utils import SamplingProfiler, MemoryMonitor, tracer
 
 logger = logging.getLogger(__name__)
 
 class UIMethods(QObject):
 
+    profile_finished = pyqtSignal(str) # Emitted from the profiler thread with the output path base
+    recording_started = pyqtSignal() # Emitted when a recording starts, also when started remotely
+    recording_stopped = pyqtSignal() # Emitted when a recording stops, possibly from a worker thread
+    calibration_acquired = pyqtSignal(str, object) # Emitted from the calibration thread with ('dark' or 'flat', stack or None)
+
     def __init__(self, window, stream_camera):
         
         super().__init__()
         self.window = window
         self.stream_camera = stream_camera
         self.camera_control = self.stream_camera.camera_control
-        self.snapshot = Snapshot(stream_camera, window)
-        self.record_stream = AcquireStream(stream_camera, window)
-        self.draw_roi = DrawROI()
+        self.snapshot = Snapshot(stream_camera, window.ui_scaffolding['snapshot'])
+        self.record_stream = AcquireStream(self.camera_control, stream_camera.acquisition_loop,
+                                           on_started=self.recording_started.emit, on_stopped=self.recording_stopped.emit)
+        self.record_stream.default_reduction = window.ui_scaffolding['recording']['reduction']
+        self.record_stream.default_trigger = dict(window.ui_scaffolding['recording']['trigger'])
+        self.recording_started.connect(lambda: self._set_recording_state(True))
+        self.recording_stopped.connect(lambda: self._set_recording_state(False))
         
         """Initialize camera controls"""
         self.control_manager = CameraControlManager(self.camera_control, window)
@@ -35,6 +52,7 @@ class UIMethods(QObject):
         self.status_bar_manager.initialize_items()  # Initialize all status bar items
         
         self.image_display = UIDisplayMethods(window, window.image_container, stream_camera, self.camera_control, self.status_bar_manager)
+        self.draw_roi = self.image_display.draw_roi
         
         """Connect the Apply ROI button"""
         self.window.apply_roi_button.clicked.connect(self.image_display.handle_apply_roi)
@@ -42,11 +60,143 @@ class UIMethods(QObject):
         """Connect the Reset ROI button"""
         self.window.reset_roi_button.clicked.connect(self.image_display.handle_reset_roi)
         
+        """Feed measured stream statistics to the status bar"""
+        self.status_bar_manager.set_stats_source(self.get_stream_stats)
+        
+        """Connect the display quality toggle"""
+        self.window.smooth_display.toggled.connect(self.image_display.set_smooth_display)
+        
+        """Connect the fit view toolbar action"""
+        self.window.fit_view.triggered.connect(self.image_display.handle_fit_view)
+        
+        """Connect the overlay toolbar actions"""
+        self.window.crosshair.toggled.connect(self.image_display.handle_crosshair)
+        self.window.clear_annotations.triggered.connect(self.image_display.handle_clear_annotations)
+        
+        """Connect the triggered recording toggle, it applies from the next recording"""
+        self.window.trigger_recording.setChecked(self.record_stream.default_trigger['enabled'])
+        self.window.trigger_recording.toggled.connect(self.handle_trigger_recording)
+        
+        """Connect the recording region actions, recordings store only the saved regions while there are any"""
+        self.window.add_recording_roi.triggered.connect(self.image_display.handle_add_recording_roi)
+        self.window.clear_recording_rois.triggered.connect(self.image_display.handle_clear_recording_rois)
+        
+        """Connect the display contrast, gamma and colormap controls"""
+        self.window.display_stretch.currentIndexChanged.connect(self.image_display.handle_display_lut_change)
+        self.window.display_gamma.valueChanged.connect(self.image_display.handle_display_lut_change)
+        self.window.display_colormap.currentTextChanged.connect(self.image_display.handle_display_lut_change)
+        
+        """Connect the pipeline telemetry panel"""
+        self.telemetry_panel = TelemetryPanel(window.ui_scaffolding['telemetry'], window)
+        self.window.telemetry.toggled.connect(self.telemetry_panel.setVisible)
+        self.telemetry_panel.closed.connect(lambda: self.window.telemetry.setChecked(False))
+        
+        """Connect the sampling profiler, MICROTOOL_PROFILE=<seconds> starts it straight away"""
+        profiler_settings = window.ui_scaffolding['profiler']
+        self.profiler = SamplingProfiler(profiler_settings['interval_ms'] / 1000, profiler_settings['window_s'], profiler_settings['threads'])
+        self.profile_finished.connect(self._handle_profile_finished)
+        self.window.profiler.toggled.connect(self.handle_profiler)
+        if os.environ.get('MICROTOOL_PROFILE'):
+            try:
+                self.profiler.window = float(os.environ['MICROTOOL_PROFILE'])
+            except ValueError:
+                pass
+            self.window.profiler.setChecked(True)
+        
+        """Connect timeline tracing, MICROTOOL_TRACE=1 enables it straight away"""
+        self.tracing_capacity = window.ui_scaffolding['tracing']['capacity']
+        self.window.tracing.toggled.connect(self.handle_tracing)
+        if os.environ.get('MICROTOOL_TRACE'):
+            self.window.tracing.setChecked(True)
+        
+        """Publish frames to analysis processes over shared memory, MICROTOOL_FRAME_BUS=1 enables it without editing the config"""
+        self.frame_bus = None
+        frame_bus_settings = window.ui_scaffolding['frame_bus']
+        if frame_bus_settings['enabled'] or os.environ.get('MICROTOOL_FRAME_BUS'):
+            try:
+                self.frame_bus = FrameBusPublisher(frame_bus_settings['name'], frame_bus_settings['slots'],
+                                                   int(frame_bus_settings['slot_mb'] * 1024**2), frame_bus_settings['max_fps'])
+                stream_camera.acquisition_loop.subscribe(self.frame_bus)
+            except Exception as e:
+                logger.error(f"Error creating frame bus: {str(e)}")
+        
+        """Run the processing stages from the config on frames from the acquisition loop"""
+        self.processing = ProcessingPipeline(stream_camera.acquisition_loop)
+        self.processing.add_stages_from_config(window.ui_scaffolding['processing']['stages'])
+        
+        """Connect the calibration menu, the last calibration is loaded from its file"""
+        self.calibration_settings = window.ui_scaffolding['calibration']
+        self.calibration = None
+        self.calibration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="CalibrationAcquire")
+        self.calibration_future = None
+        self.calibration_acquired.connect(self._handle_calibration_acquired)
+        self.window.calibrate_dark.triggered.connect(lambda: self.handle_acquire_calibration('dark'))
+        self.window.calibrate_flat.triggered.connect(lambda: self.handle_acquire_calibration('flat'))
+        self.window.calibration_live.setChecked(self.calibration_settings['apply_live'])
+        self.window.calibration_live.toggled.connect(self._apply_calibration)
+        self.window.calibration_recording.setChecked(self.calibration_settings['apply_recording'])
+        self.window.calibration_recording.toggled.connect(self._apply_calibration)
+        self.window.clear_calibration.triggered.connect(self.handle_clear_calibration)
+        if os.path.exists(self.calibration_settings['file']):
+            try:
+                self.calibration = Calibration.load(self.calibration_settings['file'])
+            except Exception as e:
+                logger.error(f"Error loading calibration from {self.calibration_settings['file']}: {str(e)}")
+        self._apply_calibration()
+        
+        """Connect the background subtraction menu, the live view and recordings each estimate their own background"""
+        self.background_settings = window.ui_scaffolding['background']
+        self.live_background = None
+        self.window.background_live.setChecked(self.background_settings['apply_live'])
+        self.window.background_live.toggled.connect(self._apply_background)
+        self.window.background_recording.setChecked(self.background_settings['apply_recording'])
+        self.window.background_recording.toggled.connect(self._apply_background)
+        self.window.reset_background.triggered.connect(self.handle_reset_background)
+        self._apply_background()
+        
+        """Account the memory held by the recording queue, display and writer, warning before the budget is hit"""
+        memory_settings = window.ui_scaffolding['memory']
+        self.memory_monitor = MemoryMonitor(
+            budget_bytes=memory_settings['budget_gb'] * 1024**3 if memory_settings['budget_gb'] else None,
+            budget_fraction=memory_settings['budget_fraction'],
+            interval=memory_settings['interval_ms'] / 1000,
+            history=memory_settings['history_s'],
+            warn_fraction=memory_settings['warn_fraction'],
+            warn_horizon=memory_settings['warn_horizon_s']
+        )
+        self.memory_monitor.register('recording_queue', self.record_stream.get_buffered_bytes)
+        self.memory_monitor.register('display', self.image_display.get_buffer_bytes)
+        self.memory_monitor.register('writer', self.record_stream.h5_handler.get_buffer_bytes)
+        if self.frame_bus is not None:
+            self.memory_monitor.register('frame_bus', lambda: self.frame_bus.nbytes)
+        self.memory_monitor.register('processing', self.processing.get_pending_bytes)
+        self.memory_monitor.register('background', lambda: self.live_background.get_buffered_bytes() if self.live_background is not None else 0)
+        self.memory_monitor.set_inflow_source(self.record_stream.get_net_inflow)
+        self.memory_monitor.start(on_warning=lambda message: update_notif(message, duration=5000))
+        
+        """Serve the acquisition core to experiment scripts, MICROTOOL_REMOTE=1 enables it without editing the config"""
+        self.control_server = None
+        remote_settings = window.ui_scaffolding['remote']
+        if remote_settings['enabled'] or os.environ.get('MICROTOOL_REMOTE'):
+            self.control_server = ControlServer(
+                self.camera_control, stream_camera, self.record_stream, self.snapshot, processing=self.processing,
+                status_source=self.get_stream_stats,
+                host=remote_settings['host'], port=remote_settings['port'], unix_socket=remote_settings['unix_socket']
+            )
+            if self.control_server.start():
+                update_notif(f"Remote control on {self.control_server.address}", duration=4000)
+        
         """Set the original image size"""
         self.original_image_size = None
         
-    def update_img_display(self):
-        self.image_display.update_img_display()
+    def get_stream_stats(self):
+        """Collect measured statistics from the live stream, display and recording."""
+        stats = self.stream_camera.get_stream_stats()
+        stats.update(self.image_display.get_display_stats())
+        stats.update(self.record_stream.get_recording_stats())
+        stats.update(self.processing.get_stats())
+        stats.update(self.memory_monitor.get_stats())
+        return stats
 
     def handle_mouse_press(self, event):
         self.image_display.handle_mouse_press(event)
@@ -59,35 +209,166 @@ class UIMethods(QObject):
 
     def handle_paint(self, painter):
         self.image_display.handle_paint(painter)
+
+    def handle_resize(self, size):
+        self.image_display.handle_resize(size)
+
+    def handle_wheel(self, event):
+        self.image_display.handle_wheel(event)
         
     def handle_snapshot(self):
-        if self.snapshot.save_snapshot():
-            update_notif("Snapshot Saved", duration=2000)
-        else:
+        # Saving finishes in the background, the snapshot reports the result in the status bar itself
+        mode = self.window.snapshot_mode.currentData()
+        if self.snapshot.save_snapshot(mode, self.window.snapshot_frames.value()) is None:
             update_notif("Failed to Save Snapshot", duration=2000)
     
     def handle_recording(self):
         if not hasattr(self.window.start_recording, 'is_recording'):
             self.window.start_recording.is_recording = False
             
+        # The toolbar follows the recorder's started/stopped callbacks
         if not self.window.start_recording.is_recording:
-            if self.record_stream.start_recording():
-                self.window.start_recording.is_recording = True
-                # Get the stop recording icon from JSON
-                stop_icon = self.window.ui_scaffolding['toolbar']['icons']['Start Recording']['Stop Recording']['icon']
-                icon_color = self.window.ui_scaffolding['toolbar']['icons']['Start Recording']['Stop Recording']['icon_color']
-                self.window.start_recording.setIcon(qta.icon(stop_icon, color=icon_color))
-            else:
+            if not self.record_stream.start_recording(rois=self.draw_roi.get_saved_rois()):
                 update_notif("Failed to Start Recording", duration=2000)
         else:
             self.record_stream.stop_recording()
-            self.window.start_recording.is_recording = False
-            # Get the start recording icon from JSON
-            start_icon = self.window.ui_scaffolding['toolbar']['icons']['Start Recording']['icon']
-            self.window.start_recording.setIcon(qta.icon(start_icon))
             update_notif("Recording Stopped", duration=2000)
+
+    def handle_trigger_recording(self, enabled):
+        self.record_stream.default_trigger['enabled'] = enabled
+        update_notif("Next recording keeps only frames around changes" if enabled else "Next recording keeps every frame", duration=2000)
+
+    def handle_acquire_calibration(self, kind):
+        """Average a dark or flat stack in the background, the stream is started for it if it is not running."""
+        if self.calibration_future is not None and not self.calibration_future.done():
+            update_notif("Calibration already running", duration=2000)
+            return
+        frames = self.calibration_settings['frames']
+        update_notif(f"Averaging {frames} {kind} frames", duration=2000)
+        self.calibration_future = self.calibration_executor.submit(self._acquire_calibration_stack, kind, frames)
+
+    def _acquire_calibration_stack(self, kind, frames):
+        try:
+            stack = acquire_frame_stack(self.stream_camera.acquisition_loop, frames)
+        except Exception as e:
+            logger.error(f"Error acquiring {kind} frames: {str(e)}")
+            stack = None
+        self.calibration_acquired.emit(kind, stack)
+
+    def _handle_calibration_acquired(self, kind, stack):
+        if stack is None:
+            update_notif(f"Failed to Acquire {kind.capitalize()} Frames", duration=2000)
+            return
+        mean, std, frames = stack
+        info = {
+            f"{kind.capitalize()} Frames": frames,
+            f"{kind.capitalize()} Exposure": self.camera_control.call_camera_command("exposure", "get"),
+            f"{kind.capitalize()} Time": datetime.now().isoformat()
+        }
+        try:
+            self.calibration = update_calibration(self.calibration, kind, mean, std, self.calibration_settings['hot_sigma'], info)
+            self.calibration.save(self.calibration_settings['file'])
+        except Exception as e:
+            logger.error(f"Error building calibration: {str(e)}")
+            update_notif(f"Calibration Failed: {str(e)}", duration=4000)
+            return
+        self._apply_calibration()
+        update_notif(f"Calibration updated from {frames} {kind} frames, {len(self.calibration.hot_pixels)} defective pixels", duration=4000)
+
+    def handle_clear_calibration(self):
+        self.calibration = None
+        if os.path.exists(self.calibration_settings['file']):
+            os.remove(self.calibration_settings['file'])
+        self._apply_calibration()
+        update_notif("Calibration Cleared", duration=2000)
+
+    def _apply_calibration(self, *args):
+        """Hand the current calibration to the display and the recorder as the menu toggles say."""
+        live_corrector = None
+        recording_corrector = None
+        if self.calibration is not None:
+            workers = self.calibration_settings['workers']
+            output = self.calibration_settings['output']
+            recording_corrector = FrameCorrector(self.calibration, workers, output)
+            # The display and its histogram work on camera values
+            live_corrector = recording_corrector if output == 'camera' else FrameCorrector(self.calibration, workers)
+        # A replaced corrector is not closed, the recorder may still be using it, its idle pool goes with it
+        self.record_stream.corrector = recording_corrector
+        self.record_stream.default_calibrate = recording_corrector is not None and self.window.calibration_recording.isChecked()
+        self.image_display.set_frame_correction('calibration', live_corrector.correct if live_corrector is not None and self.window.calibration_live.isChecked() else None)
+
+    def _apply_background(self, *args):
+        """Start a fresh live background and set the one for the next recording, as the menu toggles say."""
+        self.record_stream.default_background = dict(self.background_settings, enabled=self.window.background_recording.isChecked())
+        # The display and its histogram work on camera values
+        self.live_background = BackgroundSubtractor.from_settings(
+            dict(self.background_settings, enabled=self.window.background_live.isChecked(), output='camera'))
+        self.image_display.set_frame_correction('background', self.live_background.process if self.live_background is not None else None)
+
+    def handle_reset_background(self):
+        # A new subtractor rather than a reset, the render thread may be using the old one
+        self._apply_background()
+        update_notif("Background Reset", duration=2000)
+
+    def _set_recording_state(self, recording):
+        self.window.start_recording.is_recording = recording
+        icons = self.window.ui_scaffolding['toolbar']['icons']['Start Recording']
+        if recording:
+            # Get the stop recording icon from JSON
+            self.window.start_recording.setIcon(qta.icon(icons['Stop Recording']['icon'], color=icons['Stop Recording']['icon_color']))
+        else:
+            # Get the start recording icon from JSON
+            self.window.start_recording.setIcon(qta.icon(icons['icon']))
+    
+    def handle_profiler(self, checked):
+        if checked and not self.profiler.is_running:
+            self.profiler.start(self._diagnostics_path_base('profile'), on_finished=self.profile_finished.emit)
+            update_notif(f"Profiling for {self.profiler.window:g} s")
+        elif not checked and self.profiler.is_running:
+            self.profiler.stop()
+
+    def _diagnostics_path_base(self, kind):
+        """Profiles and traces go next to the recording when one is running."""
+        file_path = self.record_stream.h5_handler.file_path
+        if self.record_stream.is_recording and file_path:
+            return file_path.rsplit('.', 1)[0]
+        return f"_data/{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    def handle_tracing(self, checked):
+        if checked:
+            tracer.clear()
+            tracer.enable(self.tracing_capacity)
+            update_notif("Tracing enabled")
+        elif tracer.enabled:
+            tracer.disable()
+            path = f"{self._diagnostics_path_base('trace')}_trace.json"
+            try:
+                tracer.export(path)
+                update_notif(f"Trace saved to {path}", duration=4000)
+            except Exception as e:
+                logger.error(f"Error exporting trace: {str(e)}")
+                update_notif("Failed to Save Trace", duration=2000)
+
+    def _handle_profile_finished(self, path_base):
+        self.window.profiler.setChecked(False)
+        update_notif(f"Profile saved to {path_base}_profile.collapsed", duration=4000)
     
     def cleanup(self):
         
         """Clean up resources."""
+        # Trigger events and calibration maps are written as the file closes, so let the flush finish first
+        if self.record_stream.is_recording:
+            self.record_stream.stop_recording()
+        self.record_stream.wait_until_saved()
+        self.image_display.cleanup()
+        self.snapshot.cleanup()
+        self.profiler.stop()
+        self.memory_monitor.stop()
+        if self.control_server is not None:
+            self.control_server.stop()
+        if self.frame_bus is not None:
+            self.stream_camera.acquisition_loop.unsubscribe(self.frame_bus)
+            self.frame_bus.close()
+        self.processing.close()
+        self.calibration_executor.shutdown(wait=False, cancel_futures=True)
         self.control_manager.cleanup()
\ No newline at end of file
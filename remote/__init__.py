@@ -0,0 +1,6 @@
+"""
+Remote control of the acquisition core over a local socket, for scripted experiments.
+"""
+from .server import ControlServer, RemoteCommandError
+from .client import ControlClient, RemoteError
+__all__ = ['ControlServer', 'RemoteCommandError', 'ControlClient', 'RemoteError']
@@ -0,0 +1,161 @@
+"""
+Blocking client for the control server, for experiment scripts.
+
+Example:
+    from remote import ControlClient
+
+    with ControlClient(port=5757) as client:
+        client.set('exposure', 2000)
+        client.start_recording(frames=500)
+        ...
+        client.stop_recording(wait=True)
+        print(client.latency_summary())
+"""
+import json, time, socket, threading, logging
+
+from utils import Telemetry
+
+logger = logging.getLogger(__name__)
+
+class RemoteError(Exception):
+    """The server answered the request with an error."""
+
+# Marks a call that uses the client's default timeout
+DEFAULT_TIMEOUT = object()
+
+class ControlClient:
+    """
+    One connection to the control server. Calls are serialised, use one client per thread to issue
+    commands concurrently.
+
+    A call that times out raises TimeoutError and leaves the connection usable, its late answer is
+    skipped by the next call.
+
+    Every call's round trip is recorded per command in `latency`, next to the server's own handling time,
+    so the transport overhead can be told apart from the time spent in the acquisition core.
+    """
+
+    def __init__(self, host='127.0.0.1', port=5757, unix_socket=None, timeout=10.0):
+        self.timeout = timeout
+        self.latency = Telemetry()
+        self.server_latency = Telemetry()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        if unix_socket:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(unix_socket)
+        else:
+            self._socket = socket.create_connection((host, port), timeout=timeout)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket.settimeout(timeout)
+        # Responses are read through our own buffer, a file object from makefile() is dead after one timeout
+        self._buffer = bytearray()
+
+    def _read_line(self, deadline):
+        """One response line, waiting until `deadline` (time.monotonic(), None waits forever)."""
+        while True:
+            end = self._buffer.find(b'\n')
+            if end >= 0:
+                line = bytes(self._buffer[:end])
+                del self._buffer[:end + 1]
+                return line
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for the control server")
+                self._socket.settimeout(remaining)
+            else:
+                self._socket.settimeout(None)
+            try:
+                data = self._socket.recv(65536)
+            except socket.timeout:
+                raise TimeoutError("Timed out waiting for the control server") from None
+            if not data:
+                raise ConnectionError("Control server closed the connection")
+            self._buffer += data
+
+    def call(self, cmd, reply_timeout=DEFAULT_TIMEOUT, **params):
+        """
+        Send one command and wait for its result, raises RemoteError if the server reports a failure.
+        `reply_timeout` overrides the client's timeout for this call, None waits as long as it takes.
+        """
+        if reply_timeout is DEFAULT_TIMEOUT:
+            reply_timeout = self.timeout
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            start = time.perf_counter()
+            deadline = time.monotonic() + reply_timeout if reply_timeout is not None else None
+            self._socket.settimeout(self.timeout)
+            self._socket.sendall(json.dumps({'id': request_id, 'cmd': cmd, 'params': params}).encode() + b'\n')
+            # A request that timed out earlier may still answer, skip anything that is not ours
+            while True:
+                response = json.loads(self._read_line(deadline))
+                if response.get('id') == request_id:
+                    break
+            duration = time.perf_counter() - start
+
+        self.latency.record(cmd, duration)
+        self.server_latency.record(cmd, response.get('server_ms', 0.0) / 1000)
+        if not response['ok']:
+            raise RemoteError(response['error'])
+        return response['result']
+
+    def latency_summary(self):
+        """Per command: the round-trip percentiles plus the median time the server spent handling it."""
+        server = self.server_latency.summary()
+        summary = self.latency.summary()
+        for cmd, stats in summary.items():
+            stats['server_p50_ms'] = server.get(cmd, {}).get('p50_ms', 0.0)
+        return summary
+
+    def close(self):
+        try:
+            self._socket.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    # Convenience wrappers
+
+    def ping(self):
+        return self.call('ping')
+
+    def status(self):
+        return self.call('status')
+
+    def get(self, name):
+        return self.call('camera.get', name=name)
+
+    def set(self, name, value):
+        return self.call('camera.set', name=name, value=value)
+
+    def start_stream(self):
+        return self.call('stream.start')
+
+    def stop_stream(self):
+        return self.call('stream.stop')
+
+    def start_recording(self, path=None, frames=None, reduction=None, rois=None, trigger=None, calibrate=None, background=None):
+        return self.call('recording.start', path=path, frames=frames, reduction=reduction, rois=rois, trigger=trigger,
+                         calibrate=calibrate, background=background)
+
+    def stop_recording(self, wait=False, timeout=None):
+        # Flushing the queue can take much longer than a command, wait for as long as the server does
+        reply_timeout = (None if timeout is None else timeout + self.timeout) if wait else DEFAULT_TIMEOUT
+        return self.call('recording.stop', reply_timeout=reply_timeout, wait=wait, timeout=timeout)
+
+    def snapshot(self, mode='single', frames=1):
+        return self.call('snapshot', mode=mode, frames=frames)
+
+    def processing_stats(self):
+        return self.call('processing.stats')
+
+    def processing_latest(self, stage=None):
+        return self.call('processing.latest', stage=stage)
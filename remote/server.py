@@ -0,0 +1,290 @@
+"""
+Local control server for scripted experiments.
+Speaks newline-delimited JSON over TCP (localhost by default) or a Unix socket. Each request is handled as
+its own task, so a slow command (a snapshot, stopping a recording) never holds up the others on the same
+connection; blocking calls into the acquisition core run on a small worker pool.
+
+Request:   {"id": 1, "cmd": "camera.set", "params": {"name": "exposure", "value": 2000}}
+Response:  {"id": 1, "ok": true, "result": null, "server_ms": 0.41}
+           {"id": 1, "ok": false, "error": "Unknown command 'foo'", "server_ms": 0.02}
+"""
+import os, json, time, asyncio, threading, inspect, logging
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import telemetry
+
+logger = logging.getLogger(__name__)
+
+class RemoteCommandError(Exception):
+    """Raised by a handler to report a failure to the client without logging a traceback."""
+
+class ControlServer:
+    """
+    Serves the acquisition core to remote clients from its own thread and event loop.
+
+    Args:
+        camera_control: CameraControl, for camera.get/camera.set
+        stream_camera: LiveStreamHandler, for stream.start/stream.stop
+        recorder: AcquireStream, for the recording commands
+        snapshot: Optional Snapshot, for the snapshot command
+        processing: Optional ProcessingPipeline, for the processing commands
+        status_source: Optional callable returning the status dict, defaults to stream and recording stats
+        host, port: TCP address, only used when `unix_socket` is None. Bind to localhost only, there is
+            no authentication.
+        unix_socket: Path of a Unix socket to listen on instead of TCP
+    """
+
+    def __init__(self, camera_control, stream_camera, recorder, snapshot=None, processing=None, status_source=None,
+                 host='127.0.0.1', port=5757, unix_socket=None, max_workers=4):
+        self.camera_control = camera_control
+        self.stream_camera = stream_camera
+        self.recorder = recorder
+        self.snapshot = snapshot
+        self.processing = processing
+        self.status_source = status_source or self._default_status
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="RemoteWorker")
+        self.requests_handled = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+        self.commands = {
+            'ping': self.ping,
+            'commands': self.list_commands,
+            'status': self.status,
+            'camera.get': self.camera_get,
+            'camera.set': self.camera_set,
+            'stream.start': self.stream_start,
+            'stream.stop': self.stream_stop,
+            'recording.start': self.recording_start,
+            'recording.stop': self.recording_stop,
+            'recording.stats': self.recording_stats,
+            'snapshot': self.take_snapshot,
+            'processing.stats': self.processing_stats,
+            'processing.latest': self.processing_latest
+        }
+
+    def register(self, name, handler):
+        """Add or replace a command. Plain functions run on the worker pool, coroutines on the event loop."""
+        self.commands[name] = handler
+
+    @property
+    def address(self):
+        return self.unix_socket if self.unix_socket else f"{self.host}:{self.port}"
+
+    def start(self):
+        """Start serving on a background thread, returns once the socket is listening."""
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="ControlServerThread", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5.0)
+        return self._server is not None
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.executor.shutdown(wait=False)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._listen())
+            logger.info(f"Control server listening on {self.address}")
+            self._ready.set()
+            self._loop.run_forever()
+        except Exception as e:
+            logger.error(f"Control server failed on {self.address}: {str(e)}")
+            self._ready.set()
+        finally:
+            if self._server is not None:
+                self._server.close()
+                self._loop.run_until_complete(self._server.wait_closed())
+                self._server = None
+            self._loop.close()
+            if self.unix_socket and os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+            logger.info("Control server stopped")
+
+    async def _listen(self):
+        if self.unix_socket:
+            # A socket file left behind by a crashed session would make the bind fail
+            if os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=self.unix_socket)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info('peername') or 'unix socket'
+        logger.info(f"Control client connected from {peer}")
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Requests on one connection run concurrently, responses carry the request id
+                task = asyncio.create_task(self._handle_line(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            logger.info(f"Control client {peer} disconnected")
+
+    async def _handle_line(self, line, writer, write_lock):
+        start = time.perf_counter()
+        request_id = None
+        cmd = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            cmd = request['cmd']
+            response = {'id': request_id, 'ok': True, 'result': await self._dispatch(cmd, request.get('params') or {})}
+        except RemoteCommandError as e:
+            response = {'id': request_id, 'ok': False, 'error': str(e)}
+        except Exception as e:
+            logger.error(f"Error handling remote command {cmd}: {str(e)}")
+            response = {'id': request_id, 'ok': False, 'error': f"{type(e).__name__}: {str(e)}"}
+        duration = time.perf_counter() - start
+        # Only registered commands get their own histogram, a client must not be able to create them at will
+        telemetry.record(f"remote.{cmd}" if isinstance(cmd, str) and cmd in self.commands else "remote.unknown", duration)
+        response['server_ms'] = round(duration * 1000, 3)
+        self.requests_handled += 1
+
+        async with write_lock:
+            writer.write(json.dumps(response, default=_to_json).encode() + b'\n')
+            await writer.drain()
+
+    async def _dispatch(self, cmd, params):
+        handler = self.commands.get(cmd)
+        if handler is None:
+            raise RemoteCommandError(f"Unknown command '{cmd}'")
+        if inspect.iscoroutinefunction(handler):
+            return await handler(**params)
+        # Core calls can block on the camera command queue or on joining threads, keep them off the loop
+        return await self._loop.run_in_executor(self.executor, lambda: handler(**params))
+
+    def _default_status(self):
+        stats = self.stream_camera.get_stream_stats()
+        stats.update(self.recorder.get_recording_stats())
+        if self.processing is not None:
+            stats.update(self.processing.get_stats())
+        return stats
+
+    # Commands
+
+    async def ping(self):
+        return {'time': time.time()}
+
+    async def list_commands(self):
+        return sorted(self.commands)
+
+    def status(self):
+        stats = self.status_source()
+        stats['is_streaming'] = self.stream_camera.is_streaming()
+        stats['is_recording'] = self.recorder.is_recording
+        return stats
+
+    def camera_get(self, name):
+        if name not in self.camera_control.get_commands_by_name:
+            raise RemoteCommandError(f"Unknown camera parameter '{name}'")
+        return self.camera_control.call_camera_command(name, "get")
+
+    def camera_set(self, name, value):
+        if name not in self.camera_control.set_commands_by_name:
+            raise RemoteCommandError(f"Camera parameter '{name}' cannot be set")
+        self.camera_control.call_camera_command(name, "set", value)
+        # Set commands are queued, reading back waits for it and returns what the camera accepted
+        return self.camera_control.call_camera_command(name, "get") if name in self.camera_control.get_commands_by_name else None
+
+    def stream_start(self):
+        self.stream_camera.start_stream()
+        return self.stream_camera.is_streaming()
+
+    def stream_stop(self):
+        self.stream_camera.stop_stream()
+        return self.stream_camera.is_streaming()
+
+    def recording_start(self, path=None, frames=None, reduction=None, rois=None, trigger=None, calibrate=None, background=None):
+        """
+        Start recording. For this recording only, `reduction` takes binning, bin_mode, decimate and average,
+        `rois` ({name: [x, y, width, height]}) stores only those regions and `trigger` (enabled, threshold,
+        pre_roll, post_roll, ...) stores only frames around changes. `calibrate` switches the loaded calibration
+        on or off and `background` (enabled, method, window, ...) stores frames minus a rolling background.
+        """
+        if self.recorder.is_recording:
+            raise RemoteCommandError("Already recording")
+        if not self.recorder.start_recording(path, frame_limit=frames, acquisition_type='Remote', reduction=reduction, rois=rois,
+                                            trigger=trigger, calibrate=calibrate, background=background):
+            raise RemoteCommandError("Failed to start recording")
+        return {'file_path': self.recorder.h5_handler.file_path}
+
+    def recording_stop(self, wait=False, timeout=None):
+        """Stop recording, with wait=True only answer once the queue is flushed to disk."""
+        file_path = self.recorder.h5_handler.file_path
+        self.recorder.stop_recording()
+        saved = self.recorder.wait_until_saved(timeout) if wait else None
+        stats = self.recorder.queue.get_queue_stats() if self.recorder.queue is not None else {}
+        return {'file_path': file_path, 'saved': saved, **stats}
+
+    def recording_stats(self):
+        return self.recorder.get_recording_stats()
+
+    async def take_snapshot(self, mode='single', frames=1):
+        if self.snapshot is None:
+            raise RemoteCommandError("Snapshots are not available")
+        future = self.snapshot.save_snapshot(mode, frames)
+        if future is None:
+            raise RemoteCommandError("Failed to start snapshot")
+        filename = await asyncio.wrap_future(future)
+        if filename is None:
+            raise RemoteCommandError("Failed to save snapshot")
+        return filename
+
+    def processing_stats(self):
+        if self.processing is None:
+            raise RemoteCommandError("No processing stages")
+        return self.processing.get_stats()['processing']
+
+    def processing_latest(self, stage=None, max_elements=1024):
+        """Latest result per stage, arrays larger than `max_elements` are described by shape and dtype only."""
+        if self.processing is None:
+            raise RemoteCommandError("No processing stages")
+        results = self.processing.latest_results()
+        if stage is not None:
+            if stage not in results:
+                raise RemoteCommandError(f"Unknown processing stage '{stage}'")
+            results = {stage: results[stage]}
+        latest = {}
+        for name, entry in results.items():
+            if entry is None:
+                latest[name] = None
+                continue
+            result, frame_number, timestamp = entry
+            if hasattr(result, 'shape') and getattr(result, 'size', 0) > max_elements:
+                result = {'shape': list(result.shape), 'dtype': str(result.dtype)}
+            elif hasattr(result, 'tolist'):
+                result = result.tolist()
+            latest[name] = {'result': result, 'frame_number': frame_number, 'timestamp': timestamp}
+        return latest
+
+def _to_json(value):
+    """Fallback for numpy scalars and other values json does not know."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
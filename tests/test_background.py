@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from acquisitions.background import BackgroundSubtractor
+
+def _frame(value, shape=(8, 8), dtype=np.uint8):
+    return np.full(shape, value, dtype=dtype)
+
+def test_mean_covers_the_last_window_frames():
+    subtractor = BackgroundSubtractor('mean', window=3)
+    for value in (1, 2, 3, 4):
+        subtractor.update(_frame(value))
+    assert np.allclose(subtractor.background, 3.0)
+
+def test_ema_default_alpha():
+    subtractor = BackgroundSubtractor('ema', window=9)
+    assert subtractor.alpha == pytest.approx(0.2)
+    subtractor.update(_frame(0))
+    subtractor.update(_frame(100))
+    assert np.allclose(subtractor.background, 20.0)
+
+def test_median_ignores_a_passing_particle():
+    subtractor = BackgroundSubtractor('median', window=50)
+    for _ in range(50):
+        subtractor.update(_frame(100))
+    particle = _frame(100)
+    particle[2:4, 2:4] = 255
+    subtractor.update(particle)
+    assert np.abs(subtractor.background - 100).max() < 1.0
+
+@pytest.mark.parametrize('window', [10, 50])
+def test_median_reaches_90_percent_of_a_step_in_about_window_frames(window):
+    rng = np.random.default_rng(0)
+    subtractor = BackgroundSubtractor('median', window=window)
+    noisy = lambda level: np.clip(rng.normal(level, 3, (32, 32)), 0, 255).astype(np.uint8)
+    for _ in range(5 * window):
+        subtractor.update(noisy(100))
+    for frames in range(1, 10 * window):
+        subtractor.update(noisy(200))
+        if subtractor.background.mean() >= 190:
+            break
+    assert 0.8 * window <= frames <= 1.3 * window
+
+def test_camera_output_pedestal_is_frozen_until_reset():
+    subtractor = BackgroundSubtractor('median', window=10)
+    assert subtractor.attrs()['Background Pedestal'] == -1.0
+    first = subtractor.process(_frame(100))
+    assert (first == 100).all()
+    # A brighter frame shows up against the background, the offset stays that of the first frame
+    brighter = subtractor.process(_frame(150))
+    assert (brighter == 150).all()
+    assert subtractor.attrs()['Background Pedestal'] == 100.0
+    subtractor.reset()
+    assert subtractor.background is None
+    assert (subtractor.process(_frame(120)) == 120).all()
+    assert subtractor.attrs()['Background Pedestal'] == 120.0
+
+def test_camera_output_clips_to_the_dtype():
+    subtractor = BackgroundSubtractor('mean', window=5, pedestal=10)
+    subtractor.process(_frame(200))
+    assert (subtractor.process(_frame(0)) == 0).all()
+    # The background is now the mean of 200 and 0
+    assert (subtractor.process(_frame(255)) == 165).all()
+
+def test_float32_output_is_the_signed_difference():
+    subtractor = BackgroundSubtractor('mean', window=5, output='float32')
+    subtractor.process(_frame(100))
+    difference = subtractor.process(_frame(90))
+    assert difference.dtype == np.float32
+    assert np.allclose(difference, -10.0)
+    assert subtractor.attrs()['Background Pedestal'] == 0.0
+
+def test_frame_size_change_restarts_the_estimate():
+    subtractor = BackgroundSubtractor('mean', window=5)
+    subtractor.update(_frame(50))
+    subtractor.update(_frame(70, shape=(4, 4)))
+    assert subtractor.background.shape == (4, 4)
+    assert np.allclose(subtractor.background, 70.0)
+
+def test_buffered_bytes_and_settings():
+    subtractor = BackgroundSubtractor('mean', window=4)
+    subtractor.update(_frame(1))
+    assert subtractor.get_buffered_bytes() >= 4 * 64
+    assert BackgroundSubtractor.from_settings({'enabled': False}) is None
+    assert BackgroundSubtractor.from_settings({'enabled': True, 'method': 'ema'}).method == 'ema'
+    with pytest.raises(ValueError):
+        BackgroundSubtractor('mode')
+    with pytest.raises(ValueError):
+        BackgroundSubtractor(output='uint16')
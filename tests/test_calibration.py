@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from acquisitions.calibration import Calibration, FrameCorrector, update_calibration, MIN_STRIPED_PIXELS
+
+SHAPE = (64, 48)
+HOT = (10, 20)
+DEAD = (30, 5)
+
+def _stacks(rng):
+    """A dark stack with one hot pixel and a flat stack with a vignette and one dead pixel."""
+    dark_mean = (20 + rng.normal(0, 0.5, SHAPE)).astype(np.float32)
+    dark_mean[HOT] = 200
+    dark_std = np.full(SHAPE, 1.0, dtype=np.float32)
+    rows = np.linspace(0.8, 1.2, SHAPE[0], dtype=np.float32)[:, None]
+    flat_mean = (dark_mean + 100 * rows * np.ones(SHAPE, dtype=np.float32)).astype(np.float32)
+    flat_mean[HOT] = 300
+    flat_mean[DEAD] = dark_mean[DEAD] + 1
+    return dark_mean, dark_std, flat_mean
+
+@pytest.fixture
+def calibration():
+    dark_mean, dark_std, flat_mean = _stacks(np.random.default_rng(0))
+    return Calibration.from_stacks(dark_mean, dark_std, flat_mean, info={'Dark Frames': 10})
+
+def _flat_index(position):
+    return position[0] * SHAPE[1] + position[1]
+
+def test_defective_pixels(calibration):
+    assert set(calibration.hot_pixels.tolist()) == {_flat_index(HOT), _flat_index(DEAD)}
+    assert calibration.attrs()['Calibration Hot Pixels'] == 2
+    assert calibration.attrs()['Calibration Flat Field']
+
+def test_flat_frame_is_corrected_to_an_even_level(calibration):
+    flat_mean = calibration.stacks['flat_mean']
+    corrected = FrameCorrector(calibration, workers=1, output='float32').correct(flat_mean)
+    assert corrected.dtype == np.float32
+    assert np.allclose(corrected, 100, atol=0.5)
+    # Defective pixels take the mean of their good neighbours
+    assert corrected[HOT] == pytest.approx(100, abs=0.5)
+    assert corrected[DEAD] == pytest.approx(100, abs=0.5)
+
+def test_camera_output_rounds_and_clips(calibration):
+    frame = np.zeros(SHAPE, dtype=np.uint8)
+    corrected = FrameCorrector(calibration, workers=1).correct(frame)
+    assert corrected.dtype == np.uint8
+    assert (corrected == 0).all()
+
+def test_striped_correction_matches_a_single_thread():
+    rng = np.random.default_rng(1)
+    shape = (512, MIN_STRIPED_PIXELS // 512 + 8)
+    dark_mean = (10 + rng.normal(0, 1, shape)).astype(np.float32)
+    calibration = Calibration.from_stacks(dark_mean)
+    frame = rng.integers(0, 4096, shape, dtype=np.uint16)
+    single = FrameCorrector(calibration, workers=1).correct(frame)
+    striped = FrameCorrector(calibration, workers=4)
+    try:
+        assert np.array_equal(striped.correct(frame), single)
+    finally:
+        striped.close()
+
+def test_size_mismatch_raises(calibration):
+    corrector = FrameCorrector(calibration, workers=1)
+    corrector.check(*SHAPE)
+    with pytest.raises(ValueError):
+        corrector.correct(np.zeros((32, 32), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        FrameCorrector(calibration, output='uint16')
+
+def test_from_stacks_needs_a_brighter_flat():
+    dark = np.full(SHAPE, 50, dtype=np.float32)
+    with pytest.raises(ValueError):
+        Calibration.from_stacks(dark, flat_mean=dark.copy())
+    with pytest.raises(ValueError):
+        Calibration.from_stacks()
+
+def test_update_keeps_the_other_stack(calibration):
+    dark_mean, dark_std, flat_mean = _stacks(np.random.default_rng(2))
+    updated = update_calibration(calibration, 'dark', dark_mean, dark_std, info={'Dark Frames': 20})
+    assert set(updated.stacks) == {'dark_mean', 'dark_std', 'flat_mean'}
+    assert updated.info['Dark Frames'] == 20
+    other_size = update_calibration(calibration, 'flat', np.full((8, 8), 100, dtype=np.float32))
+    assert set(other_size.stacks) == {'flat_mean'}
+    with pytest.raises(ValueError):
+        update_calibration(calibration, 'bias', dark_mean)
+
+def test_save_and_load(calibration, tmp_path):
+    path = tmp_path / 'calibration.h5'
+    calibration.save(str(path))
+    loaded = Calibration.load(str(path))
+    assert np.array_equal(loaded.offset, calibration.offset)
+    assert np.array_equal(loaded.gain, calibration.gain)
+    assert np.array_equal(loaded.hot_pixels, calibration.hot_pixels)
+    assert set(loaded.stacks) == set(calibration.stacks)
+    assert loaded.info['Dark Frames'] == 10
@@ -0,0 +1,109 @@
+import sys, time, types, threading
+import numpy as np
+import pytest
+
+try:
+    import ximea  # noqa: F401
+except ImportError:
+    # CameraSequences only reaches the camera through the CameraControl it is given, the SDK is only
+    # needed to import the module
+    sys.modules['ximea'] = types.ModuleType('ximea')
+    sys.modules['ximea'].xiapi = types.ModuleType('ximea.xiapi')
+    sys.modules['ximea.xiapi'] = sys.modules['ximea'].xiapi
+
+from instruments.xicam.cam_methods import CameraSequences
+
+class FakeCamera:
+    """Stands in for CameraControl: a free-running camera at `framerate` with an event log."""
+
+    def __init__(self, framerate=500.0):
+        self.settings = {'framerate': framerate, 'exposure': 1000}
+        self.get_commands_by_name = {'framerate': {}, 'exposure': {}}
+        self.running = False
+        self.frame_number = 0
+        self.log = []
+
+    def call_camera_command(self, name, method, value=None):
+        if method == 'set':
+            self.log.append(('set', name, value, self.running))
+            self.settings[name] = value
+            return None
+        return self.settings.get(name)
+
+    def start_camera(self):
+        self.log.append(('start',))
+        self.running = True
+
+    def stop_camera(self):
+        self.log.append(('stop',))
+        self.running = False
+
+    def get_image(self):
+        assert self.running, "get_image on a stopped camera"
+        time.sleep(1.0 / self.settings['framerate'])
+        self.frame_number += 1
+
+    def get_image_data(self):
+        return np.full((4, 4), self.frame_number % 256, dtype=np.uint8)
+
+    def get_image_timestamp(self):
+        return time.monotonic()
+
+def _run(points, camera=None, **kwargs):
+    camera = camera or FakeCamera()
+    received = []
+    report = CameraSequences(camera).run_sequence(points, lambda frame, timestamp, metadata: received.append(metadata), **kwargs)
+    return camera, received, report
+
+def _events(camera, kind):
+    return [event for event in camera.log if event[0] == kind]
+
+def test_time_lapse_keeps_the_camera_running_for_short_gaps():
+    camera, received, report = _run(CameraSequences.time_lapse(0.05, 4, frames=2))
+    assert [(metadata['point'], metadata['frame']) for metadata in received] == [(p, f) for p in range(4) for f in range(2)]
+    assert report['points_acquired'] == 4
+    assert report['frames'] == 8
+    assert not report['camera_idle_between_points']
+    assert len(_events(camera, 'start')) == len(_events(camera, 'stop')) == 1
+    assert not camera.running
+
+def test_points_land_on_their_deadlines():
+    _, received, report = _run(CameraSequences.time_lapse(0.05, 4))
+    # The first frame after a deadline arrives within about one frame period
+    assert report['max_abs_error_ms'] < 50
+    assert [metadata['requested_s'] for metadata in received] == pytest.approx([0.0, 0.05, 0.1, 0.15])
+    for metadata in received:
+        assert metadata['acquired_s'] >= metadata['requested_s']
+
+def test_camera_idles_between_long_gaps():
+    camera, _, report = _run(CameraSequences.time_lapse(0.05, 3), idle_threshold=0.01)
+    assert report['camera_idle_between_points']
+    assert len(_events(camera, 'start')) == len(_events(camera, 'stop')) == 3
+
+def test_setting_changes_restart_a_running_camera():
+    camera, received, _ = _run(CameraSequences.parameter_series('exposure', [1000, 2000, 5000], interval=0.03, frames=2))
+    # Every setting goes in while the camera is stopped, and every frame reports the setting it was taken with
+    assert [event[1:] for event in _events(camera, 'set')] == [('exposure', 1000, False), ('exposure', 2000, False), ('exposure', 5000, False)]
+    assert [metadata['exposure'] for metadata in received] == [1000, 1000, 2000, 2000, 5000, 5000]
+    assert len(_events(camera, 'start')) == 3
+
+def test_unchanged_settings_do_not_restart():
+    camera, _, _ = _run(CameraSequences.time_lapse(0.02, 3, settings={'exposure': 1000}))
+    assert len(_events(camera, 'set')) == 1
+    assert len(_events(camera, 'start')) == 1
+
+def test_repeat_offsets_each_block():
+    points = CameraSequences.repeat(CameraSequences.parameter_series('exposure', [1, 2], interval=0.5), 3, 10.0)
+    assert [point['time'] for point in points] == [0.0, 0.5, 10.0, 10.5, 20.0, 20.5]
+
+def test_stop_event_ends_the_sequence_early():
+    stop_event = threading.Event()
+    timer = threading.Timer(0.05, stop_event.set)
+    timer.start()
+    try:
+        camera, _, report = _run(CameraSequences.time_lapse(0.02, 100), stop_event=stop_event)
+    finally:
+        timer.cancel()
+    assert report['stopped_early']
+    assert report['points_acquired'] < 100
+    assert not camera.running
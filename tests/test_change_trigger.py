@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from acquisitions.change_trigger import ChangeTrigger
+
+def _run(trigger, values, shape=(16, 16)):
+    """Process one flat frame per value, timestamped by its index, returns the committed timestamps."""
+    committed = []
+    for index, value in enumerate(values):
+        frame = np.full(shape, value, dtype=np.uint8)
+        committed.extend(timestamp for _, timestamp in trigger.process(frame, float(index)))
+    return committed
+
+def test_static_scene_commits_nothing():
+    trigger = ChangeTrigger(threshold=5, subsample=1, pre_roll=2, post_roll=3)
+    assert _run(trigger, [10] * 20) == []
+    trigger.finish()
+    assert trigger.frames_skipped == 20
+    assert trigger.events == []
+
+def test_pre_and_post_roll_around_a_transient():
+    trigger = ChangeTrigger(threshold=50, subsample=1, reference_alpha=0.1, pre_roll=2, post_roll=3)
+    values = [0] * 10 + [100] + [0] * 9
+    committed = _run(trigger, values)
+    # Two frames of pre-roll, the change and three frames of post-roll
+    assert committed == [8.0, 9.0, 10.0, 11.0, 12.0, 13.0]
+    # The event closed with the first static frame after the post-roll
+    assert not trigger.active
+    assert trigger.events == [(8.0, 13.0, 6)]
+    trigger.finish()
+    skipped = list(trigger.skipped_timestamps)
+    assert skipped == [float(t) for t in list(range(8)) + list(range(14, 20))]
+    assert trigger.frames_committed + trigger.frames_skipped == trigger.frames_seen == len(values)
+
+def test_datasets_hold_events_and_skipped_timestamps():
+    trigger = ChangeTrigger(threshold=50, subsample=1, pre_roll=0, post_roll=0)
+    _run(trigger, [0, 0, 100, 0, 0, 200, 0])
+    trigger.finish()
+    datasets = trigger.datasets()
+    assert datasets['trigger/events'].tolist() == [[2.0, 2.0, 1.0], [5.0, 5.0, 1.0]]
+    assert datasets['trigger/skipped_timestamps'].tolist() == [0.0, 1.0, 3.0, 4.0, 6.0]
+
+def test_transient_is_absorbed_by_the_reference():
+    # After a transient of amplitude A the change stays above the threshold for about
+    # log(threshold / A) / log(1 - alpha) frames, here log(5 / 10) / log(0.9), so 7 frames
+    trigger = ChangeTrigger(threshold=5, subsample=1, reference_alpha=0.1, pre_roll=0, post_roll=0)
+    committed = _run(trigger, [0] * 5 + [100] + [0] * 20)
+    trigger.finish()
+    assert committed[0] == 5.0
+    assert len(trigger.events) == 1
+    assert 6 <= len(committed) - 1 <= 8
+
+def test_roi_limits_the_metric():
+    trigger = ChangeTrigger(threshold=5, subsample=1, roi=(0, 0, 4, 4), pre_roll=0, post_roll=0)
+    quiet = np.zeros((16, 16), dtype=np.uint8)
+    outside = quiet.copy()
+    outside[8:, 8:] = 200
+    inside = quiet.copy()
+    inside[:4, :4] = 200
+    trigger.process(quiet, 0.0)
+    assert trigger.process(outside, 1.0) == []
+    assert len(trigger.process(inside, 2.0)) == 1
+
+def test_roi_outside_the_frame():
+    trigger = ChangeTrigger(roi=(10, 10, 8, 8))
+    trigger.validate(32, 32)
+    with pytest.raises(ValueError):
+        trigger.validate(16, 16)
+    # Frames that no longer fit the ROI fall back to the full frame instead of an empty grid
+    trigger = ChangeTrigger(threshold=5, subsample=1, roi=(10, 10, 8, 8), pre_roll=0, post_roll=0)
+    assert _run(trigger, [0, 100]) == [1.0]
@@ -0,0 +1,63 @@
+import os, uuid
+import numpy as np
+import pytest
+
+from acquisitions.frame_bus import FrameBusPublisher, FrameBusReader
+
+@pytest.fixture
+def publisher():
+    publisher = FrameBusPublisher(f"microtool_test_{os.getpid()}_{uuid.uuid4().hex[:8]}", slot_count=4, slot_size=1024)
+    yield publisher
+    publisher.close()
+
+def _frame(value, shape=(16, 16), dtype=np.uint8):
+    return np.full(shape, value, dtype=dtype)
+
+def test_frames_in_order(publisher):
+    with FrameBusReader(publisher.bus_name) as reader:
+        assert reader.read_next(timeout=0.01) == (None, None)
+        for number in range(3):
+            publisher.offer(_frame(number), 10.0 + number, number)
+        frames = list(reader.frames(timeout=0.01))
+    assert [int(frame[0, 0]) for frame, _ in frames] == [0, 1, 2]
+    assert [info['frame_number'] for _, info in frames] == [0, 1, 2]
+    assert [info['timestamp'] for _, info in frames] == [10.0, 11.0, 12.0]
+    assert all(info['lapped'] == 0 for _, info in frames)
+
+def test_shape_and_dtype_travel_with_the_frame(publisher):
+    frame = np.arange(3 * 5 * 2, dtype=np.uint16).reshape(3, 5, 2)
+    with FrameBusReader(publisher.bus_name) as reader:
+        publisher.offer(frame, None, 7)
+        received, info = reader.read_next(timeout=0.01)
+    assert received.dtype == np.uint16
+    assert np.array_equal(received, frame)
+    assert np.isnan(info['timestamp'])
+
+def test_slow_reader_is_lapped(publisher):
+    with FrameBusReader(publisher.bus_name) as reader:
+        for number in range(10):
+            publisher.offer(_frame(number), float(number), number)
+        frame, info = reader.read_next(timeout=0.01)
+        # A ring of 4 slots keeps one as margin, so the oldest safe frame is the 8th
+        assert int(frame[0, 0]) == 7
+        assert info['lapped'] == 7
+        assert reader.frames_lapped == 7
+        latest, info = reader.latest()
+        assert int(latest[0, 0]) == 9
+
+def test_reader_starts_at_the_newest_frame(publisher):
+    publisher.offer(_frame(1), 0.0, 0)
+    with FrameBusReader(publisher.bus_name) as reader:
+        assert reader.read_next(timeout=0.01) == (None, None)
+        assert int(reader.latest()[0][0, 0]) == 1
+        publisher.offer(_frame(2), 1.0, 1)
+        assert int(reader.read_next(timeout=0.01)[0][0, 0]) == 2
+
+def test_oversized_frames_are_dropped(publisher):
+    publisher.offer(_frame(1, shape=(64, 64)), 0.0, 0)
+    assert publisher.frames_dropped == 1
+    assert publisher.published == 0
+
+def test_missing_bus():
+    with pytest.raises(FileNotFoundError):
+        FrameBusReader(f"microtool_missing_{uuid.uuid4().hex[:8]}")
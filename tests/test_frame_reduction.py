@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from acquisitions.frame_reduction import FrameReducer, bin_frame, binned_dtype
+
+def _feed(reducer, frames):
+    """Reduce (frame, timestamp) pairs, returns what would be stored."""
+    stored = []
+    for frame, timestamp in frames:
+        frame, timestamp = reducer.reduce(frame, timestamp)
+        if frame is not None:
+            stored.append((frame, timestamp))
+    return stored
+
+def test_sum_bin_widens_dtype():
+    frame = np.full((4, 6), 255, dtype=np.uint8)
+    binned = bin_frame(frame, 2, 'sum')
+    assert binned.dtype == binned_dtype(np.uint8, 2) == np.uint16
+    assert binned.shape == (2, 3)
+    assert (binned == 4 * 255).all()
+
+def test_mean_bin_rounds_to_nearest_and_cuts_partial_blocks():
+    frame = np.array([[0, 0, 1, 1, 9],
+                      [0, 1, 1, 0, 9],
+                      [9, 9, 9, 9, 9]], dtype=np.uint8)
+    binned = bin_frame(frame, 2, 'mean')
+    # 1/4 rounds down, 3/4 rounds up, the fifth column and third row do not fill a block
+    assert binned.dtype == np.uint8
+    assert binned.tolist() == [[0, 1]]
+
+def test_decimate_then_bin_then_average():
+    reducer = FrameReducer(binning=2, bin_mode='sum', decimate=2, average=2)
+    frames = [(np.full((4, 4), value, dtype=np.uint8), float(value)) for value in range(8)]
+    stored = _feed(reducer, frames)
+    # Frames 0, 2, 4 and 6 are kept, binned to 4 * value, and averaged in pairs
+    assert [frame.shape for frame, _ in stored] == [(2, 2), (2, 2)]
+    assert [int(frame[0, 0]) for frame, _ in stored] == [4, 20]
+    assert [timestamp for _, timestamp in stored] == [1.0, 5.0]
+    assert stored[0][0].dtype == np.uint16
+    assert (reducer.frames_in, reducer.frames_out) == (8, 2)
+
+def test_integer_average_rounds_half_up():
+    reducer = FrameReducer(average=2)
+    stored = _feed(reducer, [(np.full((2, 2), 1, dtype=np.uint8), 0.0), (np.full((2, 2), 2, dtype=np.uint8), 1.0)])
+    assert int(stored[0][0][0, 0]) == 2
+    assert stored[0][0].dtype == np.uint8
+
+def test_discard_partial_starts_a_fresh_average():
+    reducer = FrameReducer(average=3)
+    assert _feed(reducer, [(np.full((2, 2), 200, dtype=np.uint8), 0.0)] * 2) == []
+    assert reducer.discard_partial() == 2
+    assert reducer.discard_partial() == 0
+    stored = _feed(reducer, [(np.full((2, 2), 10, dtype=np.uint8), float(t)) for t in range(3)])
+    assert len(stored) == 1
+    assert int(stored[0][0][0, 0]) == 10
+    assert stored[0][1] == 1.0
+
+def test_from_settings_and_validation():
+    assert FrameReducer.from_settings({'binning': 1}) is None
+    reducer = FrameReducer.from_settings({'binning': 2, 'average': 4})
+    assert reducer.reduction_factor == 16
+    assert reducer.output_shape(1025, 768) == (512, 384)
+    with pytest.raises(ValueError):
+        FrameReducer(bin_mode='max')
+    with pytest.raises(ValueError):
+        FrameReducer(decimate=0)
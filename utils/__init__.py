@@ -3,4 +3,12 @@ Utility functions for the microTool project.
 """
 
 from .system_info import get_computer_name
-__all__ = ['get_computer_name']
+from .rate_meter import RateMeter
+from .telemetry import Telemetry, telemetry
+from .log_setup import setup_logging
+from .profiler import SamplingProfiler
+from .tracing import Tracer, TracedLock, tracer
+from .memory_monitor import MemoryMonitor
+from .notifications import notify, add_notification_handler, remove_notification_handler
+__all__ = ['get_computer_name', 'RateMeter', 'Telemetry', 'telemetry', 'setup_logging', 'SamplingProfiler', 'Tracer', 'TracedLock', 'tracer', 'MemoryMonitor',
+           'notify', 'add_notification_handler', 'remove_notification_handler']
@@ -1,7 +1,127 @@
+import time
 import cv2
 import numpy as np
 import pyqtgraph as pg
 
+class HistogramEngine:
+    """
+    Computes image histograms with np.bincount without copying the frame.
+
+    Pixels are counted at full intensity resolution in fixed size row chunks through a reused scratch
+    buffer, so exact min/max/mean/saturation statistics come straight from the counts. The counts are then
+    folded into at most `display_bins` bins. For 16-bit data the bit depth is detected from the data and
+    only ever grows, so the bin layout does not flicker between frames.
+    """
+
+    # Upper bound on pixels cast into the scratch buffer at once
+    CHUNK_PIXELS = 1 << 20
+
+    def __init__(self, display_bins=256, subsample=1, refresh_interval=0.0):
+        self.display_bins = display_bins
+        self.subsample = subsample
+        self.refresh_interval = refresh_interval
+        self.roi = None
+        self.bit_depth = 8
+        self.stats = {}
+        self.counts = None
+        self._scratch = None
+        self._last_refresh = 0.0
+
+    def set_roi(self, roi):
+        """Restrict the histogram to (x, y, width, height) in image coordinates, or None for the full frame."""
+        self.roi = roi
+
+    def is_due(self):
+        """True if the refresh interval has elapsed since the last computed histogram."""
+        return time.monotonic() - self._last_refresh >= self.refresh_interval
+
+    def compute(self, image_data):
+        """
+        Compute the histogram of a frame.
+
+        Returns:
+            tuple: (x, hist) with the lower edge of each display bin in intensity units and the counts.
+        """
+        if len(image_data.shape) == 3:
+            image_data = cv2.cvtColor(image_data, cv2.COLOR_RGB2GRAY)
+
+        sample = self._sample(image_data)
+        self._update_bit_depth(image_data, sample)
+        levels = 1 << self.bit_depth
+
+        counts = self._count(sample, levels)
+        self._update_stats(counts, levels)
+        self.counts = counts
+
+        # Fold the full resolution counts into display bins
+        bins = min(self.display_bins, levels)
+        bin_width = levels // bins
+        hist = counts.reshape(bins, bin_width).sum(axis=1)
+        x = np.arange(bins) * bin_width
+
+        self._last_refresh = time.monotonic()
+        return x, hist
+
+    def percentile_levels(self, low, high):
+        """Intensity values at the low and high percentiles of the last histogram."""
+        if self.counts is None or not self.stats.get('pixels'):
+            return 0, (1 << self.bit_depth) - 1
+        cumulative = np.cumsum(self.counts)
+        total = cumulative[-1]
+        low_value = int(np.searchsorted(cumulative, total * low / 100.0, side='left'))
+        high_value = int(np.searchsorted(cumulative, total * high / 100.0, side='left'))
+        return low_value, min(high_value, len(self.counts) - 1)
+
+    def _sample(self, image_data):
+        """Return a view of the pixels to count, no data is copied."""
+        if self.roi is not None:
+            x, y, width, height = self.roi
+            image_data = image_data[y:y + height, x:x + width]
+        if self.subsample > 1:
+            image_data = image_data[::self.subsample, ::self.subsample]
+        return image_data
+
+    def _update_bit_depth(self, image_data, sample):
+        if image_data.dtype == np.uint8:
+            self.bit_depth = 8
+        elif sample.size:
+            self.bit_depth = max(self.bit_depth, int(sample.max()).bit_length(), 8)
+
+    def _count(self, sample, levels):
+        """Count pixel values with bincount, casting into the scratch buffer one row chunk at a time."""
+        counts = np.zeros(levels, dtype=np.int64)
+        if sample.size == 0:
+            return counts
+
+        height, width = sample.shape
+        rows_per_chunk = max(1, min(height, self.CHUNK_PIXELS // max(width, 1)))
+        if self._scratch is None or self._scratch.shape[1] != width or self._scratch.shape[0] < rows_per_chunk:
+            self._scratch = np.empty((rows_per_chunk, width), dtype=np.intp)
+
+        for start in range(0, height, rows_per_chunk):
+            chunk = sample[start:start + rows_per_chunk]
+            scratch = self._scratch[:chunk.shape[0]]
+            np.copyto(scratch, chunk, casting='unsafe')
+            counts += np.bincount(scratch.ravel(), minlength=levels)[:levels]
+        return counts
+
+    def _update_stats(self, counts, levels):
+        total = int(counts.sum())
+        if total == 0:
+            self.stats = {'min': 0, 'max': 0, 'mean': 0.0, 'saturated': 0, 'saturated_fraction': 0.0, 'pixels': 0, 'bit_depth': self.bit_depth}
+            return
+        occupied = np.flatnonzero(counts)
+        saturated = int(counts[levels - 1])
+        self.stats = {
+            'min': int(occupied[0]),
+            'max': int(occupied[-1]),
+            'mean': float(np.dot(counts, np.arange(levels)) / total),
+            'saturated': saturated,
+            'saturated_fraction': saturated / total,
+            'pixels': total,
+            'bit_depth': self.bit_depth
+        }
+
 class ImgHistDisplay:
     """Class to manage and display a histogram for image data."""
 
@@ -14,26 +134,39 @@ class ImgHistDisplay:
         self.plot_widget.plotItem.hideAxis('bottom')  # Hide X-axis
         self.plot_widget.plotItem.getViewBox().setLimits(xMin=0, xMax=256)  # Lock x-axis range
         self.plot_widget.plotItem.getViewBox().enableAutoRange(axis=pg.ViewBox.YAxis, enable=True)  # Auto-scale Y-axis
+        self._x_max = 256
 
-    def update(self, image_data):
-        """Update the histogram with new image data."""
-        if len(image_data.shape) == 3:
-            image_data = cv2.cvtColor(image_data, cv2.COLOR_RGB2GRAY)
+        # Plot items are created once and updated in place with setData
+        self.engine = HistogramEngine()
+        self._add_plot_items()
 
-        hist, bins = np.histogram(image_data.flatten(), bins=256, range=[0, 256])
-        self.plot_widget.clear()
+    def _add_plot_items(self):
+        self.line_plot = pg.PlotCurveItem(pen=pg.mkPen(color='#97c1ff', width=2))
+        self.baseline_plot = pg.PlotCurveItem(pen=None)
+        self.fill_plot = pg.FillBetweenItem(self.line_plot, self.baseline_plot, brush=pg.mkBrush(color=(151, 193, 255, 100)))
+        self.plot_widget.addItem(self.line_plot)
+        self.plot_widget.addItem(self.baseline_plot)
+        self.plot_widget.addItem(self.fill_plot)
 
-        x = bins[:-1]
-        line_plot = pg.PlotCurveItem(x, hist, pen=pg.mkPen(color='#97c1ff', width=2))
-        self.plot_widget.addItem(line_plot)
+    def draw(self, x, hist):
+        """Draw a histogram previously returned by HistogramEngine.compute()."""
+        x_max = int(x[-1] + (x[1] - x[0])) if len(x) > 1 else 256
+        if x_max != self._x_max:
+            self._x_max = x_max
+            self.plot_widget.plotItem.getViewBox().setLimits(xMin=0, xMax=x_max)
+        self.line_plot.setData(x, hist)
+        self.baseline_plot.setData(x, np.zeros_like(hist))
 
-        fill_plot = pg.FillBetweenItem(
-            pg.PlotDataItem(x, hist),
-            pg.PlotDataItem(x, np.zeros_like(hist)),
-            brush=pg.mkBrush(color=(151, 193, 255, 100))
-        )
-        self.plot_widget.addItem(fill_plot)
+    def update(self, image_data):
+        """Update the histogram with new image data."""
+        self.draw(*self.engine.compute(image_data))
+
+    @property
+    def stats(self):
+        """min/max/mean/saturated statistics of the last histogram computed by this display's engine."""
+        return self.engine.stats
 
     def reset(self):
         """Clear the histogram."""
-        self.plot_widget.clear()
\ No newline at end of file
+        self.plot_widget.clear()
+        self._add_plot_items()
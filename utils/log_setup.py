@@ -0,0 +1,108 @@
+"""
+Logging setup for microTool.
+Records are put on a queue by the calling thread and written to file and console by a background listener,
+so logging from the camera, render or GUI threads never waits on disk or terminal I/O.
+"""
+import os, json, time, atexit, logging, logging.handlers
+from datetime import datetime
+from queue import SimpleQueue
+from threading import Lock
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'logging.json')
+
+_listener = None
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets a record from each call site of the given subsystems through at most once per `interval` seconds.
+
+    Meant for per-frame and per-command paths: the first message gets through straight away, repeats
+    within the interval are counted, and the next one let through says how many were suppressed.
+    """
+
+    def __init__(self, interval: float = 1.0, loggers=()):
+        super().__init__()
+        self.interval = interval
+        self.prefixes = tuple(loggers)
+        self._sites = {}  # (pathname, lineno) -> [next allowed time, suppressed count]
+        self._lock = Lock()
+
+    def _applies_to(self, name):
+        return any(name == prefix or name.startswith(prefix + '.') for prefix in self.prefixes)
+
+    def filter(self, record):
+        if not self._applies_to(record.name):
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is not None and now < site[0]:
+                site[1] += 1
+                return False
+            suppressed = site[1] if site is not None else 0
+            self._sites[key] = [now + self.interval, 0]
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+def setup_logging(profile=None, config_path=CONFIG_PATH):
+    """
+    Configure logging from the JSON config.
+
+    The profile is taken from the argument, then the MICROTOOL_LOG_PROFILE environment variable, then the
+    config. The "production" profile disables DEBUG records globally, so logger.debug() returns before a
+    record is built.
+    """
+    global _listener
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    profile = profile or os.environ.get('MICROTOOL_LOG_PROFILE') or config['profile']
+    settings = config['profiles'][profile]
+
+    if not os.path.exists(config['log_dir']):
+        os.makedirs(config['log_dir'])
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    log_file = os.path.join(config['log_dir'], f'microTool_{timestamp}.log')
+
+    formatter = logging.Formatter(config['format'])
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setLevel(settings['file'])
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()  # Also log to console
+    console_handler.setLevel(settings['console'])
+    console_handler.setFormatter(formatter)
+
+    # Callers only format the message and put it on the queue, the listener thread does the I/O
+    log_queue = SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    rate_limit = config['rate_limit']
+    queue_handler.addFilter(RateLimitFilter(rate_limit['interval_s'], rate_limit['loggers']))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings['root'])
+    for name, level in settings['levels'].items():
+        logging.getLogger(name).setLevel(level)
+    logging.disable(getattr(logging, settings['disable']) if settings['disable'] else logging.NOTSET)
+
+    shutdown_logging()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    _listener._thread.name = "LogListenerThread"
+    atexit.register(shutdown_logging)
+
+    logging.info(f"Starting microTool application (logging profile '{profile}')")
+    return log_file
+
+def shutdown_logging():
+    """Flush the queue and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
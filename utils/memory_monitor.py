@@ -0,0 +1,147 @@
+"""
+Memory accounting for the recording pipeline.
+A background thread samples process RSS, system available memory and the bytes held by registered
+buffers (recording queue, display, writer) into a short history, and warns before the memory budget
+is reached at the current net inflow.
+"""
+import time, threading, logging
+from collections import deque
+import psutil
+
+logger = logging.getLogger(__name__)
+
+class MemoryMonitor:
+    """
+    Samples memory use every `interval` seconds and keeps `history` seconds of samples.
+
+    The budget is `budget_bytes`, or `budget_fraction` of physical RAM when that is None. Headroom is the
+    smaller of the budget left above RSS and what the system still has available. The time to the budget
+    is the headroom divided by the net inflow, the rate returned by the inflow source (acquisition minus
+    write rate). A warning fires once when RSS passes `warn_fraction` of the budget or the budget is less
+    than `warn_horizon` seconds away, and re-arms when both clear.
+    """
+
+    def __init__(self, budget_bytes=None, budget_fraction=0.8, interval=0.5, history=120.0,
+                 warn_fraction=0.85, warn_horizon=30.0):
+        total = psutil.virtual_memory().total
+        self.budget_bytes = int(budget_bytes) if budget_bytes else int(total * budget_fraction)
+        self.interval = interval
+        self.warn_fraction = warn_fraction
+        self.warn_horizon = warn_horizon
+        self.samples = deque(maxlen=max(int(history / interval), 2))
+        self.warning = False
+        self.on_warning = None
+        self._accounts = {}
+        self._inflow_source = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._process = psutil.Process()
+
+    def register(self, name, source):
+        """Account the bytes returned by `source()` under `name`, sources are called on the monitor thread."""
+        with self._lock:
+            self._accounts[name] = source
+
+    def unregister(self, name):
+        with self._lock:
+            self._accounts.pop(name, None)
+
+    def set_inflow_source(self, source):
+        """`source()` returns the net bytes per second flowing into memory."""
+        self._inflow_source = source
+
+    def start(self, on_warning=None):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.on_warning = on_warning
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="MemoryMonitorThread", daemon=True)
+        self._thread.start()
+        logger.info(f"Memory monitor started, budget {self.budget_bytes / 1024**3:.2f} GB")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Error sampling memory: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def sample(self):
+        """Take one sample, add it to the history and check it against the budget."""
+        with self._lock:
+            accounts = list(self._accounts.items())
+        held = {}
+        for name, source in accounts:
+            try:
+                held[name] = int(source())
+            except Exception as e:
+                logger.debug("Memory account %s unavailable: %s", name, e)
+                held[name] = 0
+
+        rss = self._process.memory_info().rss
+        available = psutil.virtual_memory().available
+        inflow = float(self._inflow_source()) if self._inflow_source is not None else 0.0
+        headroom = max(min(self.budget_bytes - rss, available), 0)
+        eta = headroom / inflow if inflow > 0 else float('inf')
+
+        sample = {
+            'time': time.monotonic(),
+            'rss_bytes': rss,
+            'available_bytes': available,
+            'accounts': held,
+            'net_inflow_bytes_per_s': inflow,
+            'budget_eta_s': eta
+        }
+        self.samples.append(sample)
+        self._check_budget(rss, eta)
+        return sample
+
+    def _check_budget(self, rss, eta):
+        over = rss >= self.budget_bytes * self.warn_fraction
+        soon = eta < self.warn_horizon
+        if (over or soon) and not self.warning:
+            self.warning = True
+            if soon:
+                message = f"Memory budget reached in about {eta:.0f} s at the current inflow"
+            else:
+                message = f"Memory use {rss / 1024**3:.2f} GB is {rss / self.budget_bytes:.0%} of the budget"
+            logger.warning(message)
+            if self.on_warning is not None:
+                self.on_warning(message)
+        elif not over and not soon:
+            self.warning = False
+
+    def trend(self, span=10.0):
+        """RSS growth in bytes per second over roughly the last `span` seconds of history."""
+        samples = list(self.samples)
+        if len(samples) < 2:
+            return 0.0
+        last = samples[-1]
+        first = next((s for s in samples if last['time'] - s['time'] <= span), samples[0])
+        if last['time'] <= first['time']:
+            return 0.0
+        return (last['rss_bytes'] - first['rss_bytes']) / (last['time'] - first['time'])
+
+    def get_stats(self):
+        """Latest sample flattened for the status bar, empty before the first sample."""
+        if not self.samples:
+            return {}
+        latest = self.samples[-1]
+        return {
+            'mem_rss_bytes': latest['rss_bytes'],
+            'mem_available_bytes': latest['available_bytes'],
+            'mem_budget_bytes': self.budget_bytes,
+            'mem_accounts': latest['accounts'],
+            'mem_tracked_bytes': sum(latest['accounts'].values()),
+            'mem_rss_trend_bytes_per_s': self.trend(),
+            'mem_net_inflow_bytes_per_s': latest['net_inflow_bytes_per_s'],
+            'mem_budget_eta_s': latest['budget_eta_s'],
+            'mem_warning': self.warning
+        }
@@ -0,0 +1,37 @@
+"""
+User-facing status messages from the acquisition core.
+The core only calls notify(); whoever runs it decides where messages go. The GUI shows them in the
+status bar, the command line prints them. With no handler registered they are logged.
+"""
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_handlers = []
+
+def add_notification_handler(handler: Callable[[str, Optional[int]], None]):
+    """Register `handler(message, duration_ms)`, it may be called from any thread."""
+    if handler not in _handlers:
+        _handlers.append(handler)
+
+def remove_notification_handler(handler):
+    if handler in _handlers:
+        _handlers.remove(handler)
+
+def notify(message: str, duration: Optional[int] = None):
+    """
+    Report a status message.
+
+    Args:
+        message: Text for the user
+        duration: Optional time in milliseconds the message stays visible, where that applies
+    """
+    if not _handlers:
+        logger.info(message)
+        return
+    for handler in list(_handlers):
+        try:
+            handler(message, duration)
+        except Exception as e:
+            logger.error(f"Error in notification handler: {str(e)}")
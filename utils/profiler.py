@@ -0,0 +1,143 @@
+"""
+Sampling profiler that can be switched on in a running session.
+A background thread samples the Python stacks of selected threads with sys._current_frames() and writes
+flame-graph-ready collapsed stacks plus per-thread CPU time. Nothing is hooked in while it is off.
+"""
+import os, sys, json, time, threading, logging
+from collections import Counter
+import psutil
+
+logger = logging.getLogger(__name__)
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the named threads every `interval` seconds for up to `window` seconds.
+
+    Thread names are matched as prefixes, so "SnapshotWriter" covers every snapshot executor thread.
+    Output, written by stop() or when the window runs out:
+        <path_base>_profile.collapsed  - one "thread;outer;...;inner count" line per distinct stack
+        <path_base>_profile_cpu.json   - user/system CPU seconds and CPU % per thread over the window, keyed
+                                         "name [native id]"
+    """
+
+    def __init__(self, interval=0.005, window=30.0, threads=None):
+        self.interval = interval
+        self.window = window
+        self.threads = tuple(threads) if threads else ()
+        self.stacks = Counter()
+        self.samples = 0
+        self.is_running = False
+        self.path_base = None
+        self.on_finished = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._labels = {}
+        self._cpu_start = {}
+        self._start_time = 0.0
+
+    def start(self, path_base, window=None, on_finished=None):
+        """Start sampling, the results go to `path_base` and `on_finished(path_base)` is called afterwards."""
+        if self.is_running:
+            return False
+        self.path_base = path_base
+        self.on_finished = on_finished
+        if window is not None:
+            self.window = window
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event.clear()
+        self._cpu_start = self._thread_cpu_times()
+        self._start_time = time.monotonic()
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="ProfilerThread", daemon=True)
+        self._thread.start()
+        logger.info(f"Profiler started for {self.window:g} s, sampling every {self.interval * 1000:g} ms")
+        return True
+
+    def stop(self):
+        """Stop sampling early, the results are written as if the window had ended."""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+
+    def _wanted(self, name):
+        return not self.threads or name.startswith(self.threads)
+
+    def _label(self, code):
+        # Labels are cached per code object, building the string is the main cost of a sample
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        deadline = self._start_time + self.window if self.window else None
+        try:
+            while not self._stop_event.wait(self.interval):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    name = names.get(ident, f"Thread-{ident}")
+                    if not self._wanted(name):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(name)
+                    self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        except Exception as e:
+            logger.error(f"Error sampling stacks: {str(e)}")
+        finally:
+            self.is_running = False
+            self._write()
+            if self.on_finished is not None:
+                self.on_finished(self.path_base)
+
+    def _thread_cpu_times(self):
+        """
+        Map native thread ids to (name, user, system CPU seconds). Names are only labels, threads can share
+        one and a restarted thread keeps its name but gets a new id. Threads unknown to Python are named
+        by native id.
+        """
+        names = {thread.native_id: thread.name for thread in threading.enumerate()}
+        try:
+            return {t.id: (names.get(t.id, f"native-{t.id}"), t.user_time, t.system_time) for t in psutil.Process().threads()}
+        except (psutil.Error, AttributeError) as e:
+            logger.warning(f"Per-thread CPU times unavailable: {str(e)}")
+            return {}
+
+    def _write(self):
+        elapsed = time.monotonic() - self._start_time
+        cpu_end = self._thread_cpu_times()
+        cpu = {}
+        for native_id, (name, user, system) in cpu_end.items():
+            # A thread started during the window has no start entry, all its CPU time falls in the window
+            _, user_start, system_start = self._cpu_start.get(native_id, (name, 0.0, 0.0))
+            user, system = user - user_start, system - system_start
+            cpu[f"{name} [{native_id}]"] = {
+                'user_s': round(user, 4),
+                'system_s': round(system, 4),
+                'cpu_percent': round(100.0 * (user + system) / elapsed, 1) if elapsed > 0 else 0.0
+            }
+
+        try:
+            with open(f"{self.path_base}_profile.collapsed", 'w') as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            with open(f"{self.path_base}_profile_cpu.json", 'w') as f:
+                json.dump({
+                    'window_s': round(elapsed, 3),
+                    'interval_s': self.interval,
+                    'samples': self.samples,
+                    'threads': dict(sorted(cpu.items(), key=lambda item: -item[1]['cpu_percent']))
+                }, f, indent=2)
+            logger.info(f"Profile written to {self.path_base}_profile.collapsed ({self.samples} samples)")
+        except Exception as e:
+            logger.error(f"Error writing profile: {str(e)}")
@@ -0,0 +1,40 @@
+import time
+from collections import deque
+from threading import Lock
+
+class RateMeter:
+    """
+    Measures how often something happens, e.g. frames per second or bytes per second.
+
+    The producer only increments a counter in tick(), the reader does the timing work in rate(),
+    so it is cheap enough to call on every frame of the acquisition loop.
+    """
+
+    def __init__(self, window: float = 1.0):
+        self.count = 0
+        self.window = window
+        self._samples = deque()
+        self._lock = Lock()
+
+    def tick(self, amount=1):
+        """Record one event, or `amount` units such as bytes."""
+        self.count += amount
+
+    def rate(self) -> float:
+        """Return the average rate per second over roughly the last `window` seconds."""
+        now = time.monotonic()
+        count = self.count
+        with self._lock:
+            self._samples.append((now, count))
+            # Keep the oldest sample that is still at least one window old
+            while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+                self._samples.popleft()
+            start_time, start_count = self._samples[0]
+        if now <= start_time:
+            return 0.0
+        return (count - start_count) / (now - start_time)
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self._samples.clear()
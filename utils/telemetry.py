@@ -0,0 +1,156 @@
+import csv, json, math, time
+from contextlib import contextmanager
+from threading import Lock
+
+class LatencyHistogram:
+    """
+    Log-binned histogram of durations for one pipeline stage.
+
+    Bins are a quarter octave wide from 1 µs to about 16 s, so recording a sample is one log2 and a list
+    increment and percentiles are accurate to about 20%. Besides the totals since the last reset, two
+    alternating windows of `window` seconds give a rolling view for the live panel.
+    """
+
+    BINS_PER_OCTAVE = 4
+    NUM_BINS = 96
+    MIN_DURATION = 1e-6
+
+    def __init__(self, window: float = 10.0):
+        self.window = window
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.total = [0] * self.NUM_BINS
+            self.total_count = 0
+            self.total_sum = 0.0
+            self.total_max = 0.0
+            self._current = [0] * self.NUM_BINS
+            self._previous = [0] * self.NUM_BINS
+            self._current_max = 0.0
+            self._previous_max = 0.0
+            self._window_start = time.monotonic()
+
+    def _bin(self, duration):
+        if duration <= self.MIN_DURATION:
+            return 0
+        return min(int(math.log2(duration / self.MIN_DURATION) * self.BINS_PER_OCTAVE), self.NUM_BINS - 1)
+
+    def record(self, duration: float):
+        """Add one duration in seconds."""
+        index = self._bin(duration)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= self.window:
+                self._rotate(now)
+            self.total[index] += 1
+            self.total_count += 1
+            self.total_sum += duration
+            self._current[index] += 1
+            if duration > self.total_max:
+                self.total_max = duration
+            if duration > self._current_max:
+                self._current_max = duration
+
+    def _rotate(self, now):
+        # Two or more windows without samples leave nothing recent to show
+        stale = now - self._window_start >= 2 * self.window
+        self._previous = [0] * self.NUM_BINS if stale else self._current
+        self._previous_max = 0.0 if stale else self._current_max
+        self._current = [0] * self.NUM_BINS
+        self._current_max = 0.0
+        self._window_start = now
+
+    def summary(self, rolling: bool = False) -> dict:
+        """
+        Count, mean, p50/p95/p99 and max in milliseconds.
+
+        With rolling=True only the last one to two windows are included, otherwise everything since reset.
+        """
+        with self._lock:
+            if rolling:
+                if time.monotonic() - self._window_start >= self.window:
+                    self._rotate(time.monotonic())
+                counts = [a + b for a, b in zip(self._current, self._previous)]
+                maximum = max(self._current_max, self._previous_max)
+                mean = None
+            else:
+                counts = list(self.total)
+                maximum = self.total_max
+                mean = self.total_sum / self.total_count if self.total_count else 0.0
+
+        count = sum(counts)
+        result = {'count': count}
+        if mean is not None:
+            result['mean_ms'] = mean * 1e3
+        for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            result[name] = min(self._percentile(counts, count, fraction), maximum) * 1e3
+        result['max_ms'] = maximum * 1e3
+        return result
+
+    def _percentile(self, counts, count, fraction):
+        """Upper edge of the bin holding the given fraction of samples."""
+        if count == 0:
+            return 0.0
+        target = fraction * count
+        cumulative = 0
+        for index, bin_count in enumerate(counts):
+            cumulative += bin_count
+            if cumulative >= target:
+                return self.MIN_DURATION * 2 ** ((index + 1) / self.BINS_PER_OCTAVE)
+        return self.MIN_DURATION * 2 ** (self.NUM_BINS / self.BINS_PER_OCTAVE)
+
+class Telemetry:
+    """
+    Per-stage latency histograms for the acquisition pipeline.
+
+    Stages are created on first use. Hot paths time themselves with time.perf_counter() and call record(),
+    or wrap a block in measure().
+    """
+
+    def __init__(self, window: float = 10.0):
+        self.window = window
+        self.stages = {}
+        self._lock = Lock()
+
+    def stage(self, name: str) -> LatencyHistogram:
+        histogram = self.stages.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(name, LatencyHistogram(self.window))
+        return histogram
+
+    def record(self, name: str, duration: float):
+        self.stage(name).record(duration)
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage(name).record(time.perf_counter() - start)
+
+    def summary(self, rolling: bool = False) -> dict:
+        return {name: histogram.summary(rolling) for name, histogram in list(self.stages.items())}
+
+    def reset(self):
+        for histogram in list(self.stages.values()):
+            histogram.reset()
+
+    def dump(self, path_base: str):
+        """Write the summary since the last reset to `path_base`.csv and `path_base`.json."""
+        summary = self.summary()
+        with open(f"{path_base}.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        fields = ['count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+        with open(f"{path_base}.csv", 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['stage'] + fields)
+            for name, stats in summary.items():
+                writer.writerow([name] + [round(stats[field], 4) if isinstance(stats[field], float) else stats[field] for field in fields])
+
+# Shared instance, every stage of the pipeline records into this
+telemetry = Telemetry()
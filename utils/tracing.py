@@ -0,0 +1,139 @@
+"""
+Optional timeline tracing in the Chrome trace-event format.
+While enabled, spans are appended as complete ("X") events with the native thread id to a bounded
+in-memory buffer; the export opens directly in Perfetto or chrome://tracing. While disabled a span is a
+shared no-op context manager.
+"""
+import os, json, time, threading, logging
+from collections import deque
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+_NULL_SPAN = nullcontext()
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.complete(self.name, self.cat, self.start, _now_us() - self.start, self.args)
+        return False
+
+class Tracer:
+    """Bounded buffer of trace events, the oldest events are discarded once `capacity` is reached."""
+
+    def __init__(self, capacity=200000):
+        self.enabled = False
+        self.events = deque(maxlen=capacity)
+        self._thread_names = {}
+
+    def enable(self, capacity=None):
+        if capacity is not None and capacity != self.events.maxlen:
+            self.events = deque(maxlen=capacity)
+        self.enabled = True
+        logger.info(f"Tracing enabled, keeping the last {self.events.maxlen} events")
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events.clear()
+
+    def span(self, name, cat='app', args=None):
+        """Context manager timing a block as one event."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def complete(self, name, cat, start_us, duration_us, args=None):
+        """Add an event that started at `start_us` (perf_counter microseconds) and lasted `duration_us`."""
+        if not self.enabled:
+            return
+        tid = threading.get_native_id()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        # deque.append is atomic, so threads can add events without a lock
+        self.events.append((name, cat, start_us, duration_us, tid, args))
+
+    def instant(self, name, cat='app', args=None):
+        self.complete(name, cat, _now_us(), None, args)
+
+    def export(self, path):
+        """Write the buffered events as Chrome trace-event JSON, returns the number of events written."""
+        pid = os.getpid()
+        events = list(self.events)
+        trace_events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'microTool'}}]
+        for tid, name in list(self._thread_names.items()):
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        for name, cat, start_us, duration_us, tid, args in events:
+            event = {'name': name, 'cat': cat, 'ts': start_us, 'pid': pid, 'tid': tid}
+            if duration_us is None:
+                event.update(ph='i', s='t')
+            else:
+                event.update(ph='X', dur=duration_us)
+            if args:
+                event['args'] = args
+            trace_events.append(event)
+
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, separators=(',', ':'))
+        logger.info(f"Trace with {len(events)} events written to {path}")
+        return len(events)
+
+class TracedLock:
+    """
+    Drop-in wrapper for a threading.Lock used as a context manager. While tracing, the wait for the lock
+    and the time it is held are recorded as '<name>.wait' and '<name>.held' spans, so contention shows up
+    on the timeline.
+    """
+
+    def __init__(self, name, lock=None):
+        self.name = name
+        self._lock = lock if lock is not None else threading.Lock()
+        self._acquired_at = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        return self._lock.acquire(blocking, timeout)
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        if not tracer.enabled:
+            self._lock.acquire()
+            self._acquired_at = None
+            return self
+        start = _now_us()
+        self._lock.acquire()
+        acquired = _now_us()
+        tracer.complete(f"{self.name}.wait", 'lock', start, acquired - start)
+        # Only the holder touches this until the lock is released
+        self._acquired_at = acquired
+        return self
+
+    def __exit__(self, *exc_info):
+        acquired = self._acquired_at
+        released = _now_us()
+        self._lock.release()
+        if acquired is not None:
+            tracer.complete(f"{self.name}.held", 'lock', acquired, released - acquired)
+        return False
+
+# Shared instance, every instrumented part of the pipeline records into this
+tracer = Tracer()